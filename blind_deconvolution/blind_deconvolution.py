@@ -1,17 +1,33 @@
 from __future__ import annotations
 
+import math
+import warnings
 from dataclasses import dataclass
-from typing import Callable, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 from tqdm import trange
 
-from blind_deconvolution.forward_model import forward_model
+from blind_deconvolution.forward_model import (
+    forward_model,
+    low_rank_kernel,
+    separable_factors,
+    separable_ranks,
+)
+from blind_deconvolution.instrumentation import Instrumentation, ProfilerWindow, section
 from utils.convertors import numpy_image_to_tensor, numpy_kernel_to_tensor
-from blind_deconvolution.map_objective import map_objective
+from blind_deconvolution.map_objective import (
+    PatchSample,
+    data_fidelity_grad,
+    map_objective,
+    sample_patches,
+)
+from blind_deconvolution.optimizers import FourierPreconditionedGD, ProjectedFISTA
 from blind_deconvolution.psf_generator import gaussian_psf, motion_psf
+from blind_deconvolution.region_selection import select_regions
 from utils.cuda_checker import choose_device
 
 
@@ -22,6 +38,25 @@ class BlindDeconvConfig:
     lr_x: float = 1e-2
     lr_k: float = 1e-2
 
+    # Optimizers and schedule. "lbfgs" updates x with L-BFGS (strong-Wolfe
+    # line search, lr_x unused; the line search runs over the whole batch, so
+    # batched samples are coupled and per-sample lr_x is rejected); "fourier"
+    # takes gradient steps preconditioned by the current kernel's spectrum
+    # (`FourierPreconditionedGD`, lr_x = 1 is a damped Gauss-Newton step on
+    # the data term, damping `precondition_damping`; eager steps only);
+    # "fista" updates k with accelerated projected gradient and exact simplex
+    # projection (backtracking step, lr_k unused).
+    optimizer_x: str = "adam"  # "adam" | "lbfgs" | "fourier"
+    optimizer_k: str = "adam"  # "adam" | "fista"
+    freeze_k_iters: int = 50  # initial iterations that only update the kernel
+    # After the kernel-only phase: 0 updates x and k every iteration; N > 0
+    # alternates blocks of N iterations (x only, then k only, ...).
+    alternate_every: int = 0
+    lbfgs_history: int = 10
+    lbfgs_max_iter: int = 1  # L-BFGS iterations per solver iteration
+    fista_lipschitz: float = 1.0  # initial Lipschitz estimate (step 1/L)
+    precondition_damping: float = 3e-2  # "fourier": damping added to |K|^2
+
     # MAP prior weights
     lambda_x: float = 0.0  # image prior (Phi(x))
     lambda_k_l2: float = 1e-3  # L2 prior on kernel
@@ -33,6 +68,93 @@ class BlindDeconvConfig:
     # Kernel settings
     kernel_size: int = 15
 
+    # Multi-start: optimize `num_starts` perturbed initializations as one batch
+    # and return the lowest-loss one. Start 0 is always the unperturbed init.
+    num_starts: int = 1
+    start_noise: float = 0.02  # std of Gaussian noise added to x for starts > 0
+    start_kernel_mix: float = 0.5  # blend of a random kernel into k for starts > 0
+    prune_every: int = 50  # prune clearly worse starts every N iterations (0 = never)
+    prune_ratio: float = 2.0  # drop starts whose loss exceeds prune_ratio * best loss
+    seed: Optional[int] = None  # seed for the start perturbations
+
+    # Instrumentation (opt-in): per-component wall time / allocation counts
+    # reported through log_fn, and a torch.profiler Chrome trace for the
+    # iteration window [start, stop).
+    instrument: bool = False
+    instrument_allocations: bool = True
+    profile_window: Optional[Tuple[int, int]] = None
+    profile_trace_path: str = "solver_trace.json"
+
+    # Capture each iteration (objective + gradient + update + projection)
+    # with torch.compile for fixed shapes; falls back to eager on failure.
+    compile_step: bool = False
+
+    # Add the data term's value and gradients in closed form
+    # (`data_fidelity_grad`) instead of backpropagating through the
+    # convolution; only the priors go through autograd. Eager steps only.
+    analytic_data_grad: bool = False
+
+    # Stochastic kernel estimation for large images: iterations that update
+    # only k evaluate the data term on `patch_count` random patches of side
+    # `patch_size` (with kernel-sized halos) instead of the whole image. The
+    # count grows by `patch_growth` per iteration up to `patch_count_max`; once
+    # the patches would cover the image the full data term is used. 0 disables.
+    # Eager steps only.
+    patch_size: int = 0
+    patch_count: int = 16
+    patch_growth: float = 1.05
+    patch_count_max: int = 512
+
+    # Edge-salient kernel estimation: score `region_size` tiles of the
+    # measurement by structure-tensor strength (`select_regions`) and keep the
+    # `kernel_regions` best non-overlapping ones. All iterations but the last
+    # `region_x_iters` evaluate the data term on those regions only; the last
+    # ones update x alone on the full image with k fixed. 0 disables.
+    # Eager steps only.
+    kernel_regions: int = 0
+    region_size: int = 64
+    region_x_iters: int = 100
+
+    # Low-rank kernel: optimize k as a sum of separable (column x row) terms
+    # and compute the full-image data term as pairs of 1D convolutions. After
+    # each kernel update the projected kernel is re-factorized by SVD with the
+    # smallest rank keeping `kernel_rank_energy` of its squared singular
+    # values, at most `kernel_rank`. The rank is chosen per sample; terms
+    # beyond a sample's rank are held at zero, so batched samples stay
+    # independent. 0 keeps the dense kernel. Adam (optimizer_k) and eager
+    # steps only.
+    kernel_rank: int = 0
+    kernel_rank_energy: float = 0.999
+
+    # Active-set kernel: every `kernel_support_every` iterations the support
+    # becomes the entries above `support_threshold` times the kernel's peak,
+    # dilated by `support_margin` pixels (room to grow where the gradient
+    # pushes mass). Entries outside are held at zero and the full-image data
+    # term only convolves with the support's bounding box. 0 disables.
+    # Adam (optimizer_k) and eager steps only.
+    kernel_support_every: int = 0
+    support_threshold: float = 0.01
+    support_margin: int = 2
+
+    # Adaptive kernel size: start at `kernel_size` and, every
+    # `kernel_grow_every` iterations, pad k by `kernel_grow_step` pixels per
+    # side (optimizer state padded with zeros) when more than
+    # `kernel_border_mass` of some kernel's mass lies in its outer
+    # `kernel_border_width` pixels, up to `max_kernel_size`. Results then have
+    # the final size. 0 (or <= kernel_size) disables.
+    max_kernel_size: int = 0
+    kernel_grow_every: int = 10
+    kernel_grow_step: int = 2
+    kernel_border_width: int = 1
+    kernel_border_mass: float = 0.002
+
+    # Precision policy. "bfloat16" autocasts the objective (convolutions; the
+    # FFT-based priors keep float32 inputs) while x, k and the optimizer state
+    # stay float32 master copies; the last `fp32_final_iters` iterations run
+    # entirely in float32.
+    precision: str = "float32"
+    fp32_final_iters: int = 50
+
     # Optional image prior function
     image_prior_fn: Optional[Callable[[torch.Tensor], torch.Tensor]] = None
 
@@ -40,6 +162,216 @@ class BlindDeconvConfig:
     device: str = "cuda" if torch.cuda.is_available() else "cpu"
 
 
+# Config fields that `BlindDeconvolver.run_grid` can vary per batch element.
+BATCHABLE_FIELDS = (
+    "lr_x",
+    "lr_k",
+    "lambda_x",
+    "lambda_k_l2",
+    "lambda_k_center",
+    "lambda_k_auto",
+    "lambda_pink",
+    "lambda_diffusion",
+)
+
+PRECISIONS = {"float32": None, "bfloat16": torch.bfloat16}
+X_OPTIMIZERS = ("adam", "lbfgs", "fourier")
+K_OPTIMIZERS = ("adam", "fista")
+
+# A float shared by the batch, or a per-sample tensor of shape (B,).
+BatchValue = Union[float, torch.Tensor]
+
+# A solver iteration: (update_k, update_x, autocast_dtype) -> (per-sample loss, components).
+StepFn = Callable[
+    [bool, bool, Optional[torch.dtype]],
+    Tuple[torch.Tensor, Optional[Dict[str, torch.Tensor]]],
+]
+
+
+def _optimizer_step(opt: optim.Optimizer, param: torch.Tensor, lr: BatchValue) -> None:
+    """Step `opt`, optionally with a per-sample learning rate.
+
+    For a tensor `lr` of shape (B,), `opt` must have been created with lr=1.0;
+    the resulting update is rescaled per sample. This is exact for Adam, whose
+    moment estimates do not depend on the learning rate.
+    """
+    if not isinstance(lr, torch.Tensor):
+        opt.step()
+        return
+
+    prev = param.detach().clone()
+    opt.step()
+    with torch.no_grad():
+        scale = lr.view(-1, *([1] * (param.dim() - 1)))
+        param.copy_(torch.lerp(prev, param, scale))
+
+
+def _functional_adam_step(
+    param: torch.Tensor,
+    grad: torch.Tensor,
+    state: Dict[str, torch.Tensor],
+    lr: BatchValue,
+    betas: Tuple[float, float],
+    eps: float,
+) -> None:
+    """In-place Adam update of `param` from `grad`, traceable by torch.compile.
+
+    Mirrors `torch.optim.Adam` (no weight decay / amsgrad) on the optimizer's
+    own `state` tensors, so eager `opt.step()` calls can be mixed in. `lr` may
+    be a per-sample (B,) tensor.
+    """
+    beta1, beta2 = betas
+    step = state["step"]
+    exp_avg = state["exp_avg"]
+    exp_avg_sq = state["exp_avg_sq"]
+
+    step.add_(1)
+    exp_avg.lerp_(grad, 1 - beta1)
+    exp_avg_sq.mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+    bias_correction1 = 1 - beta1**step
+    bias_correction2 = 1 - beta2**step
+    denom = (exp_avg_sq.sqrt() / bias_correction2.sqrt()).add_(eps)
+    if isinstance(lr, torch.Tensor):
+        lr = lr.view(-1, *([1] * (param.dim() - 1)))
+    param.sub_(lr * exp_avg / (bias_correction1 * denom))
+
+
+def _autocast(device: torch.device, dtype: Optional[torch.dtype]):
+    """Autocast context for `dtype` on `device` (disabled when dtype is None)."""
+    return torch.autocast(
+        device_type=device.type, dtype=dtype or torch.bfloat16, enabled=dtype is not None
+    )
+
+
+def _functional_step(
+    x: torch.Tensor,
+    k: torch.Tensor,
+    y_meas: torch.Tensor,
+    x_state: Dict[str, torch.Tensor],
+    k_state: Dict[str, torch.Tensor],
+    lr_x: BatchValue,
+    lr_k: BatchValue,
+    betas: Tuple[float, float],
+    eps: float,
+    lambdas: Dict[str, BatchValue],
+    image_prior_fn: Optional[Callable[[torch.Tensor], torch.Tensor]],
+    need_components: bool,
+    update_k: bool,
+    update_x: bool,
+    autocast_dtype: Optional[torch.dtype] = None,
+) -> Tuple[torch.Tensor, Dict[str, torch.Tensor]]:
+    """One solver iteration without autograd state or optimizer objects.
+
+    Gradients come from `torch.func.grad_and_value` and Adam is applied in
+    place, so torch.compile captures objective, gradient, updates and
+    projections as a single graph. Returns per-sample losses and (possibly
+    empty) loss components.
+    """
+
+    def objective(x, k):
+        with _autocast(x.device, autocast_dtype):
+            result = map_objective(
+                x,
+                k,
+                y_meas,
+                image_prior_fn=image_prior_fn,
+                return_components=need_components,
+                reduction="none",
+                **lambdas,
+            )
+        # aux outputs must be tensors, so "no components" is an empty dict
+        loss, components = result if need_components else (result, {})
+        components = {name: val.detach() for name, val in components.items()}
+        return loss.sum(), (loss.detach(), components)
+
+    (grad_x, grad_k), (_, (loss, components)) = torch.func.grad_and_value(
+        objective, argnums=(0, 1), has_aux=True
+    )(x, k)
+
+    with torch.no_grad():
+        if update_k:
+            _functional_adam_step(k, grad_k, k_state, lr_k, betas, eps)
+        if update_x:
+            _functional_adam_step(x, grad_x, x_state, lr_x, betas, eps)
+        # Same constraints as `project_kernel` / `project_image`
+        k.clamp_(min=0.0)
+        k.div_(k.sum(dim=(-2, -1), keepdim=True) + 1e-8)
+        x.clamp_(0.0, 1.0)
+
+    return loss, components
+
+
+_compiled_functional_step: Optional[Callable] = None
+
+
+def _get_compiled_step() -> Callable:
+    """`torch.compile(_functional_step)`, created once and shared by all solvers."""
+    global _compiled_functional_step
+    if _compiled_functional_step is None:
+        _compiled_functional_step = torch.compile(_functional_step, dynamic=False)
+    return _compiled_functional_step
+
+
+def _init_adam_state(opt: optim.Optimizer) -> None:
+    """Create Adam's lazily-initialized state so it can be updated in place."""
+    if not isinstance(opt, optim.Adam):
+        raise NotImplementedError(
+            f"The compiled step supports Adam only, got {type(opt).__name__}."
+        )
+    for group in opt.param_groups:
+        if group["weight_decay"] or group["amsgrad"] or group["maximize"]:
+            raise NotImplementedError(
+                "The compiled step supports plain Adam only "
+                "(no weight_decay / amsgrad / maximize)."
+            )
+        for p in group["params"]:
+            if not opt.state[p]:
+                opt.state[p] = {
+                    "step": torch.tensor(0.0),
+                    "exp_avg": torch.zeros_like(p, memory_format=torch.preserve_format),
+                    "exp_avg_sq": torch.zeros_like(p, memory_format=torch.preserve_format),
+                }
+
+
+def _remap_optimizer_state(
+    opt: optim.Optimizer,
+    old: torch.Tensor,
+    new: torch.Tensor,
+    fn: Callable[[torch.Tensor], torch.Tensor],
+    batch_fn: Optional[Callable[[torch.Tensor], torch.Tensor]] = None,
+) -> None:
+    """Swap `old` for `new` in `opt`, carrying its per-element state through `fn`.
+
+    State tensors shaped like `old` (e.g. Adam's moment estimates) are mapped
+    with `fn` (select, pad, ...); per-sample (B,) state is mapped with
+    `batch_fn` when given; scalar state such as the step count is kept.
+    L-BFGS history is over the flattened parameter and is reset instead
+    (together with its cached parameter size).
+    """
+    for group in opt.param_groups:
+        group["params"] = [new if p is old else p for p in group["params"]]
+    state = opt.state.pop(old, None)
+    if isinstance(opt, optim.LBFGS):
+        opt._params = opt.param_groups[0]["params"]
+        opt._numel_cache = None
+        opt.state.clear()
+        return
+    if state:
+        opt.state[new] = {
+            key: _remap_state_value(val, old, fn, batch_fn) for key, val in state.items()
+        }
+
+
+def _remap_state_value(val, old: torch.Tensor, fn, batch_fn):
+    if not isinstance(val, torch.Tensor):
+        return val
+    if val.shape == old.shape:
+        return fn(val)
+    if batch_fn is not None and val.dim() == 1 and val.shape[0] == old.shape[0]:
+        return batch_fn(val)
+    return val
+
+
 class BlindDeconvolver(nn.Module):
     """
     Simple blind deconvolution solver that optimizes x and k directly.
@@ -52,6 +384,16 @@ class BlindDeconvolver(nn.Module):
         # y_meas: (1, 1, H, W) tensor
         x_hat, k_hat, losses = solver.run(y_meas)
 
+        # Solve N weight/learning-rate settings as one batch
+        x_hats, k_hats, grid_losses = solver.run_grid(
+            y_meas, [{"lambda_k_l2": 1e-3}, {"lambda_k_l2": 1e-1}]
+        )
+
+    With `config.num_starts > 1`, `run` optimizes several perturbed
+    initializations together, prunes clearly worse starts along the way and
+    returns the best one; the final loss of every start is kept in
+    `solver.start_losses`.
+
     """
 
     def __init__(self, config: BlindDeconvConfig):
@@ -61,8 +403,22 @@ class BlindDeconvolver(nn.Module):
         # Placeholders; will be initialized per-observation in `initialize_from_measurement`
         self.x_param: Optional[nn.Parameter] = None
         self.k_param: Optional[nn.Parameter] = None
+        # Separable factors (B, r, Kh + Kw) of k with `config.kernel_rank`;
+        # `k_param` then holds the projected kernel they were taken from.
+        self.k_factors: Optional[nn.Parameter] = None
+        # Active kernel entries (B, 1, Kh, Kw) with `config.kernel_support_every`
+        self.k_support: Optional[torch.Tensor] = None
+
+        # Final loss of every start from the last multi-start `run`
+        # (pruned starts keep their loss at the time they were dropped).
+        self.start_losses: List[float] = []
 
-    def initialize_from_measurement(self, y_meas: torch.Tensor) -> None:
+        # Per-component timings of the last run when `config.instrument` is set
+        self.instrumentation: Optional[Instrumentation] = None
+
+    def initialize_from_measurement(
+        self, y_meas: torch.Tensor, batch_size: int = 1, multiframe: bool = False
+    ) -> None:
         """
         Initialize x and k given a measurement y_meas.
 
@@ -72,15 +428,24 @@ class BlindDeconvolver(nn.Module):
             an identity blur, then allow optimizer to deviate from that.
 
         Args:
-            y_meas: Tensor of shape (B, 1, H, W). Currently B must be 1.
+            y_meas: Tensor of shape (B, 1, H, W). B must be 1 (shared by the
+                whole batch) or equal to `batch_size`.
+            batch_size: Number of (x, k) pairs to optimize jointly.
+            multiframe: If True, y_meas holds B blurs of one scene: a single
+                x is initialized from the sharpest frame (largest gradient
+                energy), with one kernel per frame (`batch_size` is ignored).
         """
         if y_meas.dim() != 4 or y_meas.shape[1] != 1:
             raise ValueError(
                 f"Expected y_meas of shape (B,1,H,W), got {tuple(y_meas.shape)}"
             )
 
-        if y_meas.shape[0] != 1:
-            raise NotImplementedError("Current implementation supports B=1 only.")
+        if multiframe:
+            batch_size = y_meas.shape[0]
+        elif y_meas.shape[0] not in (1, batch_size):
+            raise NotImplementedError(
+                f"y_meas batch ({y_meas.shape[0]}) must be 1 or batch_size ({batch_size})."
+            )
 
         device = self.config.device
         y_meas = y_meas.to(device)
@@ -90,32 +455,66 @@ class BlindDeconvolver(nn.Module):
         # Initialize x as the measurement (clipped to [0,1])
         x_init = y_meas.clone().detach()
         x_init = x_init.clamp(0.0, 1.0)
+        if multiframe:
+            energy = (
+                x_init.diff(dim=-1).square().mean(dim=(1, 2, 3))
+                + x_init.diff(dim=-2).square().mean(dim=(1, 2, 3))
+            )
+            sharpest = int(energy.argmax())
+            x_init = x_init[sharpest : sharpest + 1].clone()
+        else:
+            x_init = x_init.expand(batch_size, C, H, W).clone()
 
         # Initialize kernel as a length-1 motion blur (acts like an impulse)
         k_np = motion_psf(size=self.config.kernel_size, length=1, angle=0.0)
         k_init = numpy_kernel_to_tensor(k_np)  # (1,1,Kh,Kw)
-        k_init = k_init.to(device)
+        k_init = k_init.to(device).repeat(batch_size, 1, 1, 1)
 
         # Register as learnable parameters
         self.x_param = nn.Parameter(x_init)
         self.k_param = nn.Parameter(k_init)
+        self.k_support = None
 
         # Move module parameters to device
         self.to(device)
 
+    def perturb_starts(self, generator: Optional[torch.Generator] = None) -> None:
+        """
+        Perturb every batch element except the first to diversify starts.
+
+        x gets additive Gaussian noise (`start_noise`, then clipped to [0,1]);
+        k is blended with a random non-negative kernel (`start_kernel_mix`)
+        so that starts leave the impulse initialization.
+        """
+        if self.x_param is None or self.k_param is None or self.x_param.shape[0] < 2:
+            return
+
+        with torch.no_grad():
+            x = self.x_param.data[1:]
+            noise = torch.randn(x.shape, generator=generator).to(x.device)
+            x.add_(self.config.start_noise * noise).clamp_(0.0, 1.0)
+
+            k = self.k_param.data[1:]
+            k_rand = torch.rand(k.shape, generator=generator).to(k.device)
+            k_rand /= k_rand.sum(dim=(-2, -1), keepdim=True)
+            k.lerp_(k_rand, self.config.start_kernel_mix)
+
     def project_kernel(self) -> None:
         """
         Enforce basic kernel constraints after each optimizer step:
+          - zero outside the active support (`kernel_support_every`)
           - non-negativity
-          - normalization to sum 1
+          - normalization to sum 1 (per kernel in the batch)
         """
         if self.k_param is None:
             return
 
         with torch.no_grad():
             k = self.k_param.data
+            if self.k_support is not None:
+                k.mul_(self.k_support)
             k.clamp_(min=0.0)
-            k /= k.sum() + 1e-8
+            k /= k.sum(dim=(-2, -1), keepdim=True) + 1e-8
             self.k_param.data = k
 
     def project_image(self) -> None:
@@ -153,17 +552,228 @@ class BlindDeconvolver(nn.Module):
         """
         device = self.config.device
         y_meas = y_meas.to(device)
+        num_starts = max(1, self.config.num_starts)
 
         # Initialize variables
-        self.initialize_from_measurement(y_meas)
+        self.initialize_from_measurement(y_meas, batch_size=num_starts)
+        if num_starts > 1:
+            generator = torch.Generator()
+            if self.config.seed is not None:
+                generator.manual_seed(self.config.seed)
+            self.perturb_starts(generator)
+
+        weights = {name: getattr(self.config, name) for name in BATCHABLE_FIELDS}
+        curves, ids = self._optimize(
+            y_meas, weights, verbose, log_fn, log_every, prune=num_starts > 1
+        )
+        self.start_losses = [curve[-1] for curve in curves]
+
+        # Pick the lowest final loss among the surviving starts
+        best_pos = min(range(len(ids)), key=lambda pos: curves[ids[pos]][-1])
+        best = ids[best_pos]
+
+        # Return detached copies
+        x_hat = self.x_param[best_pos : best_pos + 1].detach().clone()
+        k_hat = self.k_param[best_pos : best_pos + 1].detach().clone()
+        return x_hat, k_hat, curves[best]
+
+    def run_grid(
+        self,
+        y_meas: torch.Tensor,
+        settings: Sequence[Dict[str, float]],
+        verbose: bool = True,
+        log_fn: Optional[Callable[[dict, int], None]] = None,
+        log_every: int = 10,
+    ) -> Tuple[torch.Tensor, torch.Tensor, List[List[float]]]:
+        """
+        Solve several hyperparameter settings at once as a batch.
+
+        Each entry of `settings` overrides any of `BATCHABLE_FIELDS` (prior
+        weights and learning rates) for one batch element; missing keys fall
+        back to the config. The measurement is shared across the batch, the
+        per-sample objectives are summed so each element follows its own
+        gradient, and the weights are broadcast per element in `map_objective`.
+
+        Args:
+            y_meas: Observed blurred image, shape (1, 1, H, W) (shared), or
+                (N, 1, H, W) with one measurement per setting.
+            settings: N dicts of per-element overrides.
+            verbose: If True, shows a progress bar.
+            log_fn: Optional callback receiving (metrics_dict, step); per-setting
+                values are reported under "<name>/<index>" keys.
+            log_every: Log every N iterations when log_fn is provided.
+
+        Returns:
+            x_hat: Estimated sharp images, shape (N, 1, H, W).
+            k_hat: Estimated PSF kernels, shape (N, 1, Kh, Kw).
+            losses: Per-setting loss curves (N lists of num_iters floats).
+        """
+        if len(settings) == 0:
+            raise ValueError("settings must contain at least one entry.")
+        unknown = {key for s in settings for key in s} - set(BATCHABLE_FIELDS)
+        if unknown:
+            raise ValueError(
+                f"Cannot batch over {sorted(unknown)}. Supported: {list(BATCHABLE_FIELDS)}"
+            )
+
+        device = self.config.device
+        y_meas = y_meas.to(device)
+        self.initialize_from_measurement(y_meas, batch_size=len(settings))
+
+        weights: Dict[str, BatchValue] = {}
+        for name in BATCHABLE_FIELDS:
+            values = [float(s.get(name, getattr(self.config, name))) for s in settings]
+            if all(v == values[0] for v in values):
+                weights[name] = values[0]
+            else:
+                weights[name] = torch.tensor(values, device=device)
+
+        curves, _ = self._optimize(y_meas, weights, verbose, log_fn, log_every)
+
+        x_hat = self.x_param.detach().clone()
+        k_hat = self.k_param.detach().clone()
+        return x_hat, k_hat, curves
+
+    def run_multiframe(
+        self,
+        y_frames: torch.Tensor,
+        verbose: bool = True,
+        log_fn: Optional[Callable[[dict, int], None]] = None,
+        log_every: int = 10,
+    ) -> Tuple[torch.Tensor, torch.Tensor, List[float]]:
+        """
+        Jointly estimate one sharp image and a kernel per frame from N
+        differently blurred captures of the same scene.
+
+        All frames are predicted from the shared x in a single convolution
+        with the N kernels as output channels (`forward_convolve`). The
+        objective is the sum over frames of each frame's data and kernel
+        terms, plus the image priors once (`map_objective`); the per-frame
+        losses are reported under "<name>/<frame>" keys. Frames must be
+        registered to each other (a common shift is absorbed by the kernels).
+        Multi-start (`num_starts`) does not apply.
+
+        Args:
+            y_frames: Observed blurred frames, shape (N, 1, H, W).
+            verbose: If True, shows a progress bar.
+            log_fn: Optional callback receiving (metrics_dict, step).
+            log_every: Log every N iterations when log_fn is provided.
+
+        Returns:
+            x_hat: Estimated sharp image, shape (1, 1, H, W).
+            k_hat: Estimated PSF kernels, shape (N, 1, Kh, Kw).
+            losses: Joint loss (summed over frames) over iterations.
+        """
+        device = self.config.device
+        y_frames = y_frames.to(device)
+        self.initialize_from_measurement(y_frames, multiframe=True)
+
+        weights = {name: getattr(self.config, name) for name in BATCHABLE_FIELDS}
+        curves, _ = self._optimize(y_frames, weights, verbose, log_fn, log_every)
+
+        x_hat = self.x_param.detach().clone()
+        k_hat = self.k_param.detach().clone()
+        return x_hat, k_hat, [sum(values) for values in zip(*curves)]
+
+    def _optimize(
+        self,
+        y_meas: torch.Tensor,
+        weights: Dict[str, BatchValue],
+        verbose: bool,
+        log_fn: Optional[Callable[[dict, int], None]],
+        log_every: int,
+        prune: bool = False,
+    ) -> Tuple[List[List[float]], List[int]]:
+        """Optimization loop shared by `run`, `run_grid` and `run_multiframe`.
+
+        Expects `initialize_from_measurement` to have been called. `weights`
+        maps every name in `BATCHABLE_FIELDS` to a float or a (B,) tensor.
+        With `prune=True`, every `config.prune_every` iterations batch elements
+        whose loss exceeds `config.prune_ratio` times the best are dropped.
+        With `config.instrument`, every component (objective terms, backward,
+        optimizer steps, projection) is timed and the per-iteration means
+        since the previous log step are added to the `log_fn` metrics as
+        "time_ms/<component>" and "allocs/<component>". With
+        `config.compile_step` the whole step is timed as "compiled_step".
+        With a reduced `config.precision`, the objective is evaluated under
+        autocast except during the last `config.fp32_final_iters` iterations.
+        With `config.patch_size`, kernel-only iterations use the stochastic
+        patch data term (`_sample_patches`), so their losses are estimates;
+        `compile_step` is not used.
+        With `config.kernel_regions`, iterations before the final full-image
+        x solve use the data term on the salient regions only, without
+        `compile_step`.
+        With `config.kernel_rank`, the k optimizer updates the separable
+        factors `k_factors` (re-factorized after each kernel step) and
+        `compile_step` is not used. With `config.kernel_support_every`, the
+        data term only convolves with the active support's bounding box
+        (`_update_kernel_support`), also without `compile_step`.
+        With `config.max_kernel_size`, the kernel may be enlarged every
+        `config.kernel_grow_every` iterations (`_grow_kernel`). The "fourier"
+        x optimizer also runs without `compile_step`. With a single x and N
+        kernels (`run_multiframe`) the samples are the frames.
+
+        Returns:
+            curves: Per-sample loss curves, indexed by original batch position
+                (pruned samples have shorter curves).
+            ids: Original batch positions of the surviving samples, in the
+                order they appear in `x_param` / `k_param`.
+        """
+        lr_x = weights["lr_x"]
+        lr_k = weights["lr_k"]
+        lambdas = {
+            name: value for name, value in weights.items() if name.startswith("lambda_")
+        }
+        batch_size = max(self.x_param.shape[0], self.k_param.shape[0])
+        ids = list(range(batch_size))
+        low_rank = self.config.kernel_rank > 0
+        if low_rank:
+            self._init_kernel_factors()
+        active_set = self.config.kernel_support_every > 0
+        if low_rank and active_set:
+            raise ValueError("kernel_rank and kernel_support_every cannot be combined")
+        compiled = self.config.compile_step and not (
+            low_rank
+            or active_set
+            or self.config.optimizer_x == "fourier"
+            or self.config.patch_size > 0
+            or self.config.kernel_regions > 0
+        )
+        # Bounding box of the active kernel support (None = whole kernel)
+        support_state: Dict[str, Optional[Tuple[int, int, int, int]]] = {"box": None}
 
         # Create separate optimizers for staged training
-        opt_x = optim.Adam([self.x_param], lr=self.config.lr_x)
-        opt_k = optim.Adam([self.k_param], lr=self.config.lr_k)
+        # (per-sample learning rates are applied in `_optimizer_step`)
+        opt_x, opt_k = self._make_optimizers(lr_x, lr_k)
+        use_lbfgs = isinstance(opt_x, optim.LBFGS)
+        use_fista = isinstance(opt_k, ProjectedFISTA)
+        # L-BFGS curvature pairs assume a fixed objective and unprojected
+        # steps; its history restarts after k changes or x gets clipped.
+        lbfgs_stale = {"value": False}
 
-        freeze_k_iters = 50  # number of iterations where we only optimize the kernel
+        if self.config.precision not in PRECISIONS:
+            raise ValueError(
+                f"Unknown precision '{self.config.precision}'. Supported: {list(PRECISIONS)}"
+            )
+        low_precision = PRECISIONS[self.config.precision]
+        low_precision_iters = self.config.num_iters - max(0, self.config.fp32_final_iters)
 
-        losses: List[float] = []
+        curves: List[List[float]] = [[] for _ in range(batch_size)]
+
+        inst = None
+        if self.config.instrument:
+            inst = Instrumentation(
+                self.config.device,
+                track_allocations=self.config.instrument_allocations,
+            )
+        self.instrumentation = inst
+        profiler = None
+        if self.config.profile_window is not None:
+            profiler = ProfilerWindow(
+                self.config.profile_window,
+                self.config.profile_trace_path,
+                device=self.config.device,
+            )
 
         iterator = trange(
             self.config.num_iters,
@@ -172,24 +782,85 @@ class BlindDeconvolver(nn.Module):
             leave=False,
         )
 
-        for it in iterator:
+        need_components = log_fn is not None
+        step_inst = None if compiled else inst
+
+        analytic = self.config.analytic_data_grad
+        # Closed-form data gradients of the last `objective` call, added by `backward`
+        data_grads: Dict[str, Optional[torch.Tensor]] = {}
+        # Patches of the current iteration (None = full-image data term)
+        patch_state: Dict[str, Optional[PatchSample]] = {"sample": None}
+        patch_generator = torch.Generator().manual_seed(self.config.seed or 0)
+        regions = None
+        if self.config.kernel_regions > 0:
+            regions = select_regions(
+                y_meas, self.config.kernel_regions, self.config.region_size
+            )
+        region_iters = self.config.num_iters - max(0, self.config.region_x_iters)
+
+        def objective(autocast_dtype, return_components=False, instrumentation=None):
+            patches = patch_state["sample"]
+            use_analytic = analytic and patches is None and not (low_rank or active_set)
+            k, factors = self.k_param, None
+            if low_rank:
+                factors = self._kernel_factors()
+                k = low_rank_kernel(*factors)
+            with _autocast(self.x_param.device, autocast_dtype):
+                result = map_objective(
+                    self.x_param,
+                    k,
+                    y_meas,
+                    image_prior_fn=self.config.image_prior_fn,
+                    return_components=return_components,
+                    reduction="none",
+                    instrumentation=instrumentation,
+                    include_data=not use_analytic,
+                    patches=patches,
+                    kernel_factors=factors,
+                    kernel_box=support_state["box"],
+                    **lambdas,
+                )
+            if not use_analytic:
+                return result
+
+            loss, components = result if return_components else (result, None)
+            need_grads = torch.is_grad_enabled()
+            with section(instrumentation, "data"):
+                loss_data, data_grads["x"], data_grads["k"] = data_fidelity_grad(
+                    self.x_param,
+                    self.k_param,
+                    y_meas,
+                    reduction="none",
+                    need_grad_x=need_grads,
+                    need_grad_k=need_grads,
+                )
+            loss = loss + loss_data
+            if components is None:
+                return loss
+            components["loss_data"] = loss_data
+            return loss, components
+
+        def backward(loss: torch.Tensor) -> None:
+            # Per-sample objectives are independent, so their sum gives each
+            # batch element exactly its own gradient.
+            if loss.requires_grad:
+                loss.sum().backward()
+            if analytic:
+                for param, name in ((self.x_param, "x"), (self.k_param, "k")):
+                    grad = data_grads.pop(name, None)
+                    if grad is None:
+                        continue
+                    if param.grad is None:
+                        param.grad = grad.to(param.dtype)
+                    else:
+                        param.grad.add_(grad)
+
+        def step(update_k: bool, update_x: bool, autocast_dtype: Optional[torch.dtype]):
+            """One iteration: objective, gradient, update(s) and projection."""
             opt_x.zero_grad()
             opt_k.zero_grad()
 
-            need_components = log_fn is not None
-            result = map_objective(
-                self.x_param,
-                self.k_param,
-                y_meas,
-                lambda_x=self.config.lambda_x,
-                lambda_k_l2=self.config.lambda_k_l2,
-                lambda_k_center=self.config.lambda_k_center,
-                lambda_k_auto=self.config.lambda_k_auto,
-                lambda_pink=self.config.lambda_pink,
-                lambda_diffusion=self.config.lambda_diffusion,
-                image_prior_fn=self.config.image_prior_fn,
-                return_components=need_components,
-            )
+            result = objective(autocast_dtype, need_components, step_inst)
 
             if need_components:
                 loss, loss_components = result
@@ -197,42 +868,438 @@ class BlindDeconvolver(nn.Module):
                 loss = result
                 loss_components = None
 
-            loss.backward()
+            with section(step_inst, "backward"):
+                backward(loss)
 
-            if it < freeze_k_iters:
-                # Only update kernel in the first phase
-                opt_k.step()
-                opt_k.zero_grad()
-            else:
-                # Update both x and k
-                opt_k.step()
-                opt_k.zero_grad()
-                opt_x.step()
-                opt_x.zero_grad()
+            if update_k:
+                with section(step_inst, "step_k"):
+                    if use_fista:
+                        with torch.no_grad():
+                            opt_k.step(loss.detach(), lambda: objective(autocast_dtype))
+                    else:
+                        _optimizer_step(
+                            opt_k, self.k_factors if low_rank else self.k_param, lr_k
+                        )
+                lbfgs_stale["value"] = True
+            if update_x:
+                with section(step_inst, "step_x"):
+                    if use_lbfgs:
 
-            # Project constraints
-            self.project_kernel()
-            self.project_image()
-
-            loss_value = float(loss.detach().cpu().item())
-            losses.append(loss_value)
-
-            if log_fn is not None and log_every > 0:
-                if (it % log_every == 0) or (it == self.config.num_iters - 1):
-                    metrics = {"loss": loss_value}
-                    if loss_components is not None:
-                        metrics.update(
-                            {
-                                name: float(val.detach().cpu().item())
-                                for name, val in loss_components.items()
-                            }
+                        def closure():
+                            opt_x.zero_grad()
+                            closure_loss = objective(autocast_dtype)
+                            backward(closure_loss)
+                            return closure_loss.sum()
+
+                        if lbfgs_stale["value"]:
+                            opt_x.state.pop(self.x_param, None)
+                        opt_x.step(closure)
+                        with torch.no_grad():
+                            x = self.x_param
+                            lbfgs_stale["value"] = bool(((x < 0.0) | (x > 1.0)).any())
+                    else:
+                        _optimizer_step(opt_x, self.x_param, lr_x)
+
+            # Project constraints (FISTA keeps its own iterates on the simplex)
+            with section(step_inst, "projection"):
+                if low_rank:
+                    if update_k:
+                        self._refactor_kernel(opt_k)
+                elif not use_fista:
+                    self.project_kernel()
+                self.project_image()
+
+            return loss.detach(), loss_components
+
+        def functional_step(
+            update_k: bool, update_x: bool, autocast_dtype: Optional[torch.dtype]
+        ):
+            group = opt_k.param_groups[0]
+            loss, loss_components = _get_compiled_step()(
+                self.x_param,
+                self.k_param,
+                y_meas,
+                opt_x.state[self.x_param],
+                opt_k.state[self.k_param],
+                lr_x,
+                lr_k,
+                group["betas"],
+                group["eps"],
+                lambdas,
+                self.config.image_prior_fn,
+                need_components,
+                update_k,
+                update_x,
+                autocast_dtype,
+            )
+            return loss, loss_components if need_components else None
+
+        step_fn = step
+        if compiled:
+            step_fn = self._compile_step(functional_step, step, (opt_x, opt_k))
+
+        prev_update_k = False
+        try:
+            for it in iterator:
+                if profiler is not None:
+                    profiler.step(it)
+
+                # Only update kernel in the first phase, then x and k per the schedule
+                update_k, update_x = self._update_schedule(it)
+                if use_fista and prev_update_k and not update_k:
+                    opt_k.reset_momentum()
+                prev_update_k = update_k
+                grown = (
+                    it > 0
+                    and self.config.kernel_grow_every > 0
+                    and it % self.config.kernel_grow_every == 0
+                    and self._grow_kernel(opt_k)
+                )
+                if active_set and (grown or it % self.config.kernel_support_every == 0):
+                    support_state["box"] = self._update_kernel_support()
+                autocast_dtype = low_precision if it < low_precision_iters else None
+                if regions is not None and it < region_iters:
+                    patch_state["sample"] = regions
+                elif update_k and not update_x:
+                    patch_state["sample"] = self._sample_patches(
+                        it, y_meas.shape, patch_generator
+                    )
+                else:
+                    patch_state["sample"] = None
+                with section(inst if compiled else None, "compiled_step"):
+                    loss, loss_components = step_fn(update_k, update_x, autocast_dtype)
+
+                loss_values = loss.detach().cpu().tolist()
+                for sample_id, value in zip(ids, loss_values):
+                    curves[sample_id].append(value)
+                if inst is not None:
+                    inst.end_iteration()
+
+                if log_fn is not None and log_every > 0:
+                    if (it % log_every == 0) or (it == self.config.num_iters - 1):
+                        metrics = self._format_metrics(loss_values, loss_components, ids)
+                        if inst is not None:
+                            metrics.update(inst.pop_metrics())
+                        log_fn(metrics, it)
+
+                if verbose:
+                    iterator.set_postfix({"loss": f"{min(loss_values):.6f}"})
+
+                if (
+                    prune
+                    and len(ids) > 1
+                    and self.config.prune_every > 0
+                    and (it + 1) % self.config.prune_every == 0
+                    and it < self.config.num_iters - 1
+                ):
+                    best_loss = min(loss_values)
+                    keep = [
+                        pos
+                        for pos, value in enumerate(loss_values)
+                        if value <= self.config.prune_ratio * best_loss + 1e-12
+                    ]
+                    if len(keep) < len(ids):
+                        self._select_batch(keep, (opt_x, opt_k))
+                        ids = [ids[pos] for pos in keep]
+                        index = torch.tensor(keep, device=self.x_param.device)
+                        lr_x, lr_k = (
+                            lr[index] if isinstance(lr, torch.Tensor) else lr
+                            for lr in (lr_x, lr_k)
                         )
-                    log_fn(metrics, it)
+                        lambdas = {
+                            name: value[index] if isinstance(value, torch.Tensor) else value
+                            for name, value in lambdas.items()
+                        }
+        finally:
+            if profiler is not None:
+                profiler.close()
 
-            if verbose:
-                iterator.set_postfix({"loss": f"{loss_value:.6f}"})
+        if use_fista:
+            opt_k.reset_momentum()
+        return curves, ids
 
-        # Return detached copies
-        x_hat = self.x_param.detach().clone()
-        k_hat = self.k_param.detach().clone()
-        return x_hat, k_hat, losses
+    def _compile_step(
+        self,
+        compiled_step: StepFn,
+        eager_step: StepFn,
+        optimizers: Sequence[optim.Optimizer],
+    ) -> StepFn:
+        """Run `compiled_step`, falling back to `eager_step` if it fails.
+
+        The compiled graph is specialized per phase (which of x / k are
+        updated, autocast dtype), shape and float weight values, and reused across
+        runs; pruning the batch compiles a graph for the smaller shape. If compiling or running
+        the compiled step raises, x and k are restored, a warning is emitted
+        and `eager_step` is used for the rest of the run.
+        """
+        state = {"fn": compiled_step, "verified": set()}
+
+        def fall_back(exc: Exception):
+            warnings.warn(f"torch.compile step failed ({exc!r}); using eager mode.")
+            state["fn"] = eager_step
+
+        try:
+            for opt in optimizers:
+                _init_adam_state(opt)
+        except NotImplementedError as exc:
+            fall_back(exc)
+
+        def run_step(
+            update_k: bool, update_x: bool, autocast_dtype: Optional[torch.dtype]
+        ):
+            args = (update_k, update_x, autocast_dtype)
+            if state["fn"] is eager_step:
+                return eager_step(*args)
+            key = (*args, self.x_param.shape[0])
+            if key in state["verified"]:
+                return compiled_step(*args)
+
+            snapshot = (self.x_param.detach().clone(), self.k_param.detach().clone())
+            try:
+                out = compiled_step(*args)
+            except Exception as exc:  # compilation is best-effort
+                with torch.no_grad():
+                    self.x_param.copy_(snapshot[0])
+                    self.k_param.copy_(snapshot[1])
+                fall_back(exc)
+                return eager_step(*args)
+            state["verified"].add(key)
+            return out
+
+        return run_step
+
+    def _make_optimizers(
+        self, lr_x: BatchValue, lr_k: BatchValue
+    ) -> Tuple[optim.Optimizer, optim.Optimizer]:
+        """Build the x and k optimizers selected in the config."""
+        cfg = self.config
+        if cfg.optimizer_x not in X_OPTIMIZERS:
+            raise ValueError(f"Unknown optimizer_x '{cfg.optimizer_x}'. Supported: {X_OPTIMIZERS}")
+        if cfg.optimizer_k not in K_OPTIMIZERS:
+            raise ValueError(f"Unknown optimizer_k '{cfg.optimizer_k}'. Supported: {K_OPTIMIZERS}")
+
+        if cfg.optimizer_x == "lbfgs":
+            if isinstance(lr_x, torch.Tensor):
+                raise ValueError("optimizer_x='lbfgs' does not support per-sample lr_x")
+            opt_x = optim.LBFGS(
+                [self.x_param],
+                lr=1.0,
+                max_iter=cfg.lbfgs_max_iter,
+                history_size=cfg.lbfgs_history,
+                line_search_fn="strong_wolfe",
+            )
+        elif cfg.optimizer_x == "fourier":
+            opt_x = FourierPreconditionedGD(
+                [self.x_param],
+                kernel_fn=lambda: self.k_param,
+                lr=1.0 if isinstance(lr_x, torch.Tensor) else lr_x,
+                damping=cfg.precondition_damping,
+            )
+        else:
+            opt_x = optim.Adam(
+                [self.x_param], lr=1.0 if isinstance(lr_x, torch.Tensor) else lr_x
+            )
+
+        if cfg.kernel_rank > 0 and cfg.optimizer_k != "adam":
+            raise ValueError("kernel_rank > 0 requires optimizer_k='adam'")
+        if cfg.kernel_support_every > 0 and cfg.optimizer_k != "adam":
+            raise ValueError("kernel_support_every > 0 requires optimizer_k='adam'")
+
+        if cfg.optimizer_k == "fista":
+            opt_k = ProjectedFISTA([self.k_param], lipschitz=cfg.fista_lipschitz)
+        else:
+            opt_k = optim.Adam(
+                [self.k_factors if cfg.kernel_rank > 0 else self.k_param],
+                lr=1.0 if isinstance(lr_k, torch.Tensor) else lr_k,
+            )
+        return opt_x, opt_k
+
+    def _update_schedule(self, it: int) -> Tuple[bool, bool]:
+        """Return (update_k, update_x) for iteration `it`.
+
+        The first `freeze_k_iters` iterations only update the kernel; after
+        that both are updated, or, with `alternate_every = N`, blocks of N
+        iterations alternate between x-only and k-only updates. With
+        `kernel_regions`, the last `region_x_iters` iterations only update x.
+        """
+        cfg = self.config
+        if cfg.kernel_regions > 0 and it >= cfg.num_iters - max(0, cfg.region_x_iters):
+            return False, True
+        if it < cfg.freeze_k_iters:
+            return True, False
+        if cfg.alternate_every <= 0:
+            return True, True
+        x_block = ((it - cfg.freeze_k_iters) // cfg.alternate_every) % 2 == 0
+        return not x_block, x_block
+
+    def _sample_patches(
+        self, it: int, shape: torch.Size, generator: torch.Generator
+    ) -> Optional[PatchSample]:
+        """Patches for a kernel-only iteration, or None for the full data term."""
+        cfg = self.config
+        if cfg.patch_size <= 0:
+            return None
+        H, W = shape[-2:]
+        growth = math.exp(min(it * math.log(max(cfg.patch_growth, 1.0)), 50.0))
+        count = int(min(cfg.patch_count_max, round(cfg.patch_count * growth)))
+        if count * cfg.patch_size**2 >= H * W:
+            return None
+        return sample_patches(H, W, cfg.patch_size, count, generator, self.x_param.device)
+
+    def _grow_kernel(self, opt_k: optim.Optimizer) -> bool:
+        """Pad the kernel when its border holds too much mass (`max_kernel_size`).
+
+        Returns:
+            Whether the kernel was enlarged.
+        """
+        cfg = self.config
+        k = self.k_param.detach()
+        size = k.shape[-1]
+        pad = min(cfg.kernel_grow_step, (cfg.max_kernel_size - size) // 2)
+        width = min(max(1, cfg.kernel_border_width), size // 2)
+        if pad <= 0:
+            return False
+        total = k.sum(dim=(-2, -1))
+        interior = k[..., width:-width, width:-width].sum(dim=(-2, -1))
+        border_mass = (total - interior) / total.clamp_min(1e-12)
+        if not bool((border_mass > cfg.kernel_border_mass).any()):
+            return False
+
+        def pad_kernel(t: torch.Tensor) -> torch.Tensor:
+            return F.pad(t, (pad, pad, pad, pad))
+
+        def pad_factors(t: torch.Tensor) -> torch.Tensor:
+            cols, rows = t[..., :size], t[..., size:]
+            return torch.cat([F.pad(cols, (pad, pad)), F.pad(rows, (pad, pad))], dim=-1)
+
+        old_k = self.k_param
+        self.k_param = nn.Parameter(pad_kernel(k))
+        if self.k_support is not None:
+            self.k_support = pad_kernel(self.k_support)
+        if self.k_factors is None:
+            _remap_optimizer_state(opt_k, old_k, self.k_param, pad_kernel)
+        else:
+            old_factors = self.k_factors
+            self.k_factors = nn.Parameter(pad_factors(old_factors.detach()))
+            _remap_optimizer_state(opt_k, old_factors, self.k_factors, pad_factors)
+        return True
+
+    def _update_kernel_support(self) -> Tuple[int, int, int, int]:
+        """Recompute `k_support` from the current kernel; returns its bounding box.
+
+        The box is shared by the batch (union of the per-sample supports) so
+        the data term stays a single convolution.
+        """
+        cfg = self.config
+        margin = max(0, cfg.support_margin)
+        with torch.no_grad():
+            k = self.k_param.detach()
+            peak = k.amax(dim=(-2, -1), keepdim=True)
+            significant = (k > cfg.support_threshold * peak).to(k.dtype)
+            grown = F.max_pool2d(significant, 2 * margin + 1, stride=1, padding=margin)
+            self.k_support = grown > 0
+            self.project_kernel()
+
+        active = self.k_support.flatten(0, 1).any(dim=0)
+        rows = active.any(dim=1).nonzero()
+        cols = active.any(dim=0).nonzero()
+        return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+
+    def _kernel_factors(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """(cols, rows) views of `k_factors`."""
+        Kh = self.k_param.shape[-2]
+        return self.k_factors[..., :Kh], self.k_factors[..., Kh:]
+
+    def _factorize_kernel(self) -> torch.Tensor:
+        """Factors (B, r, Kh + Kw) of `k_param` at the per-sample ranks set by the config.
+
+        r is the largest rank in the batch; the terms beyond a sample's own
+        rank are zero.
+        """
+        cfg = self.config
+        ranks = separable_ranks(self.k_param, cfg.kernel_rank_energy, cfg.kernel_rank)
+        return torch.cat(separable_factors(self.k_param, ranks), dim=-1)
+
+    def _init_kernel_factors(self) -> None:
+        self.k_factors = nn.Parameter(self._factorize_kernel())
+
+    def _refactor_kernel(self, opt_k: optim.Optimizer) -> None:
+        """Project the low-rank kernel and re-factorize it, carrying the Adam state.
+
+        Factor signs are aligned with the previous factors so the moment
+        estimates keep pointing the same way; a rank change pads (with zero
+        state) or drops trailing terms. The state of the zero terms beyond a
+        sample's rank is cleared, so they get no update and the sample
+        evolves as it would in a batch of its own.
+        """
+        old = self.k_factors
+        with torch.no_grad():
+            self.k_param.copy_(low_rank_kernel(*self._kernel_factors()))
+            self.project_kernel()
+            new = self._factorize_kernel()
+            shared = min(old.shape[1], new.shape[1])
+            agree = (new[:, :shared] * old[:, :shared]).sum(dim=-1, keepdim=True)
+            new[:, :shared] *= torch.where(agree < 0, -1.0, 1.0)
+
+            inactive = (new == 0).all(dim=-1, keepdim=True)
+
+            if new.shape == old.shape:
+                old.copy_(new)
+            else:
+                rank = new.shape[1]
+
+                def resize(t: torch.Tensor) -> torch.Tensor:
+                    if t.shape[1] >= rank:
+                        return t[:, :rank].clone()
+                    pad = t.new_zeros(t.shape[0], rank - t.shape[1], t.shape[2])
+                    return torch.cat([t, pad], 1)
+
+                self.k_factors = nn.Parameter(new)
+                _remap_optimizer_state(opt_k, old, self.k_factors, resize)
+
+            for value in opt_k.state.get(self.k_factors, {}).values():
+                if isinstance(value, torch.Tensor) and value.shape == new.shape:
+                    value.masked_fill_(inactive, 0.0)
+
+    def _select_batch(
+        self, keep: List[int], optimizers: Sequence[optim.Optimizer]
+    ) -> None:
+        """Keep only batch elements `keep` of x/k, carrying optimizer state."""
+        index = torch.tensor(keep, device=self.x_param.device)
+        for name in ("x_param", "k_param", "k_factors"):
+            old = getattr(self, name)
+            if old is None:
+                continue
+            new = nn.Parameter(old.detach()[index].clone())
+            for opt in optimizers:
+                _remap_optimizer_state(
+                    opt, old, new, lambda t: t[index].clone(), batch_fn=lambda t: t[index]
+                )
+            setattr(self, name, new)
+        if self.k_support is not None:
+            self.k_support = self.k_support[index]
+
+    @staticmethod
+    def _format_metrics(
+        loss_values: List[float],
+        loss_components: Optional[Dict[str, torch.Tensor]],
+        ids: Sequence[int],
+    ) -> Dict[str, float]:
+        """Flatten per-sample losses/components into a log_fn metrics dict.
+
+        With more than one sample, values are keyed "<name>/<original index>".
+        """
+        values = {"loss": torch.tensor(loss_values)}
+        if loss_components is not None:
+            values.update(
+                {name: val.detach().cpu().reshape(-1) for name, val in loss_components.items()}
+            )
+
+        metrics: Dict[str, float] = {}
+        for name, val in values.items():
+            if len(ids) == 1 or val.numel() == 1:
+                metrics[name] = float(val.reshape(-1)[0].item())
+            else:
+                for sample_id, item in zip(ids, val.tolist()):
+                    metrics[f"{name}/{sample_id}"] = float(item)
+        return metrics
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Optional, Tuple
 
 import torch
 import torch.nn.functional as F
@@ -15,11 +15,13 @@ def forward_convolve(
 
     Args:
         x: Tensor of shape (B, 1, H, W)   – input image(s)
-        k: Tensor of shape (1, 1, Kh, Kw) – PSF kernel
-           (you can later generalize to (B,1,Kh,Kw) if needed)
+        k: Tensor of shape (1, 1, Kh, Kw) – PSF kernel shared by all images,
+           or (B, 1, Kh, Kw) – one kernel per image (grouped convolution),
+           or (N, 1, Kh, Kw) with B = 1 – N blurs of one image (multi-frame)
 
     Returns:
-        y: Tensor of shape (B, 1, H, W) – blurred image(s)
+        y: Tensor of shape (B, 1, H, W) – blurred image(s), or (N, 1, H, W)
+           for the multi-frame case
     """
     if x.dim() != 4:
         raise ValueError(f"x must be 4D (B,1,H,W), got shape {tuple(x.shape)}")
@@ -28,18 +30,172 @@ def forward_convolve(
     if x.shape[1] != 1 or k.shape[1] != 1:
         raise ValueError("Only single-channel images/kernels are supported for now.")
 
-    _, _, Kh, Kw = k.shape
+    B = x.shape[0]
+    Kb, _, Kh, Kw = k.shape
+    if Kb not in (1, B) and B != 1:
+        raise ValueError(
+            f"k batch ({Kb}) must be 1 or match x batch ({B}) for per-sample kernels."
+        )
     # 'same' padding for odd-sized kernels
     pad_h = Kh // 2
     pad_w = Kw // 2
 
-    y = F.conv2d(x, k, padding=(pad_h, pad_w))
-    return y
+    if Kb == 1:
+        y = F.conv2d(x, k, padding=(pad_h, pad_w))
+        return y
+    if B == 1:
+        # One image, several kernels: the kernels are the output channels.
+        return F.conv2d(x, k, padding=(pad_h, pad_w)).transpose(0, 1)
+
+    # Per-sample kernels: fold the batch into channels and use one grouped conv.
+    H, W = x.shape[-2:]
+    y = F.conv2d(x.reshape(1, B, H, W), k, padding=(pad_h, pad_w), groups=B)
+    return y.reshape(B, 1, H, W)
+
+
+def support_convolve(
+    x: torch.Tensor,
+    k: torch.Tensor,
+    box: Tuple[int, int, int, int],
+) -> torch.Tensor:
+    """
+    `forward_convolve` for a kernel that is zero outside `box`.
+
+    Only the rows [r0, r1) and columns [c0, c1) of k are used. x is padded so
+    that the cropped kernel keeps its position relative to the full kernel's
+    centre (pads may be negative, which crops x), and a 'valid' convolution
+    follows, so the cost scales with the box instead of Kh x Kw.
+
+    Args:
+        x: Tensor of shape (B, 1, H, W).
+        k: Tensor of shape (1, 1, Kh, Kw) or (B, 1, Kh, Kw), odd sizes.
+        box: (r0, r1, c0, c1) bounds of the kernel's support.
+
+    Returns:
+        y: Tensor of shape (B, 1, H, W), or (N, 1, H, W) for one image and
+        N kernels (as in `forward_convolve`).
+    """
+    B, _, H, W = x.shape
+    Kb, _, Kh, Kw = k.shape
+    if Kb not in (1, B) and B != 1:
+        raise ValueError(
+            f"k batch ({Kb}) must be 1 or match x batch ({B}) for per-sample kernels."
+        )
+    r0, r1, c0, c1 = box
+    pad_h, pad_w = Kh // 2, Kw // 2
+    x = F.pad(x, (pad_w - c0, pad_w - (Kw - c1), pad_h - r0, pad_h - (Kh - r1)))
+    k = k[..., r0:r1, c0:c1]
+
+    if Kb == 1:
+        return F.conv2d(x, k)
+    if B == 1:
+        return F.conv2d(x, k).transpose(0, 1)
+    y = F.conv2d(x.reshape(1, B, *x.shape[-2:]), k, groups=B)
+    return y.reshape(B, 1, H, W)
+
+
+def separable_ranks(
+    k: torch.Tensor, energy: float = 1.0, max_rank: Optional[int] = None
+) -> torch.Tensor:
+    """Smallest rank of each kernel whose singular values keep `energy` of its squared norm.
+
+    Args:
+        k: Kernels of shape (Kb, 1, Kh, Kw).
+        energy: Fraction of sum(s^2) to keep, in (0, 1].
+        max_rank: Optional upper bound on the returned ranks.
+
+    Returns:
+        Integer ranks of shape (Kb,), each at least 1.
+    """
+    S = torch.linalg.svdvals(k[:, 0].detach().float())
+    sq = S**2
+    kept = sq.cumsum(dim=-1) / sq.sum(dim=-1, keepdim=True).clamp_min(1e-30)
+    ranks = (kept < energy - 1e-6).sum(dim=-1) + 1
+    return ranks.clamp(1, min(S.shape[-1], max_rank or S.shape[-1]))
+
+
+def separable_factors(
+    k: torch.Tensor, rank: int | torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Rank-`rank` SVD factors of kernels: k ~ sum_i cols[:, i, :, None] * rows[:, i, None, :].
+
+    The singular values are split evenly (sqrt) between columns and rows.
+
+    Args:
+        k: Kernels of shape (Kb, 1, Kh, Kw).
+        rank: Number of rank-1 terms to keep, or per-kernel ranks of shape
+            (Kb,). With per-kernel ranks the factors hold max(rank) terms and
+            the terms beyond a kernel's own rank are zero.
+
+    Returns:
+        (cols (Kb, r, Kh), rows (Kb, r, Kw)).
+    """
+    U, S, Vh = torch.linalg.svd(k[:, 0].detach().float())
+    ranks = torch.as_tensor(rank, device=S.device).reshape(-1, 1)
+    width = int(ranks.max())
+    active = torch.arange(width, device=S.device) < ranks
+    root = (S[:, :width].sqrt() * active).unsqueeze(-1)
+    cols = U[:, :, :width].transpose(1, 2) * root
+    rows = Vh[:, :width] * root
+    return cols.to(k.dtype), rows.to(k.dtype)
+
+
+def low_rank_kernel(cols: torch.Tensor, rows: torch.Tensor) -> torch.Tensor:
+    """Dense kernels (Kb, 1, Kh, Kw) from separable factors (see `separable_factors`)."""
+    return torch.einsum("bri,brj->bij", cols, rows).unsqueeze(1)
+
+
+def separable_convolve(
+    x: torch.Tensor,
+    cols: torch.Tensor,
+    rows: torch.Tensor,
+) -> torch.Tensor:
+    """
+    `forward_convolve` with a kernel given as a sum of separable terms.
+
+    Each of the r terms is a vertical 1D convolution with its column factor
+    followed by a horizontal one with its row factor (the horizontal pass
+    also sums the terms), so the cost per pixel is O(r (Kh + Kw)) instead of
+    O(Kh Kw). Equals `forward_convolve(x, low_rank_kernel(cols, rows))`.
+
+    Args:
+        x: Tensor of shape (B, 1, H, W).
+        cols: Column factors (1, r, Kh) shared by all images, or (B, r, Kh).
+        rows: Row factors (1, r, Kw) or (B, r, Kw).
+
+    Returns:
+        y: Tensor of shape (B, 1, H, W), or (N, 1, H, W) for one image and
+        N kernels (as in `forward_convolve`).
+    """
+    B, _, H, W = x.shape
+    Kb, r, Kh = cols.shape
+    Kw = rows.shape[-1]
+    if Kb not in (1, B) and B != 1:
+        raise ValueError(
+            f"Factor batch ({Kb}) must be 1 or match x batch ({B}) for per-sample kernels."
+        )
+    pad_h, pad_w = Kh // 2, Kw // 2
+
+    if Kb == 1:
+        t = F.conv2d(x, cols.reshape(r, 1, Kh, 1), padding=(pad_h, 0))
+        return F.conv2d(t, rows.reshape(1, r, 1, Kw), padding=(0, pad_w))
+
+    if B == 1:
+        t = F.conv2d(x, cols.reshape(Kb * r, 1, Kh, 1), padding=(pad_h, 0))
+        y = F.conv2d(t, rows.reshape(Kb, r, 1, Kw), padding=(0, pad_w), groups=Kb)
+        return y.transpose(0, 1)
+
+    t = F.conv2d(
+        x.reshape(1, B, H, W), cols.reshape(B * r, 1, Kh, 1), padding=(pad_h, 0), groups=B
+    )
+    y = F.conv2d(t, rows.reshape(B, r, 1, Kw), padding=(0, pad_w), groups=B)
+    return y.reshape(B, 1, H, W)
 
 
 def add_gaussian_noise(
     y: torch.Tensor,
     sigma: float = 0.0,
+    generator: Optional[torch.Generator] = None,
 ) -> torch.Tensor:
     """
     Add i.i.d. Gaussian noise with std sigma to y.
@@ -47,13 +203,19 @@ def add_gaussian_noise(
     Args:
         y: Tensor of shape (B, 1, H, W)
         sigma: noise standard deviation (in same units as y)
+        generator: optional CPU generator for reproducible noise (the global
+            RNG is used otherwise)
 
     Returns:
         y_noisy: Tensor of same shape as y
     """
     if sigma <= 0.0:
         return y
-    noise = torch.randn_like(y) * float(sigma)
+    if generator is not None:
+        noise = torch.randn(y.shape, generator=generator, dtype=y.dtype).to(y.device)
+    else:
+        noise = torch.randn_like(y)
+    noise = noise * float(sigma)
     return y + noise
 
 
@@ -61,6 +223,7 @@ def forward_model(
     x: torch.Tensor,
     k: torch.Tensor,
     noise_sigma: float = 0.0,
+    generator: Optional[torch.Generator] = None,
 ) -> torch.Tensor:
     """
     Full forward model: convolution + optional Gaussian noise.
@@ -69,10 +232,11 @@ def forward_model(
         x: (B, 1, H, W) input image(s)
         k: (1, 1, Kh, Kw) PSF kernel
         noise_sigma: standard deviation of additive Gaussian noise
+        generator: optional CPU generator for the noise draw
 
     Returns:
         y: (B, 1, H, W) blurred (and possibly noisy) measurements
     """
     y = forward_convolve(x, k)
-    y = add_gaussian_noise(y, noise_sigma)
+    y = add_gaussian_noise(y, noise_sigma, generator)
     return y
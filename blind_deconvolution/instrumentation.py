@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import contextlib
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, Optional, Tuple
+
+import torch
+
+from utils.profiling import MemoryTracker, synchronize
+
+
+class Instrumentation:
+    """Per-component wall time and allocation counters for solver iterations.
+
+    Code under measurement wraps each component in `section(name)`. Sections
+    are flat (do not nest them). Each section is also emitted as a
+    `torch.profiler.record_function` range so it shows up by name in
+    profiler traces.
+
+    Args:
+        device: Device the solver runs on; CUDA is synchronized at section
+            boundaries so times cover the queued kernels.
+        track_allocations: Also count tensor allocations per section (adds
+            dispatch overhead on CPU).
+    """
+
+    def __init__(self, device: str | torch.device = "cpu", track_allocations: bool = True):
+        self.device = torch.device(device)
+        self.track_allocations = track_allocations
+        self._time = defaultdict(float)
+        self._allocs = defaultdict(int)
+        self._total_time = defaultdict(float)
+        self._total_allocs = defaultdict(int)
+        self._iters = 0
+        self._total_iters = 0
+
+    @contextlib.contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        synchronize(self.device)
+        tracker = MemoryTracker(self.device) if self.track_allocations else None
+        with torch.profiler.record_function(name):
+            start = time.perf_counter()
+            if tracker is not None:
+                with tracker:
+                    yield
+            else:
+                yield
+            synchronize(self.device)
+            elapsed = time.perf_counter() - start
+        self._time[name] += elapsed
+        self._total_time[name] += elapsed
+        if tracker is not None:
+            self._allocs[name] += tracker.num_allocations
+            self._total_allocs[name] += tracker.num_allocations
+
+    def end_iteration(self) -> None:
+        self._iters += 1
+        self._total_iters += 1
+
+    def pop_metrics(self) -> Dict[str, float]:
+        """Mean per-iteration time (ms) / allocations per section since the last pop."""
+        metrics = self._format(self._time, self._allocs, max(1, self._iters))
+        self._time.clear()
+        self._allocs.clear()
+        self._iters = 0
+        return metrics
+
+    def summary(self) -> Dict[str, float]:
+        """Mean per-iteration time (ms) / allocations per section over the whole run."""
+        return self._format(self._total_time, self._total_allocs, max(1, self._total_iters))
+
+    def _format(self, times, allocs, iters: int) -> Dict[str, float]:
+        metrics = {f"time_ms/{name}": 1e3 * value / iters for name, value in times.items()}
+        if self.track_allocations:
+            metrics.update(
+                {f"allocs/{name}": value / iters for name, value in allocs.items()}
+            )
+        return metrics
+
+
+def section(instrumentation: Optional[Instrumentation], name: str):
+    """`instrumentation.section(name)`, or a no-op context when disabled."""
+    if instrumentation is None:
+        return contextlib.nullcontext()
+    return instrumentation.section(name)
+
+
+class ProfilerWindow:
+    """Record a torch.profiler trace for iterations [start, stop) and export it.
+
+    Call `step(it)` at the top of every iteration and `close()` after the loop.
+    The Chrome trace is written to `trace_path` when the window ends.
+    """
+
+    def __init__(
+        self,
+        window: Tuple[int, int],
+        trace_path: str,
+        device: str | torch.device = "cpu",
+    ):
+        self.start, self.stop = window
+        self.trace_path = trace_path
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.device(device).type == "cuda":
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._activities = activities
+        self._profiler: Optional[torch.profiler.profile] = None
+
+    def step(self, it: int) -> None:
+        if it == self.start and self._profiler is None:
+            self._profiler = torch.profiler.profile(
+                activities=self._activities, record_shapes=True, profile_memory=True
+            )
+            self._profiler.__enter__()
+        elif it == self.stop:
+            self.close()
+
+    def close(self) -> None:
+        if self._profiler is None:
+            return
+        self._profiler.__exit__(None, None, None)
+        self._profiler.export_chrome_trace(self.trace_path)
+        self._profiler = None
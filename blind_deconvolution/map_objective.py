@@ -1,40 +1,284 @@
 from __future__ import annotations
 
-from typing import Callable, Dict, Optional, Tuple
+from typing import Callable, Dict, NamedTuple, Optional, Tuple, Union
 
 import torch
-
-from blind_deconvolution.forward_model import forward_model
+import torch.nn.functional as F
+
+from blind_deconvolution.forward_model import (
+    forward_convolve,
+    forward_model,
+    separable_convolve,
+    support_convolve,
+)
+from blind_deconvolution.instrumentation import Instrumentation, section
 from blind_deconvolution.priors.pink_noise import pink_noise_loss
 from blind_deconvolution.priors.diffusion import diffusion_prior_loss
 
+# Prior weights may be Python floats or per-sample tensors of shape (B,).
+Weight = Union[float, torch.Tensor]
+
+
+def _is_active(weight: Weight) -> bool:
+    """Return True if a (scalar or per-sample) weight enables its term.
+
+    While tracing with torch.compile, per-sample weights are assumed active
+    (the check is data-dependent); zero entries still zero their samples' terms.
+    """
+    if isinstance(weight, torch.Tensor):
+        if torch.compiler.is_compiling():
+            return True
+        return bool(torch.any(weight != 0.0))
+    return weight > 0.0
+
+
+def _check_reduction(reduction: str) -> None:
+    if reduction not in ("mean", "none"):
+        raise ValueError(f"reduction must be 'mean' or 'none', got '{reduction}'")
+
 
 def data_fidelity_loss(
     x: torch.Tensor,
     k: torch.Tensor,
     y_meas: torch.Tensor,
+    reduction: str = "mean",
+    kernel_factors: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+    kernel_box: Optional[Tuple[int, int, int, int]] = None,
 ) -> torch.Tensor:
     """Compute the data term || y_meas - k * x ||^2.
 
     Args:
         x: Sharp image tensor of shape (B, 1, H, W).
-        k: PSF kernel tensor of shape (1, 1, Kh, Kw).
-        y_meas: Measured blurred image of shape (B, 1, H, W).
+        k: PSF kernel tensor of shape (1, 1, Kh, Kw) or (B, 1, Kh, Kw), or
+            (N, 1, Kh, Kw) with B = 1 (multi-frame, see `forward_convolve`).
+        y_meas: Measured blurred image of shape (B, 1, H, W) or (1, 1, H, W)
+            (broadcast across the batch).
+        reduction: "mean" for the scalar MSE, "none" for per-sample MSEs (B,).
+        kernel_factors: Optional separable factors (cols, rows) of k; the
+            convolution is then done with `separable_convolve`.
+        kernel_box: Optional (r0, r1, c0, c1) bounds outside which k is zero;
+            the convolution is then done with `support_convolve`.
 
     Returns:
-        Scalar tensor (0D) with the mean squared error.
+        Scalar tensor (0D) with the mean squared error, or a (B,) tensor.
     """
-    y_pred = forward_model(x, k, noise_sigma=0.0)
-    loss = torch.mean((y_pred - y_meas) ** 2)
+    _check_reduction(reduction)
+    if kernel_factors is not None:
+        y_pred = separable_convolve(x, *kernel_factors)
+    elif kernel_box is not None:
+        y_pred = support_convolve(x, k, kernel_box)
+    else:
+        y_pred = forward_model(x, k, noise_sigma=0.0)
+    sq_err = (y_pred - y_meas) ** 2
+    if reduction == "none":
+        return sq_err.mean(dim=(1, 2, 3))
+    loss = torch.mean(sq_err)
     return loss
 
 
+class PatchSample(NamedTuple):
+    """Top-left corners (N,) of N square patches of side `size` (corners may be negative).
+
+    `unbiased=True` marks uniformly drawn patches whose loss is rescaled to
+    estimate the full-image error; otherwise (fixed, hand-picked regions) the
+    loss is the plain mean over the covered pixels.
+    """
+
+    top: torch.Tensor
+    left: torch.Tensor
+    size: int
+    unbiased: bool = True
+
+
+def sample_patches(
+    height: int,
+    width: int,
+    patch_size: int,
+    num_patches: int,
+    generator: Optional[torch.Generator] = None,
+    device: str | torch.device = "cpu",
+) -> PatchSample:
+    """Draw patch corners uniformly from [-(P-1), H-1] x [-(P-1), W-1].
+
+    Patches may stick out of the image (that part is ignored), which gives
+    every pixel the same probability of being covered and makes
+    `patch_data_fidelity_loss` an unbiased estimate of `data_fidelity_loss`.
+    """
+    top = torch.randint(1 - patch_size, height, (num_patches,), generator=generator)
+    left = torch.randint(1 - patch_size, width, (num_patches,), generator=generator)
+    return PatchSample(top.to(device), left.to(device), patch_size)
+
+
+def _gather_windows(
+    t: torch.Tensor, top: torch.Tensor, left: torch.Tensor, size_h: int, size_w: int
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Windows (B,N,size_h,size_w) of t (B,1,H,W) at the given corners, zero outside t.
+
+    Also returns the (N,size_h,size_w) mask of in-image pixels.
+    """
+    H, W = t.shape[-2:]
+    rows = top[:, None] + torch.arange(size_h, device=t.device)
+    cols = left[:, None] + torch.arange(size_w, device=t.device)
+    valid = ((rows >= 0) & (rows < H))[:, :, None] & ((cols >= 0) & (cols < W))[:, None, :]
+    windows = t[:, 0][:, rows.clamp(0, H - 1)[:, :, None], cols.clamp(0, W - 1)[:, None, :]]
+    return windows * valid, valid
+
+
+def patch_data_fidelity_loss(
+    x: torch.Tensor,
+    k: torch.Tensor,
+    y_meas: torch.Tensor,
+    patches: PatchSample,
+    reduction: str = "mean",
+) -> torch.Tensor:
+    """Unbiased minibatch estimate of `data_fidelity_loss` from random patches.
+
+    Each patch of y is predicted from the matching window of x plus a
+    kernel-sized halo (zero outside the image, as with 'same' padding), so the
+    cost depends on the number and size of patches, not on the image area.
+    With corners from `sample_patches`, the expectation equals the full-image
+    mean squared error. For `patches.unbiased=False` it is the mean squared
+    error over the in-image pixels of the patches instead.
+
+    Args:
+        x: Sharp image tensor of shape (B, 1, H, W).
+        k: PSF kernel tensor of shape (1, 1, Kh, Kw) or (B, 1, Kh, Kw), odd sizes,
+            or (N, 1, Kh, Kw) with B = 1 (multi-frame, see `forward_convolve`).
+        y_meas: Measured blurred image of shape (B, 1, H, W) or (1, 1, H, W).
+        patches: Patch corners and size, shared by the batch.
+        reduction: "mean" for a scalar, "none" for per-sample estimates (B,).
+
+    Returns:
+        Scalar tensor (0D) or a (B,) tensor.
+    """
+    _check_reduction(reduction)
+    B, _, H, W = x.shape
+    Kb, _, Kh, Kw = k.shape
+    P = patches.size
+    N = patches.top.numel()
+    pad_h, pad_w = Kh // 2, Kw // 2
+
+    x_win, _ = _gather_windows(
+        x, patches.top - pad_h, patches.left - pad_w, P + 2 * pad_h, P + 2 * pad_w
+    )
+    y_win, mask = _gather_windows(y_meas, patches.top, patches.left, P, P)
+    if Kb == 1:
+        y_pred = F.conv2d(x_win.reshape(B * N, 1, P + 2 * pad_h, P + 2 * pad_w), k)
+    elif B == 1:
+        # Multi-frame: every kernel blurs the same windows
+        y_pred = F.conv2d(x_win.reshape(N, 1, P + 2 * pad_h, P + 2 * pad_w), k).transpose(0, 1)
+    else:
+        y_pred = F.conv2d(
+            x_win.reshape(1, B * N, P + 2 * pad_h, P + 2 * pad_w),
+            k.repeat_interleave(N, dim=0),
+            groups=B * N,
+        )
+    sq_err = ((y_pred.reshape(-1, N, P, P) - y_win) * mask) ** 2
+
+    if not patches.unbiased:
+        loss = sq_err.sum(dim=(1, 2, 3)) / mask.sum().clamp(min=1)
+        return loss if reduction == "none" else loss.mean()
+
+    # Every pixel is covered with probability N P^2 / ((H+P-1)(W+P-1))
+    scale = (H + P - 1) * (W + P - 1) / (H * W * N * P * P)
+    loss = sq_err.sum(dim=(1, 2, 3)) * scale
+    if reduction == "none":
+        return loss
+    return loss.mean()
+
+
+def _fft_size(n: int) -> int:
+    """Smallest 5-smooth integer (2^a 3^b 5^c) >= n, a fast FFT length."""
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+def data_fidelity_grad(
+    x: torch.Tensor,
+    k: torch.Tensor,
+    y_meas: torch.Tensor,
+    reduction: str = "mean",
+    need_grad_x: bool = True,
+    need_grad_k: bool = True,
+) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[torch.Tensor]]:
+    """Value of `data_fidelity_loss` and its gradients in closed form, without autograd.
+
+    With residual r = k * x - y and g = dL/d(k * x) (2r over the number of
+    averaged pixels), the gradient w.r.t. x is the adjoint convolution of g
+    with k (`conv_transpose2d`) and the gradient w.r.t. k is the correlation
+    of the zero-padded x with g, computed with real FFTs. No graph or
+    intermediate activations are kept. Computed in float32 for odd kernels.
+
+    Args:
+        x: Sharp image tensor of shape (B, 1, H, W).
+        k: PSF kernel tensor of shape (1, 1, Kh, Kw) or (B, 1, Kh, Kw), or
+            (N, 1, Kh, Kw) with B = 1 (multi-frame, see `forward_convolve`).
+        y_meas: Measured blurred image of shape (B, 1, H, W) or (1, 1, H, W).
+        reduction: "mean" (gradients of the scalar MSE) or "none" (gradients
+            of the sum of per-sample MSEs, i.e. each sample's own gradient).
+        need_grad_x: Compute the gradient w.r.t. x (None otherwise).
+        need_grad_k: Compute the gradient w.r.t. k (None otherwise).
+
+    Returns:
+        (loss, grad_x, grad_k) with loss as in `data_fidelity_loss` and the
+        gradients shaped like x and k.
+    """
+    _check_reduction(reduction)
+    with torch.no_grad():
+        x = x.detach().float()
+        k = k.detach().float()
+        B, _, H, W = x.shape
+        Kb, _, Kh, Kw = k.shape
+        pad_h, pad_w = Kh // 2, Kw // 2
+
+        residual = forward_convolve(x, k).sub_(y_meas)
+        if reduction == "none":
+            loss = residual.square().mean(dim=(1, 2, 3))
+            g = residual.mul_(2.0 / (H * W))
+        else:
+            loss = residual.square().mean()
+            g = residual.mul_(2.0 / residual.numel())
+
+        grad_x = None
+        if need_grad_x:
+            if Kb == 1:
+                grad_x = F.conv_transpose2d(g, k, padding=(pad_h, pad_w))
+            elif B == 1:
+                # Multi-frame: the frames' back-projections sum into one image
+                grad_x = F.conv_transpose2d(g.transpose(0, 1), k, padding=(pad_h, pad_w))
+            else:
+                grad_x = F.conv_transpose2d(
+                    g.reshape(1, B, H, W), k, padding=(pad_h, pad_w), groups=B
+                ).reshape(B, 1, H, W)
+
+        grad_k = None
+        if need_grad_k:
+            # Any FFT size >= the padded size avoids wrap-around for lags < K
+            size = (_fft_size(H + 2 * pad_h), _fft_size(W + 2 * pad_w))
+            spectrum = torch.fft.rfft2(g, s=size).conj_physical_()
+            spectrum.mul_(torch.fft.rfft2(F.pad(x, (pad_w, pad_w, pad_h, pad_h)), s=size))
+            corr = torch.fft.irfft2(spectrum, s=size)
+            del spectrum
+            # Copy out the Kh x Kw lags so the full correlation can be freed
+            lags = corr[..., :Kh, :Kw]
+            grad_k = lags.sum(dim=0, keepdim=True) if Kb == 1 else lags.clone()
+    return loss, grad_x, grad_k
+
+
 def kernel_prior_loss(
     k: torch.Tensor,
-    l2_weight: float = 0.0,
-    center_weight: float = 0.0,
-    auto_weight: float = 0.0,
+    l2_weight: Weight = 0.0,
+    center_weight: Weight = 0.0,
+    auto_weight: Weight = 0.0,
     return_components: bool = False,
+    reduction: str = "mean",
+    instrumentation: Optional[Instrumentation] = None,
 ) -> torch.Tensor | Tuple[torch.Tensor, Dict[str, torch.Tensor]]:
     """Simple kernel prior / regularizer.
 
@@ -46,51 +290,62 @@ def kernel_prior_loss(
       - Optional autocorrelation penalty (encourages k * k to approach delta)
 
     Args:
-        k: PSF kernel tensor of shape (1, 1, Kh, Kw).
-        l2_weight: Weight for L2 norm of k.
+        k: PSF kernel tensor of shape (B, 1, Kh, Kw).
+        l2_weight: Weight for L2 norm of k (float or per-sample (B,) tensor).
         center_weight: Weight for center-of-mass penalty.
         auto_weight: Weight for autocorrelation penalty.
+        reduction: "mean" averages the terms over the batch; "none" keeps
+            per-sample (B,) terms.
+        instrumentation: Optional per-term timing/allocation recorder.
 
     Returns:
         Scalar tensor (0D) representing the kernel prior loss, or a
         (loss, components) tuple when return_components=True.
     """
-    loss = k.new_tensor(0.0)
+    _check_reduction(reduction)
+    loss = k.new_zeros(k.shape[0])
     components = {}
 
-    if l2_weight > 0.0:
-        l2_term = l2_weight * torch.mean(k**2)
-        loss = loss + l2_term
+    if _is_active(l2_weight):
+        with section(instrumentation, "kernel_l2"):
+            l2_term = l2_weight * torch.mean(k**2, dim=(1, 2, 3))
+            loss = loss + l2_term
         components["loss_kernel_l2"] = l2_term
 
-    if center_weight > 0.0:
-        # Encourage mass near the center of the kernel.
-        _, _, Kh, Kw = k.shape
-        ys = torch.linspace(-1.0, 1.0, steps=Kh, device=k.device)
-        xs = torch.linspace(-1.0, 1.0, steps=Kw, device=k.device)
-        yy, xx = torch.meshgrid(ys, xs, indexing="ij")
-        r2 = xx**2 + yy**2
-
-        # Weighted average of radius^2 with kernel magnitudes as weights
-        weights = torch.abs(k[0, 0])
-        weights = weights / (weights.sum() + 1e-8)
-        radius2_mean = torch.sum(weights * r2)
-
-        center_term = center_weight * radius2_mean
-        loss = loss + center_term
+    if _is_active(center_weight):
+        with section(instrumentation, "kernel_center"):
+            # Encourage mass near the center of the kernel.
+            _, _, Kh, Kw = k.shape
+            ys = torch.linspace(-1.0, 1.0, steps=Kh, device=k.device)
+            xs = torch.linspace(-1.0, 1.0, steps=Kw, device=k.device)
+            yy, xx = torch.meshgrid(ys, xs, indexing="ij")
+            r2 = xx**2 + yy**2
+
+            # Weighted average of radius^2 with kernel magnitudes as weights
+            weights = torch.abs(k[:, 0])
+            weights = weights / (weights.sum(dim=(-2, -1), keepdim=True) + 1e-8)
+            radius2_mean = torch.sum(weights * r2, dim=(-2, -1))
+
+            center_term = center_weight * radius2_mean
+            loss = loss + center_term
         components["loss_kernel_center"] = center_term
 
-    if auto_weight > 0.0:
-        auto_term = auto_weight * kernel_autocorrelation_loss(k)
-        loss = loss + auto_term
+    if _is_active(auto_weight):
+        with section(instrumentation, "kernel_auto"):
+            auto_term = auto_weight * kernel_autocorrelation_loss(k, reduction="none")
+            loss = loss + auto_term
         components["loss_kernel_auto"] = auto_term
 
+    if reduction == "mean":
+        loss = loss.mean()
+        components = {name: term.mean() for name, term in components.items()}
+
     if return_components:
         return loss, components
     return loss
 
 
-def kernel_autocorrelation_loss(k: torch.Tensor) -> torch.Tensor:
+def kernel_autocorrelation_loss(k: torch.Tensor, reduction: str = "mean") -> torch.Tensor:
     """Penalize energy away from the autocorrelation center (k * k ≈ delta).
 
     We compute the 2D autocorrelation via the Wiener–Khinchin theorem:
@@ -99,10 +354,12 @@ def kernel_autocorrelation_loss(k: torch.Tensor) -> torch.Tensor:
 
     Args:
         k: PSF kernel tensor of shape (B, 1, Kh, Kw) or (1, 1, Kh, Kw).
+        reduction: "mean" over the batch, or "none" for per-sample (B,) values.
 
     Returns:
         Scalar tensor penalizing off-center autocorrelation energy.
     """
+    _check_reduction(reduction)
     if k.dim() != 4 or k.shape[1] != 1:
         raise ValueError(f"Expected k shape (B,1,Kh,Kw), got {tuple(k.shape)}")
 
@@ -121,13 +378,16 @@ def kernel_autocorrelation_loss(k: torch.Tensor) -> torch.Tensor:
     off_center = autocorr.clone()
     off_center[..., cy, cx] = 0.0
     off_energy = (off_center**2).mean(dim=(-2, -1))
+    if reduction == "none":
+        return off_energy
     return off_energy.mean()
 
 
 def image_prior_loss(
     x: torch.Tensor,
     prior_fn: Optional[Callable[[torch.Tensor], torch.Tensor]] = None,
-    weight: float = 0.0,
+    weight: Weight = 0.0,
+    reduction: str = "mean",
 ) -> torch.Tensor:
     """Image prior Phi(x) with an optional user-provided function.
 
@@ -136,15 +396,27 @@ def image_prior_loss(
         prior_fn: Callable that takes x and returns a scalar tensor.
                   For example, this could be a diffusion-based score
                   objective or TV norm. If None, prior is 0.
-        weight: Scalar multiplier for the prior.
+                  With reduction="none" it may return per-sample values (B,);
+                  a scalar is treated as the batch mean and broadcast.
+        weight: Scalar (or per-sample (B,)) multiplier for the prior.
+        reduction: "mean" for a scalar, "none" for per-sample (B,) values.
 
     Returns:
-        Scalar tensor (0D) representing the image prior.
+        Scalar tensor (0D) representing the image prior, or a (B,) tensor.
     """
-    if prior_fn is None or weight == 0.0:
+    _check_reduction(reduction)
+    if prior_fn is None or not _is_active(weight):
+        if reduction == "none":
+            return x.new_zeros(x.shape[0])
         return x.new_tensor(0.0)
 
     raw_prior = prior_fn(x)
+    if reduction == "none":
+        if raw_prior.dim() == 0:
+            raw_prior = raw_prior.expand(x.shape[0])
+        else:
+            raw_prior = raw_prior.reshape(x.shape[0], -1).mean(dim=1)
+        return weight * raw_prior
     if raw_prior.dim() != 0:
         # Ensure it's a scalar
         raw_prior = raw_prior.mean()
@@ -155,14 +427,20 @@ def map_objective(
     x: torch.Tensor,
     k: torch.Tensor,
     y_meas: torch.Tensor,
-    lambda_x: float = 0.0,
-    lambda_k_l2: float = 0.0,
-    lambda_k_center: float = 0.0,
-    lambda_k_auto: float = 0.0,
+    lambda_x: Weight = 0.0,
+    lambda_k_l2: Weight = 0.0,
+    lambda_k_center: Weight = 0.0,
+    lambda_k_auto: Weight = 0.0,
     image_prior_fn: Optional[Callable[[torch.Tensor], torch.Tensor]] = None,
-    lambda_pink: float = 0.0,
-    lambda_diffusion: float = 0.0,
+    lambda_pink: Weight = 0.0,
+    lambda_diffusion: Weight = 0.0,
     return_components: bool = False,
+    reduction: str = "mean",
+    instrumentation: Optional[Instrumentation] = None,
+    include_data: bool = True,
+    patches: Optional[PatchSample] = None,
+    kernel_factors: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+    kernel_box: Optional[Tuple[int, int, int, int]] = None,
 ) -> torch.Tensor | Tuple[torch.Tensor, Dict[str, torch.Tensor]]:
     """Full MAP objective for blind deconvolution.
 
@@ -174,22 +452,63 @@ def map_objective(
       - Phi(x) is provided via `image_prior_fn`
       - Psi(k) is implemented in `kernel_prior_loss`
 
+    Every lambda may be a float or a per-sample tensor of shape (B,), which
+    lets a batch of (x, k) pairs be solved under different weights at once
+    (use reduction="none" and sum the result so samples stay independent).
+
+    With a single image and N kernels (multi-frame: y_meas holds N blurs of
+    one scene) the per-sample objectives are per frame: each frame carries its
+    own data and kernel terms plus 1/N of the image terms, so they sum to the
+    joint objective and stay separable in the kernels.
+
     Args:
         x: Sharp image tensor of shape (B, 1, H, W).
-        k: PSF kernel tensor of shape (1, 1, Kh, Kw).
-        y_meas: Measured blurred image of shape (B, 1, H, W).
+        k: PSF kernel tensor of shape (1, 1, Kh, Kw) or (B, 1, Kh, Kw), or
+            (N, 1, Kh, Kw) with B = 1 for multi-frame.
+        y_meas: Measured blurred image of shape (B, 1, H, W), or (1, 1, H, W)
+            shared across the batch, or (N, 1, H, W) for multi-frame.
         lambda_x: Weight for the image prior.
         lambda_k_l2: L2 weight for the kernel prior.
         lambda_k_center: Center-of-mass weight for the kernel prior.
         lambda_k_auto: Autocorrelation penalty weight (k * k -> delta).
         image_prior_fn: Optional callable implementing Phi(x).
         return_components: If True, also return a dict of individual loss terms.
+        reduction: "mean" (default) for a scalar objective, or "none" for the
+            per-sample objectives (B,) (components are then per-sample too).
+        instrumentation: Optional recorder; each term is timed in its own
+            section ("data", "kernel_l2", "kernel_center", "kernel_auto",
+            "image_prior", "pink", "diffusion").
+        include_data: If False, the data term is left out (reported as 0), for
+            callers that add it with `data_fidelity_grad` instead of autograd.
+        patches: If given, the data term is the stochastic estimate
+            `patch_data_fidelity_loss` over these patches.
+        kernel_factors: Optional separable factors (cols, rows) with
+            k = `low_rank_kernel(cols, rows)`; the full-image data term then
+            uses `separable_convolve`. The priors always see the dense k.
+        kernel_box: Optional (r0, r1, c0, c1) support bounds of k; the
+            full-image data term then only convolves with that crop.
 
     Returns:
         Scalar tensor (0D) representing the total MAP loss, or a tuple of
         (loss, components) if return_components is True.
     """
-    loss_data = data_fidelity_loss(x, k, y_meas)
+    _check_reduction(reduction)
+    zero = x.new_zeros(x.shape[0]) if reduction == "none" else x.new_tensor(0.0)
+
+    loss_data = zero
+    if include_data:
+        with section(instrumentation, "data"):
+            if patches is not None:
+                loss_data = patch_data_fidelity_loss(x, k, y_meas, patches, reduction=reduction)
+            else:
+                loss_data = data_fidelity_loss(
+                    x,
+                    k,
+                    y_meas,
+                    reduction=reduction,
+                    kernel_factors=kernel_factors,
+                    kernel_box=kernel_box,
+                )
     if return_components:
         loss_k, k_components = kernel_prior_loss(
             k,
@@ -197,6 +516,8 @@ def map_objective(
             center_weight=lambda_k_center,
             auto_weight=lambda_k_auto,
             return_components=True,
+            reduction=reduction,
+            instrumentation=instrumentation,
         )
     else:
         loss_k = kernel_prior_loss(
@@ -205,16 +526,31 @@ def map_objective(
             center_weight=lambda_k_center,
             auto_weight=lambda_k_auto,
             return_components=False,
+            reduction=reduction,
+            instrumentation=instrumentation,
+        )
+    with section(instrumentation if image_prior_fn is not None else None, "image_prior"):
+        loss_x = image_prior_loss(
+            x, prior_fn=image_prior_fn, weight=lambda_x, reduction=reduction
         )
-    loss_x = image_prior_loss(x, prior_fn=image_prior_fn, weight=lambda_x)
-
-    loss_pink = x.new_tensor(0.0)
-    if lambda_pink > 0.0:
-        loss_pink = lambda_pink * pink_noise_loss(x)
 
-    loss_diffusion = x.new_tensor(0.0)
-    if lambda_diffusion > 0.0:
-        loss_diffusion = lambda_diffusion * diffusion_prior_loss(x)
+    loss_pink = zero
+    if _is_active(lambda_pink):
+        with section(instrumentation, "pink"):
+            loss_pink = lambda_pink * pink_noise_loss(x, reduction=reduction)
+
+    loss_diffusion = zero
+    if _is_active(lambda_diffusion):
+        with section(instrumentation, "diffusion"):
+            loss_diffusion = lambda_diffusion * diffusion_prior_loss(
+                x, reduction=reduction
+            )
+
+    frames = k.shape[0] if x.shape[0] == 1 else 1
+    if frames > 1 and reduction == "none":
+        loss_x, loss_pink, loss_diffusion = (
+            (term / frames).expand(frames) for term in (loss_x, loss_pink, loss_diffusion)
+        )
     total = loss_data + loss_x + loss_k + loss_pink + loss_diffusion
 
     if return_components:
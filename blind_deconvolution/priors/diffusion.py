@@ -73,15 +73,19 @@ def diffusion_score(
 def diffusion_prior_loss(
     x: torch.Tensor,
     t_index: int = 200,
+    reduction: str = "mean",
 ) -> torch.Tensor:
     """The diffusion prior loss: 0.5 * ||∇_x log p(x)||^2.
 
     Args:
         x (torch.Tensor): Input tensor of shape (B,1,H,W) in [0,1].
         t_index (int, optional): Diffusion timestep index in [0, T-1]. Defaults to 200.
+        reduction (str, optional): "mean" for a scalar, "none" for per-sample losses (B,).
 
     Returns:
-        torch.Tensor: Scalar diffusion prior loss.
+        torch.Tensor: Scalar diffusion prior loss (or (B,) when reduction="none").
     """
     score = diffusion_score(x, t_index=t_index)
+    if reduction == "none":
+        return 0.5 * (score**2).mean(dim=(1, 2, 3))
     return 0.5 * (score**2).mean()
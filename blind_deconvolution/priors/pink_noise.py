@@ -3,7 +3,7 @@ import torch.fft as fft
 
 
 def pink_noise_loss(
-    x: torch.Tensor, alpha: float = 1.0, eps: float = 1e-8
+    x: torch.Tensor, alpha: float = 1.0, eps: float = 1e-8, reduction: str = "mean"
 ) -> torch.Tensor:
     """
     Pink-noise prior in Fourier domain. Encourages image spectrum to follow ~ 1/f^alpha.
@@ -12,14 +12,15 @@ def pink_noise_loss(
         x: Tensor of shape (B, 1, H, W)
         alpha: spectral exponent. alpha=1 → pink noise.
         eps: small constant to avoid division by zero.
+        reduction: "mean" for a scalar, "none" for per-sample losses (B,).
     Returns:
-        Scalar tensor loss.
+        Scalar tensor loss (or (B,) tensor when reduction="none").
     """
     # x → (B,1,H,W)
     B, C, H, W = x.shape
 
     Xf = fft.fft2(x, norm="ortho")
-    Xf_shift = fft.fftshift(Xf)
+    Xf_shift = fft.fftshift(Xf, dim=(-2, -1))
 
     fy = torch.linspace(-0.5, 0.5, H, device=x.device)
     fx = torch.linspace(-0.5, 0.5, W, device=x.device)
@@ -29,6 +30,8 @@ def pink_noise_loss(
     w = f**alpha
     energy = (torch.abs(Xf_shift) ** 2) * (w[None, None, :, :])
 
+    if reduction == "none":
+        return energy.mean(dim=(1, 2, 3))
     loss = energy.mean()
 
     return loss
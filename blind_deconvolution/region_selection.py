@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+from blind_deconvolution.map_objective import PatchSample
+
+_SOBEL = torch.tensor([[-1.0, 0.0, 1.0], [-2.0, 0.0, 2.0], [-1.0, 0.0, 1.0]]) / 8.0
+
+
+def region_scores(
+    y_meas: torch.Tensor, region_size: int, stride: Optional[int] = None
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Kernel-information score of every `region_size` tile of a measurement.
+
+    The score is the smaller eigenvalue of the tile's averaged structure
+    tensor J = mean([gx^2, gx gy; gx gy, gy^2]) of the Sobel gradients. It
+    is large only where edges run in at least two directions: flat tiles
+    carry no information about the PSF and a single straight edge only
+    constrains its profile across that edge. Batched measurements are scored
+    jointly (J averaged over the batch).
+
+    Args:
+        y_meas: Measured image(s) of shape (B, 1, H, W).
+        region_size: Side of the square tiles.
+        stride: Tile spacing (default: half the tile size).
+
+    Returns:
+        (scores (Gh, Gw), tops (Gh,), lefts (Gw,)) with the tile corners.
+    """
+    stride = stride or max(1, region_size // 2)
+    y = y_meas.detach().float()
+    sobel = _SOBEL.to(y.device)
+    grads = F.conv2d(
+        F.pad(y, (1, 1, 1, 1), mode="replicate"),
+        torch.stack([sobel, sobel.T])[:, None],
+    )
+    gx, gy = grads[:, 0:1], grads[:, 1:2]
+    tensor = torch.cat([gx * gx, gx * gy, gy * gy], dim=1).mean(dim=0, keepdim=True)
+    jxx, jxy, jyy = F.avg_pool2d(tensor, region_size, stride)[0]
+
+    half_trace = 0.5 * (jxx + jyy)
+    spread = torch.sqrt((0.5 * (jxx - jyy)) ** 2 + jxy**2)
+    scores = half_trace - spread
+    tops = torch.arange(scores.shape[0], device=y.device) * stride
+    lefts = torch.arange(scores.shape[1], device=y.device) * stride
+    return scores, tops, lefts
+
+
+def select_regions(
+    y_meas: torch.Tensor,
+    num_regions: int,
+    region_size: int,
+    stride: Optional[int] = None,
+) -> Optional[PatchSample]:
+    """The `num_regions` best-scoring, non-overlapping tiles (see `region_scores`).
+
+    Tiles are taken greedily in order of decreasing score, skipping any that
+    overlaps a tile already chosen.
+
+    Returns:
+        The regions as a fixed (`unbiased=False`) `PatchSample`, or None when
+        they would cover the whole image anyway.
+    """
+    H, W = y_meas.shape[-2:]
+    if region_size > min(H, W) or num_regions * region_size**2 >= H * W:
+        return None
+
+    scores, tops, lefts = region_scores(y_meas, region_size, stride)
+    order = torch.argsort(scores.flatten(), descending=True).tolist()
+    chosen: list[Tuple[int, int]] = []
+    for index in order:
+        top = int(tops[index // scores.shape[1]])
+        left = int(lefts[index % scores.shape[1]])
+        if all(
+            abs(top - other_top) >= region_size or abs(left - other_left) >= region_size
+            for other_top, other_left in chosen
+        ):
+            chosen.append((top, left))
+            if len(chosen) == num_regions:
+                break
+
+    corners = torch.tensor(chosen, dtype=torch.long, device=y_meas.device)
+    return PatchSample(corners[:, 0], corners[:, 1], region_size, unbiased=False)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import torch
+
+from blind_deconvolution.blind_deconvolution import (
+    BATCHABLE_FIELDS,
+    BlindDeconvConfig,
+    BlindDeconvolver,
+)
+
+_STOP = object()
+_unique = itertools.count()
+
+
+@dataclass
+class DeconvJob:
+    """One deconvolution request: a measurement (1,1,H,W) and the config to solve it with."""
+
+    job_id: str
+    y_meas: torch.Tensor
+    config: BlindDeconvConfig
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    submitted: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class DeconvResult:
+    """Outcome of a `DeconvJob`; `error` is set (and the tensors are None) on failure."""
+
+    job_id: str
+    x_hat: Optional[torch.Tensor] = None
+    k_hat: Optional[torch.Tensor] = None
+    losses: List[float] = field(default_factory=list)
+    batch_size: int = 0
+    queue_s: float = 0.0
+    solve_s: float = 0.0
+    error: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def batch_key(job: DeconvJob) -> Hashable:
+    """Jobs with equal keys can be solved together by `BlindDeconvolver.run_grid`.
+
+    The key covers the measurement shape and every config field outside
+    `BATCHABLE_FIELDS`. Multi-start jobs and L-BFGS (whose line search couples
+    the batch) get a unique key and are solved alone.
+    """
+    cfg = job.config
+    if cfg.num_starts > 1 or cfg.optimizer_x == "lbfgs" or cfg.image_prior_fn is not None:
+        return ("single", next(_unique))
+    shared = tuple(
+        (f.name, getattr(cfg, f.name))
+        for f in fields(cfg)
+        if f.name not in BATCHABLE_FIELDS and f.name != "image_prior_fn"
+    )
+    return tuple(job.y_meas.shape), shared
+
+
+def group_jobs(jobs: List[DeconvJob], max_batch: int) -> List[List[DeconvJob]]:
+    """Split jobs into compatible groups of at most `max_batch`, in submission order."""
+    groups: Dict[Hashable, List[List[DeconvJob]]] = {}
+    for job in jobs:
+        chunks = groups.setdefault(batch_key(job), [[]])
+        if len(chunks[-1]) >= max_batch:
+            chunks.append([])
+        chunks[-1].append(job)
+    ordered = [chunk for chunks in groups.values() for chunk in chunks]
+    return sorted(ordered, key=lambda chunk: chunk[0].submitted)
+
+
+def solve_jobs(jobs: List[DeconvJob]) -> List[DeconvResult]:
+    """Solve a compatible group (see `batch_key`) in one batched run."""
+    config = jobs[0].config
+    solver = BlindDeconvolver(config).to(config.device)
+    started = time.monotonic()
+    if len(jobs) == 1:
+        x_hat, k_hat, losses = solver.run(jobs[0].y_meas, verbose=False)
+        x_hats, k_hats, curves = x_hat, k_hat, [losses]
+    else:
+        y_meas = torch.cat([job.y_meas for job in jobs])
+        settings = [
+            {name: getattr(job.config, name) for name in BATCHABLE_FIELDS} for job in jobs
+        ]
+        x_hats, k_hats, curves = solver.run_grid(y_meas, settings, verbose=False)
+    solve_s = time.monotonic() - started
+
+    return [
+        DeconvResult(
+            job_id=job.job_id,
+            x_hat=x_hats[i : i + 1].cpu(),
+            k_hat=k_hats[i : i + 1].cpu(),
+            losses=curves[i],
+            batch_size=len(jobs),
+            queue_s=started - job.submitted,
+            solve_s=solve_s,
+            metadata=job.metadata,
+        )
+        for i, job in enumerate(jobs)
+    ]
+
+
+class DeconvService:
+    """
+    Long-running solver that micro-batches compatible requests.
+
+    Jobs are queued by `submit`; a worker thread takes the first waiting job,
+    collects whatever else arrives within `max_wait_s` (up to `max_batch`
+    jobs), groups them with `group_jobs` and solves each group with one
+    `run_grid` call. Results are passed to `on_result` as soon as their group
+    finishes. Everything loaded in the process (torch, CUDA context, compiled
+    steps, the DDPM pipeline) stays warm between requests.
+
+    Usage:
+
+        service = DeconvService(on_result=print, max_batch=8)
+        service.submit(DeconvJob("a", y_meas, BlindDeconvConfig(num_iters=200)))
+        service.close()  # waits for queued jobs
+    """
+
+    def __init__(
+        self,
+        on_result: Callable[[DeconvResult], None],
+        max_batch: int = 8,
+        max_wait_s: float = 0.05,
+        device: Optional[str] = None,
+    ):
+        self.on_result = on_result
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max_wait_s
+        self.device = device
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="DeconvService", daemon=True)
+        self._thread.start()
+
+    def warmup(self, config: Optional[BlindDeconvConfig] = None, size: int = 32) -> None:
+        """Run a tiny solve (and load the DDPM prior if `config` uses it) before serving."""
+        config = replace(config or BlindDeconvConfig(), num_iters=2, fp32_final_iters=0)
+        if self.device is not None:
+            config.device = self.device
+        if config.lambda_diffusion > 0:
+            from blind_deconvolution.priors.diffusion import _get_ddpm_pipeline
+
+            _get_ddpm_pipeline(torch.device(config.device))
+            config.lambda_diffusion = 0.0
+        y_meas = torch.full((1, 1, size, size), 0.5)
+        BlindDeconvolver(config).to(config.device).run(y_meas, verbose=False)
+
+    def submit(self, job: DeconvJob) -> None:
+        if self.device is not None:
+            job.config = replace(job.config, device=self.device)
+        self._queue.put(job)
+
+    def close(self) -> None:
+        """Finish all submitted jobs, then stop the worker."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self, first: DeconvJob) -> Tuple[List[DeconvJob], bool]:
+        jobs = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(jobs) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if job is _STOP:
+                return jobs, True
+            jobs.append(job)
+        return jobs, False
+
+    def _worker(self) -> None:
+        stop = False
+        while not stop:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+            jobs, stop = self._collect(job)
+            for group in group_jobs(jobs, self.max_batch):
+                try:
+                    results = solve_jobs(group)
+                except Exception as exc:  # reported per job, the service keeps running
+                    results = [
+                        DeconvResult(job.job_id, error=repr(exc), metadata=job.metadata)
+                        for job in group
+                    ]
+                for result in results:
+                    self.on_result(result)
@@ -0,0 +1,191 @@
+import math
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+
+PatternFn = Callable[[int, int, torch.Generator, torch.device], torch.Tensor]
+
+
+def _uniform(n: int, low: float, high: float, generator: torch.Generator) -> torch.Tensor:
+    return low + (high - low) * torch.rand(n, generator=generator)
+
+
+def _grid(size: int, device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Pixel coordinates in [0,1), shaped (1,size,1) and (1,1,size) for broadcasting."""
+    coords = (torch.arange(size, device=device, dtype=torch.float32) + 0.5) / size
+    return coords.view(1, size, 1), coords.view(1, 1, size)
+
+
+def _per_sample(values: torch.Tensor, device: torch.device) -> torch.Tensor:
+    return values.to(device=device, dtype=torch.float32).view(-1, 1, 1)
+
+
+def checkerboards(
+    n: int, size: int, generator: torch.Generator, device: torch.device
+) -> torch.Tensor:
+    """Checkerboards with 4-16 checks per side and a random phase offset."""
+    checks = _per_sample(torch.randint(4, 17, (n,), generator=generator), device)
+    offset_y = _per_sample(torch.rand(n, generator=generator), device)
+    offset_x = _per_sample(torch.rand(n, generator=generator), device)
+    yy, xx = _grid(size, device)
+    board = torch.floor(yy * checks + offset_y) + torch.floor(xx * checks + offset_x)
+    return torch.remainder(board, 2.0)
+
+
+def bars(n: int, size: int, generator: torch.Generator, device: torch.device) -> torch.Tensor:
+    """Bar gratings with random period (4-32 bars per side) and orientation."""
+    periods = _per_sample(_uniform(n, 4.0, 32.0, generator), device)
+    angle = _per_sample(_uniform(n, 0.0, math.pi, generator), device)
+    yy, xx = _grid(size, device)
+    u = xx * torch.cos(angle) + yy * torch.sin(angle)
+    return torch.remainder(torch.floor(u * periods), 2.0)
+
+
+def circles(n: int, size: int, generator: torch.Generator, device: torch.device) -> torch.Tensor:
+    """A filled circle with random center and radius (10-40% of the size)."""
+    cy = _per_sample(_uniform(n, 0.3, 0.7, generator), device)
+    cx = _per_sample(_uniform(n, 0.3, 0.7, generator), device)
+    radius = _per_sample(_uniform(n, 0.1, 0.4, generator), device)
+    yy, xx = _grid(size, device)
+    return ((yy - cy) ** 2 + (xx - cx) ** 2 <= radius**2).float()
+
+
+def pink_noise(
+    n: int, size: int, generator: torch.Generator, device: torch.device
+) -> torch.Tensor:
+    """1/f^beta noise (beta in [0.75, 1.5]) normalized to [0,1] per image."""
+    beta = _per_sample(_uniform(n, 0.75, 1.5, generator), device)
+    phase = torch.rand(n, size, size, generator=generator).to(device)
+    freqs = torch.fft.fftfreq(size, device=device)
+    f = torch.sqrt(freqs.view(-1, 1) ** 2 + freqs.view(1, -1) ** 2)
+    f[0, 0] = 1.0  # avoid division by zero
+    spectrum = f.pow(-beta) * torch.exp(2j * math.pi * phase)
+    noise = torch.fft.ifft2(spectrum).real
+    low = noise.amin(dim=(-2, -1), keepdim=True)
+    high = noise.amax(dim=(-2, -1), keepdim=True)
+    return (noise - low) / (high - low + 1e-12)
+
+
+def compositions(
+    n: int,
+    size: int,
+    generator: torch.Generator,
+    device: torch.device,
+    num_shapes: int = 6,
+) -> torch.Tensor:
+    """Dimmed pink-noise background overpainted with random circles and rectangles."""
+    image = 0.5 * pink_noise(n, size, generator, device)
+    yy, xx = _grid(size, device)
+    for _ in range(num_shapes):
+        cy = _per_sample(torch.rand(n, generator=generator), device)
+        cx = _per_sample(torch.rand(n, generator=generator), device)
+        half_h = _per_sample(_uniform(n, 0.03, 0.25, generator), device)
+        half_w = _per_sample(_uniform(n, 0.03, 0.25, generator), device)
+        is_circle = _per_sample(torch.rand(n, generator=generator) < 0.5, device)
+        intensity = _per_sample(torch.rand(n, generator=generator), device)
+
+        circle = (yy - cy) ** 2 + (xx - cx) ** 2 <= half_h**2
+        rect = ((yy - cy).abs() <= half_h) & ((xx - cx).abs() <= half_w)
+        mask = torch.where(is_circle.bool(), circle, rect)
+        image = torch.where(mask, intensity, image)
+    return image
+
+
+SYNTHETIC_PATTERNS: Dict[str, PatternFn] = {
+    "checkerboard": checkerboards,
+    "bars": bars,
+    "circle": circles,
+    "pink_noise": pink_noise,
+    "composition": compositions,
+}
+
+
+def synthetic_batch(
+    batch_size: int,
+    size: int = 256,
+    patterns: Optional[Sequence[str]] = None,
+    generator: Optional[torch.Generator] = None,
+    device: str | torch.device = "cpu",
+) -> Tuple[torch.Tensor, List[str]]:
+    """
+    Generate one batch of synthetic images.
+
+    Each image draws its pattern uniformly from `patterns`; images of the
+    same pattern are generated together.
+
+    Args:
+        batch_size (int): Number of images.
+        size (int): Image height and width.
+        patterns (Sequence[str] | None): Subset of `SYNTHETIC_PATTERNS` (all if None).
+        generator (torch.Generator | None): CPU generator for all random draws.
+        device: Device for the returned tensor.
+
+    Returns:
+        Tuple of images (batch_size, 1, size, size) in [0,1] and the pattern
+        name of each image.
+    """
+    patterns = list(patterns or SYNTHETIC_PATTERNS)
+    unknown = set(patterns) - set(SYNTHETIC_PATTERNS)
+    if unknown:
+        raise ValueError(
+            f"Unknown patterns {sorted(unknown)}. Supported: {list(SYNTHETIC_PATTERNS)}"
+        )
+    generator = generator or torch.Generator().manual_seed(0)
+    device = torch.device(device)
+
+    choice = torch.randint(len(patterns), (batch_size,), generator=generator)
+    images = torch.empty(batch_size, 1, size, size, device=device)
+    for idx, name in enumerate(patterns):
+        members = (choice == idx).nonzero().flatten()
+        if members.numel() == 0:
+            continue
+        batch = SYNTHETIC_PATTERNS[name](members.numel(), size, generator, device)
+        images[members.to(device), 0] = batch
+    return images, [patterns[i] for i in choice.tolist()]
+
+
+def synthetic_stream(
+    batch_size: int = 8,
+    size: int = 256,
+    patterns: Optional[Sequence[str]] = None,
+    seed: int = 0,
+    device: str | torch.device = "cpu",
+    num_batches: Optional[int] = None,
+) -> Iterator[Tuple[torch.Tensor, List[str]]]:
+    """
+    Yield batches of synthetic images forever (or `num_batches` times).
+
+    The sequence is fully determined by `seed`.
+
+    Yields:
+        Tuples of images (batch_size, 1, size, size) and their pattern names.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    produced = 0
+    while num_batches is None or produced < num_batches:
+        yield synthetic_batch(batch_size, size, patterns, generator, device)
+        produced += 1
+
+
+def synthetic_images(
+    num_images: Optional[int] = None,
+    size: int = 256,
+    patterns: Optional[Sequence[str]] = None,
+    seed: int = 0,
+    device: str | torch.device = "cpu",
+    batch_size: int = 8,
+) -> Iterator[Tuple[str, torch.Tensor]]:
+    """
+    Yield (name, image) pairs with images of shape (1,1,size,size).
+
+    This is the per-image form of `synthetic_stream`, accepted by
+    `testing.testbench.testebench(images=...)`. Infinite when `num_images`
+    is None.
+    """
+    index = 0
+    for images, names in synthetic_stream(batch_size, size, patterns, seed, device):
+        for image, name in zip(images, names):
+            if num_images is not None and index >= num_images:
+                return
+            yield f"synthetic_{name}_{index:06d}", image.unsqueeze(0)
+            index += 1
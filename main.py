@@ -1,18 +1,143 @@
+import argparse
+import json
 import wandb
 import os
+import sys
 from dotenv import load_dotenv
-from testing.testbench import testebench
+from testing.testbench import merge_shard_results, testebench
+from testing.sharding import run_local_shards, shard_from_env
 from testing.testbench_configs import TESTBENCH_CONFIGS
+from image_creator.synthetic_stream import synthetic_images
+from utils.loggers import LOGGER_BACKENDS
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the blind deconvolution testbench sweep.")
+    parser.add_argument(
+        "--logger",
+        choices=LOGGER_BACKENDS,
+        default=os.getenv("DECONV_LOGGER", "wandb"),
+        help="Logging backend (default: $DECONV_LOGGER or 'wandb').",
+    )
+    parser.add_argument(
+        "--log-dir",
+        default=os.getenv("DECONV_LOG_DIR", "runs"),
+        help="Root directory for the local logging backend.",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Run on N streamed synthetic images instead of the images on disk.",
+    )
+    parser.add_argument("--synthetic-size", type=int, default=256)
+    parser.add_argument("--synthetic-seed", type=int, default=0)
+    parser.add_argument(
+        "--measurement-cache",
+        default=os.getenv("DECONV_MEASUREMENT_CACHE"),
+        metavar="DIR",
+        help="Cache synthesized measurements in DIR and share them across configs.",
+    )
+    env_shard_index, env_num_shards = shard_from_env()
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=env_shard_index,
+        help="Shard of the (config, image, PSF) work list to run (default: from Slurm array/srun).",
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=env_num_shards,
+        help="Total number of shards (default: from Slurm array/srun, else 1).",
+    )
+    parser.add_argument(
+        "--results-dir",
+        default=os.getenv("DECONV_RESULTS_DIR"),
+        help="Write per-shard result files here (default 'results' when sharded).",
+    )
+    parser.add_argument(
+        "--local-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Run the sweep as N local shard processes, then merge their results.",
+    )
+    parser.add_argument(
+        "--merge-results",
+        default=None,
+        metavar="DIR",
+        help="Only merge the per-shard result files in DIR and print the summaries.",
+    )
+    return parser.parse_args()
+
+def _without_option(argv: list[str], option: str) -> list[str]:
+    """Drop `option VALUE` / `option=VALUE` from an argument list."""
+    result, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == option:
+            skip = True
+        elif not arg.startswith(option + "="):
+            result.append(arg)
+    return result
+
+def merge_and_report(results_dir: str) -> None:
+    summaries = merge_shard_results(results_dir)
+    for run_name, summary in summaries.items():
+        print(f"\n=== {run_name} ===")
+        for key, value in summary.items():
+            print(f"{key}: {value:.4f}")
+    with open(os.path.join(results_dir, "summary.json"), "w") as f:
+        json.dump(summaries, f, indent=2)
 
 def main():
+    # Before parsing: argument defaults come from the environment, including .env
     load_dotenv()
-    os.environ["WANDB_API_KEY"] = os.getenv("WANDB_API_KEY") # from https://wandb.ai/authorize
-    wandb.login()
+    args = parse_args()
+    if args.merge_results is not None:
+        merge_and_report(args.merge_results)
+        return
+
+    results_dir = args.results_dir
+    if results_dir is None and (args.num_shards > 1 or args.local_workers):
+        results_dir = "results"
+
+    if args.local_workers:
+        argv = _without_option(sys.argv[1:], "--local-workers")
+        argv = _without_option(argv, "--results-dir") + ["--results-dir", results_dir]
+        exit_codes = run_local_shards(args.local_workers, argv, script=__file__)
+        if any(exit_codes):
+            raise SystemExit(f"Shard workers failed with exit codes {exit_codes}")
+        merge_and_report(results_dir)
+        return
+
+    if args.logger == "wandb":
+        os.environ["WANDB_API_KEY"] = os.getenv("WANDB_API_KEY") # from https://wandb.ai/authorize
+        wandb.login()
 
-    for cfg in TESTBENCH_CONFIGS:
+    for config_idx, cfg in enumerate(TESTBENCH_CONFIGS):
         cfg = dict(cfg)  # shallow copy to avoid mutating the source
         run_name = cfg.pop("name", None)
-        testebench(run_name=run_name, **cfg)
+        images = None
+        if args.synthetic is not None:
+            # Same seed for every config, so all configs see the same images
+            images = synthetic_images(
+                args.synthetic, size=args.synthetic_size, seed=args.synthetic_seed
+            )
+        testebench(
+            run_name=run_name,
+            logging_backend=args.logger,
+            log_dir=args.log_dir,
+            images=images,
+            measurement_cache=args.measurement_cache,
+            shard_index=args.shard_index,
+            num_shards=args.num_shards,
+            shard_offset=config_idx,
+            results_dir=results_dir,
+            **cfg,
+        )
 
 if __name__ == "__main__":
     main()
@@ -20,5 +20,7 @@ source .venv/bin/activate
 #############################
 # Run workload
 #############################
+# Each srun task (and each task of `sbatch --array=...`) runs its own shard of the
+# sweep (see testing/sharding.py); merge afterwards with `main.py --merge-results results`.
 srun -l uv run main.py
 
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from dataclasses import fields
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from blind_deconvolution.blind_deconvolution import BlindDeconvConfig
+from blind_deconvolution.service import DeconvJob, DeconvResult, DeconvService
+from utils.cuda_checker import choose_device
+from utils.image_io import load_image
+
+CONFIG_FIELDS = {f.name for f in fields(BlindDeconvConfig)} - {"image_prior_fn", "device"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Warm blind deconvolution service: one JSON request per stdin line, "
+            "one JSON result per stdout line (in completion order)."
+        )
+    )
+    parser.add_argument("--max-batch", type=int, default=8, help="Max jobs per batched solve.")
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=50.0,
+        help="How long to wait for more compatible jobs before solving.",
+    )
+    parser.add_argument("--device", default=None, help="Solver device (default: auto).")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the startup warm-up solve.")
+    parser.add_argument(
+        "--warm-diffusion",
+        action="store_true",
+        help="Load the DDPM prior at startup instead of on the first diffusion request.",
+    )
+    return parser.parse_args()
+
+
+def parse_job(request: dict, index: int) -> DeconvJob:
+    """Build a job from a request: {"id", "config", "measurement_path" | "measurement", ...}."""
+    job_id = str(request.get("id", index))
+    config_kwargs = request.get("config", {})
+    unknown = set(config_kwargs) - CONFIG_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown config fields {sorted(unknown)}")
+    if "profile_window" in config_kwargs and config_kwargs["profile_window"] is not None:
+        config_kwargs["profile_window"] = tuple(config_kwargs["profile_window"])
+
+    if "measurement_path" in request:
+        y_meas = load_image(
+            Path(request["measurement_path"]), mode="torch", grayscale=True, normalize=True
+        )
+    elif "measurement" in request:
+        y_meas = torch.tensor(request["measurement"], dtype=torch.float32)[None, None]
+    else:
+        raise ValueError("Request needs 'measurement_path' or 'measurement'")
+
+    metadata = {
+        "output_dir": request.get("output_dir"),
+        "return_arrays": bool(request.get("return_arrays", False)),
+    }
+    return DeconvJob(job_id, y_meas, BlindDeconvConfig(**config_kwargs), metadata)
+
+
+def format_result(result: DeconvResult) -> dict:
+    if result.error is not None:
+        return {"id": result.job_id, "status": "error", "error": result.error}
+
+    response = {
+        "id": result.job_id,
+        "status": "ok",
+        "final_loss": result.losses[-1],
+        "batch_size": result.batch_size,
+        "queue_ms": 1e3 * result.queue_s,
+        "solve_ms": 1e3 * result.solve_s,
+    }
+    x_hat = result.x_hat[0, 0].numpy()
+    k_hat = result.k_hat[0, 0].numpy()
+    if result.metadata.get("output_dir"):
+        out_dir = Path(result.metadata["output_dir"])
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_path = out_dir / f"{result.job_id}.npz"
+        np.savez(out_path, x_hat=x_hat, k_hat=k_hat, losses=np.asarray(result.losses))
+        response["output_path"] = str(out_path)
+    if result.metadata.get("return_arrays"):
+        response["x_hat"] = x_hat.tolist()
+        response["k_hat"] = k_hat.tolist()
+    return response
+
+
+def main():
+    args = parse_args()
+    device = args.device or choose_device()
+    write_lock = threading.Lock()
+
+    def emit(payload: dict) -> None:
+        with write_lock:
+            sys.stdout.write(json.dumps(payload) + "\n")
+            sys.stdout.flush()
+
+    service = DeconvService(
+        on_result=lambda result: emit(format_result(result)),
+        max_batch=args.max_batch,
+        max_wait_s=args.max_wait_ms / 1e3,
+        device=str(device),
+    )
+    if not args.no_warmup:
+        warm_config = BlindDeconvConfig(lambda_diffusion=1.0 if args.warm_diffusion else 0.0)
+        service.warmup(warm_config)
+    print(f"Deconvolution service ready on {device} (pid {os.getpid()}).", file=sys.stderr)
+
+    for index, line in enumerate(sys.stdin):
+        if not line.strip():
+            continue
+        request = {}
+        try:
+            request = json.loads(line)
+            service.submit(parse_job(request, index))
+        except Exception as exc:
+            emit({"id": str(request.get("id", index)), "status": "error", "error": repr(exc)})
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
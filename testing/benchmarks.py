@@ -0,0 +1,443 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import torch
+from skimage import data, transform
+
+from blind_deconvolution.blind_deconvolution import BlindDeconvConfig, BlindDeconvolver
+from blind_deconvolution.forward_model import forward_convolve, forward_model
+from blind_deconvolution.map_objective import (
+    data_fidelity_loss,
+    kernel_autocorrelation_loss,
+    kernel_prior_loss,
+)
+from blind_deconvolution.priors.pink_noise import pink_noise_loss
+from blind_deconvolution.psf_generator import gaussian_psf
+from testing.testbench import MEASUREMENT_NOISE_SIGMA
+from utils.convertors import numpy_kernel_to_tensor
+from utils.cuda_checker import choose_device
+from utils.metrics import psnr
+from utils.profiling import MemoryTracker, synchronize
+
+QUICK_IMAGE_SIZES = [256, 1024]
+QUICK_KERNEL_SIZES = [9, 31]
+FULL_IMAGE_SIZES = [256, 512, 1024, 2048, 4096]
+FULL_KERNEL_SIZES = [9, 15, 31, 63]
+
+
+@dataclass
+class BenchmarkCase:
+    """A benchmarked operation.
+
+    `setup(image_size, kernel_size, device)` builds inputs and returns a
+    zero-argument callable that performs `iters_per_call` iterations of the
+    operation. Cases that do not depend on the image (or kernel) size are run
+    once per kernel (or image) size.
+    """
+
+    name: str
+    setup: Callable[[int, int, str], Callable[[], object]]
+    uses_image: bool = True
+    uses_kernel: bool = True
+    iters_per_call: int = 1
+
+
+def _make_problem(image_size: int, kernel_size: int, device: str):
+    generator = torch.Generator().manual_seed(0)
+    x = torch.rand(1, 1, image_size, image_size, generator=generator).to(device)
+    k = numpy_kernel_to_tensor(gaussian_psf(kernel_size, sigma=kernel_size / 6)).to(device)
+    y = forward_model(x, k, noise_sigma=0.0)
+    return x, k, y
+
+
+def _forward_convolve_setup(image_size, kernel_size, device):
+    x, k, _ = _make_problem(image_size, kernel_size, device)
+
+    def step():
+        with torch.no_grad():
+            return forward_convolve(x, k)
+
+    return step
+
+
+def _data_fidelity_setup(image_size, kernel_size, device):
+    x, k, y = _make_problem(image_size, kernel_size, device)
+    x.requires_grad_(True)
+    k.requires_grad_(True)
+
+    def step():
+        x.grad = None
+        k.grad = None
+        data_fidelity_loss(x, k, y).backward()
+
+    return step
+
+
+def _kernel_prior_setup(image_size, kernel_size, device):
+    _, k, _ = _make_problem(16, kernel_size, device)
+    k.requires_grad_(True)
+
+    def step():
+        k.grad = None
+        kernel_prior_loss(k, l2_weight=1e-3, center_weight=1e-3, auto_weight=1e-3).backward()
+
+    return step
+
+
+def _kernel_autocorrelation_setup(image_size, kernel_size, device):
+    _, k, _ = _make_problem(16, kernel_size, device)
+    k.requires_grad_(True)
+
+    def step():
+        k.grad = None
+        kernel_autocorrelation_loss(k).backward()
+
+    return step
+
+
+def _pink_noise_setup(image_size, kernel_size, device):
+    x, _, _ = _make_problem(image_size, 1, device)
+    x.requires_grad_(True)
+
+    def step():
+        x.grad = None
+        pink_noise_loss(x).backward()
+
+    return step
+
+
+# Each timed call is a full `run` (x and k updated from the first iteration,
+# as in `testing/cost_estimator.py`); enough iterations per call that the
+# per-call initialization and optimizer construction are negligible.
+SOLVER_ITERS_PER_CALL = 20
+
+
+def _solver_iteration_setup(image_size, kernel_size, device, compile_step=False):
+    _, _, y = _make_problem(image_size, kernel_size, device)
+    config = BlindDeconvConfig(
+        num_iters=SOLVER_ITERS_PER_CALL,
+        freeze_k_iters=0,
+        kernel_size=kernel_size,
+        lambda_k_auto=1e-3,
+        lambda_pink=1e-3,
+        compile_step=compile_step,
+        device=device,
+    )
+    solver = BlindDeconvolver(config).to(device)
+
+    def step():
+        return solver.run(y, verbose=False)
+
+    if compile_step:
+        step()  # compile outside the timed region
+    return step
+
+
+def _solver_iteration_compiled_setup(image_size, kernel_size, device):
+    return _solver_iteration_setup(image_size, kernel_size, device, compile_step=True)
+
+
+BENCHMARK_CASES: dict[str, BenchmarkCase] = {
+    case.name: case
+    for case in [
+        BenchmarkCase("forward_convolve", _forward_convolve_setup),
+        BenchmarkCase("data_fidelity_loss", _data_fidelity_setup),
+        BenchmarkCase("kernel_prior_loss", _kernel_prior_setup, uses_image=False),
+        BenchmarkCase(
+            "kernel_autocorrelation_loss", _kernel_autocorrelation_setup, uses_image=False
+        ),
+        BenchmarkCase("pink_noise_loss", _pink_noise_setup, uses_kernel=False),
+        BenchmarkCase(
+            "solver_iteration",
+            _solver_iteration_setup,
+            iters_per_call=SOLVER_ITERS_PER_CALL,
+        ),
+        BenchmarkCase(
+            "solver_iteration_compiled",
+            _solver_iteration_compiled_setup,
+            iters_per_call=SOLVER_ITERS_PER_CALL,
+        ),
+    ]
+}
+
+
+PRECISION_PRIOR_WEIGHTS = {
+    "lambda_k_l2": 1e-1,
+    "lambda_k_center": 1e-1,
+    "lambda_k_auto": 1e-1,
+    "lambda_pink": 1e-3,
+}
+
+
+def compare_precisions(
+    image_size: int = 256,
+    kernel_size: int = 9,
+    num_iters: int = 300,
+    precisions: tuple[str, ...] = ("float32", "bfloat16"),
+    device: str | None = None,
+    verbose: bool = True,
+) -> list[dict]:
+    """Full solves of one synthetic problem under each precision policy.
+
+    Uses the `cameraman` test image blurred by a Gaussian PSF with the
+    testbench noise level, and reports throughput and final PSNR of the
+    estimate so reduced precision can be judged against the float32 baseline.
+    """
+    device = device or choose_device()
+    image = transform.resize(data.camera(), (image_size, image_size)).astype("float32")
+    x = torch.from_numpy(image)[None, None].to(device)
+    k = numpy_kernel_to_tensor(gaussian_psf(kernel_size, sigma=kernel_size / 3.6)).to(device)
+    generator = torch.Generator().manual_seed(0)
+    noise = torch.randn(x.shape, generator=generator).to(device)
+    y = forward_model(x, k, noise_sigma=0.0) + MEASUREMENT_NOISE_SIGMA * noise
+
+    rows = []
+    for precision in precisions:
+        config = BlindDeconvConfig(
+            num_iters=num_iters,
+            kernel_size=kernel_size,
+            precision=precision,
+            device=device,
+            **PRECISION_PRIOR_WEIGHTS,
+        )
+        solver = BlindDeconvolver(config).to(device)
+        synchronize(device)
+        start = time.perf_counter()
+        x_hat, _, losses = solver.run(y, verbose=False)
+        synchronize(device)
+        elapsed = time.perf_counter() - start
+        row = {
+            "precision": precision,
+            "image_size": image_size,
+            "kernel_size": kernel_size,
+            "num_iters": num_iters,
+            "device": device,
+            "iters_per_s": num_iters / elapsed,
+            "final_loss": losses[-1],
+            "psnr": psnr(x_hat, x),
+        }
+        rows.append(row)
+        if verbose:
+            print(
+                f"precision={precision:<9} img={image_size} k={kernel_size} "
+                f"{row['iters_per_s']:8.1f} it/s  PSNR {row['psnr']:6.2f} dB  "
+                f"final loss {row['final_loss']:.4e}"
+            )
+    return rows
+
+
+def time_callable(
+    fn: Callable[[], object],
+    device: str,
+    warmup: int = 2,
+    repeats: int = 10,
+    min_time: float = 0.0,
+) -> list[float]:
+    """Return wall times (seconds) of `repeats` calls after `warmup` calls.
+
+    Keeps sampling past `repeats` until `min_time` seconds have been measured.
+    """
+    for _ in range(warmup):
+        fn()
+    synchronize(device)
+    times: list[float] = []
+    while len(times) < repeats or sum(times) < min_time:
+        start = time.perf_counter()
+        fn()
+        synchronize(device)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_case(
+    case: BenchmarkCase,
+    image_size: int,
+    kernel_size: int,
+    threads: int,
+    device: str,
+    warmup: int = 2,
+    repeats: int = 10,
+) -> dict:
+    """Benchmark one case/shape/thread-count and return a result row."""
+    prev_threads = torch.get_num_threads()
+    torch.set_num_threads(threads)
+    try:
+        fn = case.setup(image_size, kernel_size, device)
+        times = time_callable(fn, device, warmup=warmup, repeats=repeats)
+        with MemoryTracker(device) as mem:
+            fn()
+    finally:
+        torch.set_num_threads(prev_threads)
+
+    per_iter = [t / case.iters_per_call for t in times]
+    median = statistics.median(per_iter)
+    row = {
+        "case": case.name,
+        "image_size": image_size if case.uses_image else None,
+        "kernel_size": kernel_size if case.uses_kernel else None,
+        "threads": threads,
+        "device": device,
+        "latency_ms_median": 1e3 * median,
+        "latency_ms_mean": 1e3 * statistics.fmean(per_iter),
+        "latency_ms_min": 1e3 * min(per_iter),
+        "iters_per_s": 1.0 / median if median > 0 else float("inf"),
+        "peak_mem_bytes": mem.peak_bytes,
+        "num_allocations": mem.num_allocations,
+        "repeats": len(times),
+    }
+    if case.uses_image:
+        row["megapixels_per_s"] = image_size * image_size / 1e6 / median
+    return row
+
+
+def run_suite(
+    cases: list[str] | None = None,
+    image_sizes: list[int] | None = None,
+    kernel_sizes: list[int] | None = None,
+    threads: list[int] | None = None,
+    device: str | None = None,
+    warmup: int = 2,
+    repeats: int = 10,
+    verbose: bool = True,
+) -> dict:
+    """Run the selected cases over the parameter grid and return a JSON-able report."""
+    device = device or choose_device()
+    cases = cases or list(BENCHMARK_CASES)
+    image_sizes = image_sizes or QUICK_IMAGE_SIZES
+    kernel_sizes = kernel_sizes or QUICK_KERNEL_SIZES
+    threads = threads or sorted({1, torch.get_num_threads()})
+
+    results = []
+    for name in cases:
+        case = BENCHMARK_CASES[name]
+        sizes = image_sizes if case.uses_image else image_sizes[:1]
+        ksizes = kernel_sizes if case.uses_kernel else kernel_sizes[:1]
+        for image_size in sizes:
+            for kernel_size in ksizes:
+                for n_threads in threads:
+                    row = run_case(
+                        case, image_size, kernel_size, n_threads, device, warmup, repeats
+                    )
+                    results.append(row)
+                    if verbose:
+                        print(format_row(row))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "torch": torch.__version__,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "device": device,
+            "max_threads": torch.get_num_threads(),
+        },
+        "results": results,
+    }
+
+
+def _row_key(row: dict) -> tuple:
+    return (row["case"], row["image_size"], row["kernel_size"], row["threads"], row["device"])
+
+
+def compare_to_baseline(
+    report: dict, baseline: dict, tolerance: float = 0.10
+) -> list[dict]:
+    """Return rows whose median latency regressed by more than `tolerance` vs. `baseline`."""
+    base_rows = {_row_key(row): row for row in baseline["results"]}
+    regressions = []
+    for row in report["results"]:
+        base = base_rows.get(_row_key(row))
+        if base is None or base["latency_ms_median"] <= 0:
+            continue
+        ratio = row["latency_ms_median"] / base["latency_ms_median"]
+        if ratio > 1.0 + tolerance:
+            regressions.append(
+                {
+                    "case": row["case"],
+                    "image_size": row["image_size"],
+                    "kernel_size": row["kernel_size"],
+                    "threads": row["threads"],
+                    "baseline_ms": base["latency_ms_median"],
+                    "current_ms": row["latency_ms_median"],
+                    "ratio": ratio,
+                }
+            )
+    return regressions
+
+
+def format_row(row: dict) -> str:
+    shape = f"img={row['image_size']} k={row['kernel_size']} thr={row['threads']}"
+    return (
+        f"{row['case']:<28} {shape:<28} "
+        f"{row['latency_ms_median']:10.3f} ms  {row['iters_per_s']:10.1f} it/s  "
+        f"peak {row['peak_mem_bytes'] / 2**20:8.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the core numeric kernels.")
+    parser.add_argument("--cases", nargs="+", choices=list(BENCHMARK_CASES), default=None)
+    parser.add_argument("--image-sizes", nargs="+", type=int, default=None)
+    parser.add_argument("--kernel-sizes", nargs="+", type=int, default=None)
+    parser.add_argument("--threads", nargs="+", type=int, default=None)
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help=f"Use the full grid (images {FULL_IMAGE_SIZES}, kernels {FULL_KERNEL_SIZES}).",
+    )
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--out", type=Path, default=None, help="Write the JSON report here.")
+    parser.add_argument("--baseline", type=Path, default=None, help="Baseline JSON report.")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument(
+        "--precision",
+        action="store_true",
+        help="Also compare float32 and bfloat16 solves (throughput and final PSNR).",
+    )
+    args = parser.parse_args()
+
+    report = run_suite(
+        cases=args.cases,
+        image_sizes=args.image_sizes or (FULL_IMAGE_SIZES if args.full else None),
+        kernel_sizes=args.kernel_sizes or (FULL_KERNEL_SIZES if args.full else None),
+        threads=args.threads,
+        device=args.device,
+        warmup=args.warmup,
+        repeats=args.repeats,
+    )
+    if args.precision:
+        report["precision"] = compare_precisions(
+            image_size=(args.image_sizes or [256])[0],
+            kernel_size=(args.kernel_sizes or [9])[0],
+            device=args.device,
+        )
+    if args.out is not None:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        regressions = compare_to_baseline(
+            report, json.loads(args.baseline.read_text()), tolerance=args.tolerance
+        )
+        for reg in regressions:
+            print(
+                f"REGRESSION {reg['case']} img={reg['image_size']} k={reg['kernel_size']} "
+                f"thr={reg['threads']}: {reg['baseline_ms']:.3f} -> {reg['current_ms']:.3f} ms "
+                f"(x{reg['ratio']:.2f})"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} vs. {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import math
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import torch
+
+from blind_deconvolution.blind_deconvolution import (
+    BATCHABLE_FIELDS,
+    BlindDeconvConfig,
+    BlindDeconvolver,
+)
+from blind_deconvolution.forward_model import forward_model
+from blind_deconvolution.psf_generator import gaussian_psf
+from testing.hparam_search import format_table
+from testing.testbench import MEASUREMENT_NOISE_SIGMA, resolve_psf_specs, split_testbench_config
+from testing.testbench_configs import TESTBENCH_CONFIGS
+from utils.convertors import numpy_kernel_to_tensor
+from utils.cuda_checker import choose_device
+from utils.image_io import load_image
+from utils.image_paths import list_image_paths
+from utils.profiling import MemoryTracker
+
+# Slurm wall-time safety factor applied to the extrapolated total.
+DEFAULT_MARGIN = 1.3
+
+
+def active_priors(config: BlindDeconvConfig) -> str:
+    """Names of the non-zero prior weights, e.g. "k_l2+k_center+diffusion"."""
+    names = [
+        name.removeprefix("lambda_")
+        for name in BATCHABLE_FIELDS
+        if name.startswith("lambda_") and getattr(config, name) > 0
+    ]
+    return "+".join(names) or "none"
+
+
+def calibrate(
+    config: BlindDeconvConfig,
+    shape: tuple[int, int],
+    warmup_iters: int = 3,
+    calib_iters: int = 10,
+) -> dict:
+    """
+    Time a few solver iterations and measure peak memory for one image shape.
+
+    Iterations run with both x and k updated (`freeze_k_iters=0`), the most
+    expensive phase, so the extrapolation is an upper bound. The first
+    `warmup_iters` iterations (allocations, model loading for the diffusion
+    prior, ...) are reported separately as `startup_s`. Peak memory comes from
+    a separate two-iteration run under `MemoryTracker`.
+
+    Returns:
+        Dict with "ms_per_iter", "startup_s", "peak_bytes" and the per-iteration
+        time of every objective component as "time_ms/<component>".
+    """
+    device = config.device
+    generator = torch.Generator().manual_seed(0)
+    x = torch.rand(1, 1, *shape, generator=generator).to(device)
+    k = numpy_kernel_to_tensor(
+        gaussian_psf(config.kernel_size, sigma=config.kernel_size / 6)
+    ).to(device)
+    with torch.no_grad():
+        y_meas = forward_model(x, k, MEASUREMENT_NOISE_SIGMA, generator=generator)
+
+    stamps: list[float] = []
+
+    def log_fn(metrics: dict, step: int) -> None:
+        stamps.append(time.perf_counter())
+
+    timed = replace(
+        config,
+        num_iters=warmup_iters + calib_iters + 1,
+        freeze_k_iters=0,
+        fp32_final_iters=0,
+        instrument=True,
+        instrument_allocations=False,
+        profile_window=None,
+    )
+    solver = BlindDeconvolver(timed).to(device)
+    start = time.perf_counter()
+    solver.run(y_meas, verbose=False, log_fn=log_fn, log_every=1)
+    ms_per_iter = 1e3 * (stamps[-1] - stamps[warmup_iters]) / calib_iters
+    startup_s = stamps[warmup_iters] - start - warmup_iters * ms_per_iter / 1e3
+
+    measured = replace(timed, num_iters=2, instrument=False)
+    with MemoryTracker(device) as mem:
+        BlindDeconvolver(measured).to(device).run(y_meas, verbose=False)
+
+    result = {
+        "ms_per_iter": ms_per_iter,
+        "startup_s": max(0.0, startup_s),
+        "peak_bytes": mem.peak_bytes,
+    }
+    result.update(solver.instrumentation.summary())
+    return result
+
+
+def estimate_config(
+    cfg: dict,
+    image_paths: list[Path] | None = None,
+    device: str | None = None,
+    warmup_iters: int = 3,
+    calib_iters: int = 10,
+) -> list[dict]:
+    """
+    Estimated cost of every (image, PSF) case of a `TESTBENCH_CONFIGS` entry.
+
+    Each distinct image shape is calibrated once (`calibrate`); the PSF type
+    does not change the solver cost beyond `kernel_size`, so all PSFs of a
+    shape share its calibration.
+
+    Returns:
+        One row per case with the image, shape, PSF, active priors, iteration
+        count, ms per iteration, estimated solve seconds and peak MB.
+    """
+    solver_kwargs, psf_kwargs = split_testbench_config(cfg)
+    config = BlindDeconvConfig(**solver_kwargs, device=device or choose_device())
+    psf_specs, _ = resolve_psf_specs(kernel_size=config.kernel_size, **psf_kwargs)
+    priors = active_priors(config)
+
+    calibrations: dict[tuple[int, int], dict] = {}
+    rows = []
+    for path in image_paths if image_paths is not None else list_image_paths():
+        shape = tuple(load_image(path, mode="torch", grayscale=True).shape[-2:])
+        if shape not in calibrations:
+            calibrations[shape] = calibrate(config, shape, warmup_iters, calib_iters)
+        calib = calibrations[shape]
+        solve_s = calib["startup_s"] + config.num_iters * calib["ms_per_iter"] / 1e3
+        for psf_name, _ in psf_specs:
+            rows.append(
+                {
+                    "config": cfg.get("name", ""),
+                    "image": Path(path).name,
+                    "shape": f"{shape[0]}x{shape[1]}",
+                    "psf": psf_name,
+                    "priors": priors,
+                    "iters": config.num_iters,
+                    "ms_per_iter": calib["ms_per_iter"],
+                    "solve_s": solve_s,
+                    "peak_mb": calib["peak_bytes"] / 2**20,
+                }
+            )
+    return rows
+
+
+def format_walltime(seconds: float) -> str:
+    """Slurm-style HH:MM:SS, rounded up to the minute."""
+    minutes = max(1, math.ceil(seconds / 60))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def main() -> None:
+    names = [cfg.get("name") for cfg in TESTBENCH_CONFIGS]
+    parser = argparse.ArgumentParser(
+        description="Estimate wall time and peak memory of testbench configs before launch."
+    )
+    parser.add_argument("--configs", nargs="+", choices=names, default=None)
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--warmup-iters", type=int, default=3)
+    parser.add_argument("--calib-iters", type=int, default=10)
+    parser.add_argument(
+        "--margin", type=float, default=DEFAULT_MARGIN, help="Safety factor for the wall time."
+    )
+    parser.add_argument("--per-case", action="store_true", help="Print one row per image/PSF.")
+    args = parser.parse_args()
+
+    image_paths = list_image_paths()
+    summary = []
+    all_rows = []
+    for cfg in TESTBENCH_CONFIGS:
+        if args.configs is not None and cfg.get("name") not in args.configs:
+            continue
+        rows = estimate_config(cfg, image_paths, args.device, args.warmup_iters, args.calib_iters)
+        all_rows.extend(rows)
+        summary.append(
+            {
+                "config": cfg.get("name", ""),
+                "priors": rows[0]["priors"] if rows else "",
+                "cases": len(rows),
+                "total_s": sum(row["solve_s"] for row in rows),
+                "peak_mb": max((row["peak_mb"] for row in rows), default=0.0),
+            }
+        )
+
+    if args.per_case:
+        print(format_table(all_rows))
+        print()
+    print(format_table(summary))
+    total = sum(row["total_s"] for row in summary)
+    peak_mb = max((row["peak_mb"] for row in summary), default=0.0)
+    print(
+        f"\nEstimated total: {total / 60:.1f} min serial; request "
+        f"--time={format_walltime(args.margin * total)} (x{args.margin:g} margin), "
+        f"peak memory {peak_mb:.0f} MB."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import argparse
+import ast
+import json
+import math
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from blind_deconvolution.blind_deconvolution import BlindDeconvConfig, BlindDeconvolver
+from testing.testbench import (
+    MEASUREMENT_NOISE_SIGMA,
+    make_psf,
+    match_kernel_sizes,
+    measurement_seed,
+    resolve_psf_specs,
+    split_testbench_config,
+    synthesize_measurements,
+)
+from testing.testbench_configs import TESTBENCH_CONFIGS
+from utils.convertors import numpy_kernel_to_tensor
+from utils.cuda_checker import choose_device
+from utils.image_io import load_image
+from utils.image_paths import list_image_paths
+from utils.metrics import kernel_error, psnr, ssim
+
+# Each entry: ("log", low, high) for log-uniform floats, ("uniform", low, high),
+# or ("choice", [options]).
+SEARCH_SPACE: dict[str, tuple] = {
+    "lambda_k_l2": ("log", 1e-4, 1.0),
+    "lambda_k_center": ("log", 1e-4, 1.0),
+    "lambda_k_auto": ("log", 1e-4, 1.0),
+    "lr_x": ("log", 1e-3, 5e-2),
+    "lr_k": ("log", 1e-3, 5e-2),
+    "kernel_size": ("choice", [9, 13, 15, 21]),
+}
+
+# Metric name -> True if larger is better.
+SEARCH_METRICS = {"psnr": True, "ssim": True, "kernel_error": False}
+
+
+@dataclass
+class Trial:
+    """One sampled configuration and its scores at each evaluated budget."""
+
+    trial_id: int
+    params: dict
+    results: dict[int, dict] = field(default_factory=dict)  # num_iters -> metrics
+
+
+def sample_config(space: dict[str, tuple], rng: np.random.Generator) -> dict:
+    """Draw one configuration from a search space (see `SEARCH_SPACE`)."""
+    params = {}
+    for name, spec in space.items():
+        kind = spec[0]
+        if kind == "log":
+            low, high = spec[1], spec[2]
+            params[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        elif kind == "uniform":
+            params[name] = float(rng.uniform(spec[1], spec[2]))
+        elif kind == "choice":
+            options = spec[1]
+            params[name] = options[int(rng.integers(len(options)))]
+        else:
+            raise ValueError(f"Unknown search space kind '{kind}' for {name}")
+    return params
+
+
+def build_search_problems(
+    base_cfg: dict,
+    images_dir: Path | None = None,
+    max_images: int | None = 2,
+    max_image_size: int | None = None,
+    seed: int = 0,
+    device: str | None = None,
+) -> list[tuple[str, str, torch.Tensor, torch.Tensor, torch.Tensor]]:
+    """Synthesize the fixed (image, PSF) measurements every trial is scored on.
+
+    The ground-truth PSFs use the base config's `kernel_size`, so trials that
+    change `kernel_size` still solve the same problems. Measurements are synthesized
+    as in the testbench (`synthesize_measurements`, noise seeded with
+    `measurement_seed(seed, img_idx, psf_idx)`).
+
+    Returns:
+        List of (image_name, psf_name, x_true, k_true, y_meas) tuples.
+    """
+    device = device or choose_device()
+    solver_kwargs, psf_args = split_testbench_config(base_cfg)
+    kernel_size = solver_kwargs.get("kernel_size", BlindDeconvConfig.kernel_size)
+    psf_specs, _ = resolve_psf_specs(kernel_size=kernel_size, **psf_args)
+
+    paths = list_image_paths(images_dir)
+    if max_images is not None:
+        paths = paths[:max_images]
+
+    # Ground-truth PSFs, shape (P,1,K,K)
+    k_true = torch.cat(
+        [
+            numpy_kernel_to_tensor(make_psf(psf_name, kernel_size, psf_kwargs))
+            for psf_name, psf_kwargs in psf_specs
+        ]
+    ).to(device)
+    problems = []
+    for img_idx, img_path in enumerate(paths):
+        x_true = load_image(img_path, mode="torch", grayscale=True, normalize=True)
+        if max_image_size is not None:
+            H, W = x_true.shape[-2:]
+            top = max(0, (H - max_image_size) // 2)
+            left = max(0, (W - max_image_size) // 2)
+            x_true = x_true[..., top : top + max_image_size, left : left + max_image_size]
+        x_true = x_true.to(device)
+        seeds = [[measurement_seed(seed, img_idx, psf_idx) for psf_idx in range(len(psf_specs))]]
+        y_meas = synthesize_measurements(x_true, k_true, MEASUREMENT_NOISE_SIGMA, seeds)
+        for psf_idx, (psf_name, _) in enumerate(psf_specs):
+            problems.append(
+                (
+                    img_path.name,
+                    psf_name,
+                    x_true,
+                    k_true[psf_idx : psf_idx + 1],
+                    y_meas[:, psf_idx : psf_idx + 1],
+                )
+            )
+    return problems
+
+
+def evaluate_config(
+    solver_kwargs: dict,
+    problems: list[tuple[str, str, torch.Tensor, torch.Tensor, torch.Tensor]],
+    num_iters: int,
+    device: str | None = None,
+) -> dict[str, float]:
+    """Run the solver with `num_iters` on every problem and return mean metrics."""
+    device = device or choose_device()
+    config = BlindDeconvConfig(**{**solver_kwargs, "num_iters": num_iters, "device": device})
+    scores: dict[str, list[float]] = {"psnr": [], "ssim": [], "kernel_error": [], "final_loss": []}
+    for _, _, x_true, k_true, y_meas in problems:
+        solver = BlindDeconvolver(config).to(device)
+        x_hat, k_hat, losses = solver.run(y_meas, verbose=False)
+        scores["psnr"].append(psnr(x_hat, x_true))
+        scores["ssim"].append(ssim(x_hat, x_true))
+        scores["kernel_error"].append(kernel_error(*match_kernel_sizes(k_hat, k_true)))
+        scores["final_loss"].append(losses[-1])
+    return {name: float(np.mean(values)) for name, values in scores.items()}
+
+
+def rung_budgets(min_iters: int, max_iters: int, eta: int) -> list[int]:
+    """Iteration budgets per rung: min_iters * eta**i, capped by (and ending at) max_iters."""
+    if min_iters <= 0 or max_iters < min_iters:
+        raise ValueError("Expected 0 < min_iters <= max_iters")
+    if eta < 2:
+        raise ValueError("eta must be >= 2")
+    budgets = []
+    budget = min_iters
+    while budget < max_iters:
+        budgets.append(budget)
+        budget *= eta
+    budgets.append(max_iters)
+    return budgets
+
+
+def successive_halving(
+    base_cfg: dict,
+    space: dict[str, tuple] | None = None,
+    num_configs: int = 27,
+    min_iters: int = 75,
+    max_iters: int | None = None,
+    eta: int = 3,
+    metric: str = "psnr",
+    seed: int = 0,
+    problems: list | None = None,
+    verbose: bool = True,
+    **problem_kwargs,
+) -> list[dict]:
+    """Successive-halving search over solver hyperparameters.
+
+    `num_configs` configurations are sampled from `space` and merged into
+    `base_cfg`. Every rung runs the surviving configurations with the rung's
+    iteration budget and promotes the best `1/eta` fraction to the next,
+    larger budget (see `rung_budgets`). Each promotion re-solves from scratch
+    since the solver does not checkpoint.
+
+    Note: the solver only updates the kernel for its first
+    `config.freeze_k_iters` iterations (x is still the measurement), so
+    `min_iters` should comfortably exceed the base config's `freeze_k_iters`;
+    a warning is emitted when it does not.
+
+    Args:
+        base_cfg: A `TESTBENCH_CONFIGS` entry providing defaults and PSF settings.
+        space: Search space (defaults to `SEARCH_SPACE`).
+        num_configs: Number of sampled configurations in the first rung.
+        min_iters: Budget of the first rung.
+        max_iters: Budget of the final rung; defaults to `base_cfg["num_iters"]`.
+        eta: Reduction factor between rungs.
+        metric: One of `SEARCH_METRICS`.
+        seed: Seed for configuration sampling and measurement noise.
+        problems: Precomputed problems from `build_search_problems`.
+        verbose: Print progress per rung.
+        **problem_kwargs: Forwarded to `build_search_problems` when `problems` is None.
+
+    Returns:
+        Ranked list of rows (best first). Each row holds the trial id, sampled
+        parameters, the largest budget reached and the metrics at that budget.
+    """
+    if metric not in SEARCH_METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Supported: {list(SEARCH_METRICS)}")
+    higher_is_better = SEARCH_METRICS[metric]
+    space = space or SEARCH_SPACE
+    max_iters = max_iters or base_cfg.get("num_iters", BlindDeconvConfig.num_iters)
+    budgets = rung_budgets(min_iters, max_iters, eta)
+    freeze_k_iters = base_cfg.get("freeze_k_iters", BlindDeconvConfig.freeze_k_iters)
+    if min_iters <= freeze_k_iters:
+        warnings.warn(
+            f"min_iters ({min_iters}) <= freeze_k_iters ({freeze_k_iters}): the first rung "
+            "only updates the kernel and ranks configs on the blurred measurement."
+        )
+
+    if problems is None:
+        problems = build_search_problems(base_cfg, seed=seed, **problem_kwargs)
+    base_solver_kwargs, _ = split_testbench_config(base_cfg)
+
+    rng = np.random.default_rng(seed)
+    trials = [Trial(i, sample_config(space, rng)) for i in range(num_configs)]
+
+    def score(trial: Trial, budget: int) -> float:
+        value = trial.results[budget][metric]
+        return value if higher_is_better else -value
+
+    survivors = trials
+    for rung, budget in enumerate(budgets):
+        for trial in survivors:
+            solver_kwargs = {**base_solver_kwargs, **trial.params}
+            trial.results[budget] = evaluate_config(solver_kwargs, problems, budget)
+        survivors = sorted(survivors, key=lambda t: score(t, budget), reverse=True)
+        if verbose:
+            best = survivors[0]
+            print(
+                f"[rung {rung}] {len(survivors)} configs @ {budget} iters; "
+                f"best trial {best.trial_id}: {metric}={best.results[budget][metric]:.4f}"
+            )
+        if rung < len(budgets) - 1:
+            survivors = survivors[: max(1, math.ceil(len(survivors) / eta))]
+
+    # Rank by (largest budget reached, score at that budget).
+    def rank_key(trial: Trial) -> tuple[int, float]:
+        budget = max(trial.results)
+        return budget, score(trial, budget)
+
+    rows = []
+    for trial in sorted(trials, key=rank_key, reverse=True):
+        budget = max(trial.results)
+        rows.append(
+            {"trial": trial.trial_id, "num_iters": budget, **trial.params, **trial.results[budget]}
+        )
+    return rows
+
+
+def format_table(rows: list[dict], float_fmt: str = "{:.4g}") -> str:
+    """Render ranked search rows as a fixed-width text table."""
+    if not rows:
+        return "(no results)"
+    columns = list(rows[0].keys())
+    cells = [
+        [float_fmt.format(row[c]) if isinstance(row[c], float) else str(row[c]) for c in columns]
+        for row in rows
+    ]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    lines.extend("  ".join(v.rjust(w) for v, w in zip(r, widths)) for r in cells)
+    return "\n".join(lines)
+
+
+def _parse_override(text: str) -> tuple[str, object]:
+    key, _, value = text.partition("=")
+    try:
+        return key, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return key, value
+
+
+def main() -> None:
+    names = [cfg.get("name") for cfg in TESTBENCH_CONFIGS]
+    parser = argparse.ArgumentParser(description="Successive-halving search over testbench configs.")
+    parser.add_argument("--config", choices=names, default=names[0], help="Base testbench config.")
+    parser.add_argument("--num-configs", type=int, default=27)
+    parser.add_argument("--min-iters", type=int, default=75)
+    parser.add_argument("--max-iters", type=int, default=None)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--metric", choices=list(SEARCH_METRICS), default="psnr")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-images", type=int, default=2)
+    parser.add_argument("--max-image-size", type=int, default=None)
+    parser.add_argument(
+        "--override",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Override a base config entry, e.g. --override lambda_diffusion=0.0",
+    )
+    parser.add_argument("--out", type=Path, default=None, help="Write ranked rows as JSON.")
+    args = parser.parse_args()
+
+    base_cfg = dict(TESTBENCH_CONFIGS[names.index(args.config)])
+    base_cfg.update(dict(_parse_override(o) for o in args.override))
+
+    rows = successive_halving(
+        base_cfg,
+        num_configs=args.num_configs,
+        min_iters=args.min_iters,
+        max_iters=args.max_iters,
+        eta=args.eta,
+        metric=args.metric,
+        seed=args.seed,
+        max_images=args.max_images,
+        max_image_size=args.max_image_size,
+    )
+    print(format_table(rows))
+    if args.out is not None:
+        args.out.write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Mapping, Sequence
+
+
+def shard_from_env(environ: Mapping[str, str] | None = None) -> tuple[int, int]:
+    """Shard (index, count) of this process from Slurm variables, (0, 1) outside Slurm.
+
+    Slurm array tasks and the tasks of a multi-task `srun` are combined: with
+    `A` array tasks and `T` tasks per step, task `t` of array task `a` is shard
+    `a * T + t` of `A * T`. Task counts come from `SLURM_STEP_NUM_TASKS`, which
+    only an `srun` step sets; a batch script run without `srun` sees
+    `SLURM_NTASKS` but is a single process, so it counts as one task.
+    """
+    env = os.environ if environ is None else environ
+    array_count = int(env.get("SLURM_ARRAY_TASK_COUNT", 1))
+    array_index = int(env.get("SLURM_ARRAY_TASK_ID", 0)) - int(env.get("SLURM_ARRAY_TASK_MIN", 0))
+    if "SLURM_STEP_NUM_TASKS" in env:
+        task_count = int(env["SLURM_STEP_NUM_TASKS"])
+        task_index = int(env.get("SLURM_PROCID", 0))
+    else:
+        task_count, task_index = 1, 0
+    return array_index * task_count + task_index, array_count * task_count
+
+
+def case_in_shard(
+    case_index: int, shard_index: int, num_shards: int, shard_offset: int = 0
+) -> bool:
+    """Whether a case belongs to a shard (round-robin over `case_index + shard_offset`).
+
+    The assignment depends only on the arguments, so every shard agrees on the
+    partition without communicating. `shard_offset` (e.g. the config index)
+    rotates the assignment so small configs do not all land on shard 0.
+    """
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+    return (case_index + shard_offset) % num_shards == shard_index
+
+
+def shard_results_path(
+    results_dir: str | Path, run_name: str, shard_index: int, num_shards: int
+) -> Path:
+    """Per-shard result file: `<results_dir>/<run_name>/shard-<index>-of-<count>.jsonl`."""
+    return Path(results_dir) / run_name / f"shard-{shard_index:04d}-of-{num_shards:04d}.jsonl"
+
+
+def run_local_shards(
+    num_workers: int,
+    argv: Sequence[str],
+    script: str | Path = "main.py",
+) -> list[int]:
+    """Run `script` as `num_workers` local processes, one shard each, and wait for all.
+
+    Every worker receives `argv` plus `--shard-index i --num-shards num_workers`;
+    CPU threads are split evenly between workers unless OMP_NUM_THREADS is set.
+
+    Returns:
+        The exit code of every worker, in shard order.
+    """
+    env = dict(os.environ)
+    env.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // num_workers)))
+    workers = [
+        subprocess.Popen(
+            [sys.executable, str(script), *argv]
+            + ["--shard-index", str(index), "--num-shards", str(num_workers)],
+            env=env,
+        )
+        for index in range(num_workers)
+    ]
+    return [worker.wait() for worker in workers]
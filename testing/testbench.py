@@ -1,100 +1,60 @@
+import hashlib
+import json
 import torch
+import torch.nn.functional as F
 import numpy as np
-from dataclasses import asdict
+from dataclasses import asdict, fields
 from collections import defaultdict
-import wandb
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Tuple
 from utils.image_io import load_image
 from blind_deconvolution.psf_generator import get_psf
-from blind_deconvolution.forward_model import forward_model
-from utils.wandb_logging import tensor_to_wandb_image
+from utils.loggers import create_logger, curve, image
 from utils.convertors import numpy_kernel_to_tensor
 from utils.metrics import psnr, ssim, kernel_error
+from utils.registration import aligned_metrics
 from blind_deconvolution.blind_deconvolution import BlindDeconvolver, BlindDeconvConfig
 from utils.cuda_checker import choose_device
 from utils.image_paths import list_image_paths
+from utils.prefetch import Prefetcher
+from testing.sharding import case_in_shard, shard_results_path
 
 
-def testebench(
-    num_iters: int,
-    lr_x: float,
-    lr_k: float,
-    lambda_x: float = 0.0,
-    lambda_k_l2: float = 0.0,
-    lambda_k_center: float = 0.0,
-    lambda_k_auto: float = 0.0,
-    lambda_pink: float = 0.0,
-    lambda_diffusion: float = 0.0,
-    kernel_size: int = 21,
+SUPPORTED_PSF_TYPES = ["none", "gaussian", "motion", "turbulence", "rml"]
+MEASUREMENT_NOISE_SIGMA = 0.01
+
+
+def resolve_psf_specs(
+    kernel_size: int,
+    psf_types: list[str] | None = None,
     sigma_gaussian: float | None = None,
     motion_length: int | None = None,
     angle_motion: float = 0.0,
     fried_parameter_turbulence: float | None = None,
-    distortion_strength_turbulence: float = 0.8,
+    distortion_strength_turbulence: float | None = 0.8,
     seed_turbulence: int | None = None,
     bandwidth_rml: float | None = None,
     seed_rml: int | None = None,
-    psf_types: list[str] | None = None,
-    run_name: str | None = None,
-) -> None:
-    """Run blind deconvolution experiments across a dataset of images and multiple PSF types,
-    logging only final evaluation metrics and artifacts to Weights & Biases.
+) -> tuple[list[tuple[str, dict]], dict]:
+    """Resolve testbench PSF arguments into generator kwargs, filling defaults.
 
-    Args:
-        num_iters (int): Number of optimization iterations to perform for each image/PSF.
-        lr_x (float): Learning rate for optimizing the latent image.
-        lr_k (float): Learning rate for optimizing the kernel/PSF.
-        lambda_x (float): Weight for the image prior regularization term.
-        lambda_k_l2 (float): L2 regularization weight applied to the kernel to discourage large values.
-        lambda_k_center (float): Weight encouraging kernel mass to be centered.
-        lambda_k_auto (float): Weight encouraging low autocorrelation (k * k ~ delta).
-        lambda_pink (float): Weight for a pink-noise (1/f) prior on the kernel, if used.
-        lambda_diffusion (float): Weight for diffusion-based regularization on image or kernel updates.
-        kernel_size (int): Size (height/width) of the square PSF kernel to generate and estimate.
-        sigma_gaussian (float): Standard deviation to use when generating a Gaussian PSF.
-        motion_length (int | None): Length of the motion blur in pixels. Defaults to kernel_size // 2.
-        angle_motion (float): Angle in degrees to use when generating a motion blur PSF.
-        fried_parameter_turbulence (float | None): Effective Fried parameter controlling the
-            turbulence PSF width (smaller => stronger blur). Defaults to kernel_size / 10.
-        distortion_strength_turbulence (float): Scales random distortions that make the turbulence
-            PSF irregular and harder than the motion blur baseline.
-        seed_turbulence (int | None): Optional RNG seed to make turbulence PSFs repeatable.
-        bandwidth_rml (float | None): Fractional Fourier cutoff for randomized optics PSFs.
-        seed_rml (int | None): Optional RNG seed for randomized optics PSFs.
-        psf_types (list[str] | None): Which PSF scenarios to run. Supported: ["none", "gaussian",
-            "motion", "turbulence", "rml"]. If None, runs the blurred trio (gaussian/motion/turbulence).
-        run_name (str | None): Optional W&B run name for deterministic labeling.
+    Returns:
+        (psf_specs, psf_params): `psf_specs` is a list of (psf_name, get_psf kwargs)
+        in the requested order; `psf_params` is the flat dict recorded in the run config.
     """
-    config = BlindDeconvConfig(
-        num_iters=num_iters,
-        lr_x=lr_x,
-        lr_k=lr_k,
-        lambda_x=lambda_x,
-        lambda_k_l2=lambda_k_l2,
-        lambda_k_center=lambda_k_center,
-        lambda_k_auto=lambda_k_auto,
-        lambda_pink=lambda_pink,
-        lambda_diffusion=lambda_diffusion,
-        kernel_size=kernel_size,
-        device=choose_device(),
-    )
-
     default_types = ["gaussian", "motion", "turbulence"]
     selected_types = psf_types or default_types
-    unknown = [
-        t
-        for t in selected_types
-        if t not in ["none", "gaussian", "motion", "turbulence", "rml"]
-    ]
+    unknown = [t for t in selected_types if t not in SUPPORTED_PSF_TYPES]
     if unknown:
         raise ValueError(
-            f"Unsupported psf_types: {unknown}. Supported: ['none', 'gaussian', 'motion', 'turbulence', 'rml']"
+            f"Unsupported psf_types: {unknown}. Supported: {SUPPORTED_PSF_TYPES}"
         )
 
     # Only fill defaults for PSFs that are actually requested.
     motion_length_val = (
         motion_length
         if motion_length is not None
-        else (max(1, config.kernel_size // 2) if "motion" in selected_types else None)
+        else (max(1, kernel_size // 2) if "motion" in selected_types else None)
     )
     sigma_val = (
         sigma_gaussian
@@ -105,7 +65,7 @@ def testebench(
         fried_parameter_turbulence
         if fried_parameter_turbulence is not None
         else (
-            max(1.0, config.kernel_size / 10)
+            max(1.0, kernel_size / 10)
             if "turbulence" in selected_types
             else None
         )
@@ -142,10 +102,7 @@ def testebench(
 
     psf_specs = [(name, base_specs[name]["params"]) for name in selected_types]
 
-    wandb_config = asdict(config)
-    wandb_config.pop("image_prior_fn", None)  # not serializable
-    wandb_config["psf_types"] = [name for name, _ in psf_specs]
-    wandb_config["psf_params"] = {
+    psf_params = {
         "gaussian_sigma": sigma_val,
         "motion_length": motion_length_val,
         "motion_angle": angle_motion if "motion" in selected_types else None,
@@ -155,13 +112,398 @@ def testebench(
         "rml_bandwidth": rml_bandwidth_val,
         "rml_seed": seed_rml if "rml" in selected_types else None,
     }
+    return psf_specs, psf_params
+
+
+def make_psf(psf_name: str, kernel_size: int, psf_kwargs: dict) -> np.ndarray:
+    """Generate a ground-truth PSF by name (identity when psf_name == "none")."""
+    if psf_name == "none":
+        k_np = np.zeros((kernel_size, kernel_size), dtype=np.float64)
+        k_np[kernel_size // 2, kernel_size // 2] = 1.0
+        return k_np
+    return get_psf(psf_name, size=kernel_size, **psf_kwargs)
+
+
+_PSF_ARG_NAMES = (
+    "psf_types",
+    "sigma_gaussian",
+    "motion_length",
+    "angle_motion",
+    "fried_parameter_turbulence",
+    "distortion_strength_turbulence",
+    "seed_turbulence",
+    "bandwidth_rml",
+    "seed_rml",
+)
+
+
+def split_testbench_config(cfg: dict) -> tuple[dict, dict]:
+    """Split a `TESTBENCH_CONFIGS` entry into solver kwargs and PSF kwargs.
+
+    Solver kwargs are the `BlindDeconvConfig` fields present in `cfg`; PSF kwargs are the
+    arguments of `resolve_psf_specs` (minus `kernel_size`). Other keys (e.g. `name`) are dropped.
+    """
+    solver_fields = {f.name for f in fields(BlindDeconvConfig)}
+    solver_kwargs = {k: v for k, v in cfg.items() if k in solver_fields}
+    psf_kwargs = {k: v for k, v in cfg.items() if k in _PSF_ARG_NAMES}
+    return solver_kwargs, psf_kwargs
+
+
+def dataset_images(
+    keep: Callable[[int], bool] | None = None,
+) -> Iterator[Tuple[str, torch.Tensor | None]]:
+    """Yield (file name, x_true) for every image under `images/`, x_true of shape (1,1,H,W).
+
+    Images whose index fails `keep(img_idx)` are not read from disk; they are
+    yielded as (file name, None) so the indices of the remaining images stay the same.
+    """
+    for img_idx, img_path in enumerate(list_image_paths()):
+        if keep is not None and not keep(img_idx):
+            yield img_path.name, None
+            continue
+        x_true = load_image(img_path, mode="torch", grayscale=True, normalize=True)
+        yield img_path.name, x_true
+
+
+class Problem(NamedTuple):
+    """One testbench case: an image blurred by one PSF."""
+
+    img_idx: int
+    img_name: str
+    psf_idx: int
+    psf_name: str
+    x_true: torch.Tensor
+    k_true: torch.Tensor
+    y_meas: torch.Tensor
+
+
+def match_kernel_sizes(
+    k_hat: torch.Tensor, k_true: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Zero-pad the smaller of two centred odd-sized kernels to the other's size.
+
+    Needed when the solver grew its kernel (`max_kernel_size`) beyond the
+    size the true PSF was generated at.
+    """
+    size_hat, size_true = k_hat.shape[-1], k_true.shape[-1]
+    pad = abs(size_hat - size_true) // 2
+    if size_hat < size_true:
+        k_hat = F.pad(k_hat, (pad, pad, pad, pad))
+    elif size_true < size_hat:
+        k_true = F.pad(k_true, (pad, pad, pad, pad))
+    return k_hat, k_true
+
+
+def measurement_seed(noise_seed: int, img_idx: int, psf_idx: int) -> int:
+    """Seed of the measurement noise for one (image, PSF) pair.
+
+    Depends only on its arguments, so a case gets the same noise regardless of
+    the order in which cases are generated or which of them are run.
+    """
+    return int(np.random.SeedSequence([noise_seed, img_idx, psf_idx]).generate_state(1)[0])
+
+
+def _image_groups(
+    images: Iterable[tuple[int, str, torch.Tensor]], max_batch: int
+) -> Iterator[list[tuple[int, str, torch.Tensor]]]:
+    """Group consecutive same-sized (img_idx, name, x_true) triples into lists.
+
+    Each list holds at most `max_batch` images.
+    """
+    group: list[tuple[int, str, torch.Tensor]] = []
+    for img_idx, img_name, x_true in images:
+        if group and (len(group) >= max_batch or group[0][2].shape != x_true.shape):
+            yield group
+            group = []
+        group.append((img_idx, img_name, x_true))
+    if group:
+        yield group
+
+
+def _seeded(seed: int) -> torch.Generator:
+    return torch.Generator().manual_seed(seed)
+
+
+def synthesize_measurements(
+    x_true: torch.Tensor,
+    k_true: torch.Tensor,
+    noise_sigma: float,
+    seeds: list[list[int]],
+) -> torch.Tensor:
+    """Blur every image with every PSF in one convolution and add seeded noise.
+
+    Args:
+        x_true: images, shape (B,1,H,W)
+        k_true: PSFs, shape (P,1,K,K) with odd K ('same' padding as `forward_convolve`)
+        noise_sigma: std of the additive Gaussian noise
+        seeds: B lists of P noise seeds; case (b, p) draws its noise from
+            `torch.Generator().manual_seed(seeds[b][p])`, exactly as
+            `forward_model(..., generator=...)` would
+
+    Returns:
+        Measurements of shape (B,P,H,W); y[b, p] is image b blurred by PSF p.
+    """
+    K = k_true.shape[-1]
+    with torch.no_grad():
+        y = F.conv2d(x_true, k_true.to(x_true.dtype), padding=K // 2)
+        if noise_sigma > 0.0:
+            H, W = y.shape[-2:]
+            noise = torch.stack(
+                [
+                    torch.randn((H, W), generator=_seeded(seed), dtype=y.dtype)
+                    for row in seeds
+                    for seed in row
+                ]
+            ).view(y.shape)
+            y = y + float(noise_sigma) * noise.to(y.device)
+    return y
+
+
+def _measurement_cache_path(
+    cache_dir: Path,
+    x_true: torch.Tensor,
+    k_true: torch.Tensor,
+    psf_name: str,
+    psf_kwargs: dict,
+    noise_sigma: float,
+    seed: int,
+) -> Path:
+    """Cache file of one measurement, keyed by image content, PSF spec + kernel, and noise."""
+    digest = hashlib.sha256()
+    for tensor in (x_true, k_true):
+        array = tensor.detach().to("cpu", torch.float32).contiguous().numpy()
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    spec = json.dumps([psf_name, psf_kwargs, float(noise_sigma), int(seed)], sort_keys=True)
+    digest.update(spec.encode())
+    return cache_dir / f"{psf_name}_{digest.hexdigest()[:24]}.pt"
+
+
+def measurement_problems(
+    images: Iterable[Tuple[str, torch.Tensor]],
+    psf_specs: list[tuple[str, dict]],
+    kernel_size: int,
+    device: str | torch.device = "cpu",
+    noise_sigma: float = MEASUREMENT_NOISE_SIGMA,
+    noise_seed: int = 0,
+    image_batch_size: int = 8,
+    cache_dir: str | Path | None = None,
+    select: Callable[[int, int], bool] | None = None,
+) -> Iterator[Problem]:
+    """Yield a `Problem` for every image x PSF pair, images outermost.
+
+    Consecutive images of equal size (up to `image_batch_size`) are blurred by
+    all PSFs at once on `device` (`synthesize_measurements`). The noise of case
+    (img_idx, psf_idx) is drawn from a generator seeded with
+    `measurement_seed(noise_seed, img_idx, psf_idx)`, so it does not depend on
+    the grouping. PSFs are generated once per image group.
+
+    With `cache_dir`, measurements are stored as `.pt` files keyed by image
+    content, PSF spec (and the generated kernel), noise level and seed, and
+    reused by later calls, e.g. by other `TESTBENCH_CONFIGS` entries sharing
+    the same PSF settings.
+
+    `select(img_idx, psf_idx)` restricts the yielded cases (e.g. to one shard);
+    images without any selected case are skipped before synthesis.
+    """
+    cache_path = Path(cache_dir) if cache_dir is not None else None
+    if cache_path is not None:
+        cache_path.mkdir(parents=True, exist_ok=True)
 
-    run = wandb.init(
-        project="deconvolution",
-        job_type="blind_deconvolution",
-        name=run_name,
-        config=wandb_config,
-        notes="Blind deconvolution baseline with iterative optimization and PSNR/SSIM logging.",
+    def selected(img_idx: int, psf_idx: int) -> bool:
+        return select is None or select(img_idx, psf_idx)
+
+    indexed = (
+        (img_idx, img_name, x_true)
+        for img_idx, (img_name, x_true) in enumerate(images)
+        if any(selected(img_idx, psf_idx) for psf_idx in range(len(psf_specs)))
+    )
+    for group in _image_groups(indexed, max(1, image_batch_size)):
+        # Ground-truth PSFs (or identity if psf_name == "none"), shape (P,1,K,K)
+        k_true = torch.cat(
+            [
+                numpy_kernel_to_tensor(make_psf(psf_name, kernel_size, psf_kwargs))
+                for psf_name, psf_kwargs in psf_specs
+            ]
+        ).to(device)
+        x_true = torch.cat([x for _, _, x in group]).to(device)
+        seeds = [
+            [measurement_seed(noise_seed, img_idx, psf_idx) for psf_idx in range(len(psf_specs))]
+            for img_idx, _, _ in group
+        ]
+
+        y_meas = None
+        paths = None
+        if cache_path is not None:
+            paths = [
+                [
+                    _measurement_cache_path(
+                        cache_path, x_true[b], k_true[p], name, kwargs, noise_sigma, seeds[b][p]
+                    )
+                    for p, (name, kwargs) in enumerate(psf_specs)
+                ]
+                for b in range(len(group))
+            ]
+            if all(path.exists() for row in paths for path in row):
+                y_meas = torch.stack(
+                    [
+                        torch.cat([torch.load(path, weights_only=True) for path in row])
+                        for row in paths
+                    ]
+                ).to(device)
+        if y_meas is None:
+            y_meas = synthesize_measurements(x_true, k_true, noise_sigma, seeds)
+            if paths is not None:
+                for b, row in enumerate(paths):
+                    for p, path in enumerate(row):
+                        torch.save(y_meas[b, p : p + 1].cpu().clone(), path)
+
+        for b, (img_idx, img_name, _) in enumerate(group):
+            for psf_idx, (psf_name, _) in enumerate(psf_specs):
+                if not selected(img_idx, psf_idx):
+                    continue
+                yield Problem(
+                    img_idx,
+                    img_name,
+                    psf_idx,
+                    psf_name,
+                    x_true[b : b + 1],
+                    k_true[psf_idx : psf_idx + 1],
+                    y_meas[b : b + 1, psf_idx : psf_idx + 1],
+                )
+
+
+def testebench(
+    num_iters: int,
+    lr_x: float,
+    lr_k: float,
+    lambda_x: float = 0.0,
+    lambda_k_l2: float = 0.0,
+    lambda_k_center: float = 0.0,
+    lambda_k_auto: float = 0.0,
+    lambda_pink: float = 0.0,
+    lambda_diffusion: float = 0.0,
+    kernel_size: int = 21,
+    sigma_gaussian: float | None = None,
+    motion_length: int | None = None,
+    angle_motion: float = 0.0,
+    fried_parameter_turbulence: float | None = None,
+    distortion_strength_turbulence: float = 0.8,
+    seed_turbulence: int | None = None,
+    bandwidth_rml: float | None = None,
+    seed_rml: int | None = None,
+    psf_types: list[str] | None = None,
+    run_name: str | None = None,
+    logging_backend: str = "wandb",
+    log_dir: str = "runs",
+    images: Iterable[Tuple[str, torch.Tensor]] | None = None,
+    noise_seed: int = 0,
+    prefetch_problems: int = 2,
+    image_batch_size: int = 8,
+    measurement_cache: str | None = None,
+    shard_index: int = 0,
+    num_shards: int = 1,
+    shard_offset: int = 0,
+    results_dir: str | None = None,
+) -> None:
+    """Run blind deconvolution experiments across a dataset of images and multiple PSF types,
+    logging only final evaluation metrics and artifacts to Weights & Biases (or a local run directory).
+
+    Args:
+        num_iters (int): Number of optimization iterations to perform for each image/PSF.
+        lr_x (float): Learning rate for optimizing the latent image.
+        lr_k (float): Learning rate for optimizing the kernel/PSF.
+        lambda_x (float): Weight for the image prior regularization term.
+        lambda_k_l2 (float): L2 regularization weight applied to the kernel to discourage large values.
+        lambda_k_center (float): Weight encouraging kernel mass to be centered.
+        lambda_k_auto (float): Weight encouraging low autocorrelation (k * k ~ delta).
+        lambda_pink (float): Weight for a pink-noise (1/f) prior on the kernel, if used.
+        lambda_diffusion (float): Weight for diffusion-based regularization on image or kernel updates.
+        kernel_size (int): Size (height/width) of the square PSF kernel to generate and estimate.
+        sigma_gaussian (float): Standard deviation to use when generating a Gaussian PSF.
+        motion_length (int | None): Length of the motion blur in pixels. Defaults to kernel_size // 2.
+        angle_motion (float): Angle in degrees to use when generating a motion blur PSF.
+        fried_parameter_turbulence (float | None): Effective Fried parameter controlling the
+            turbulence PSF width (smaller => stronger blur). Defaults to kernel_size / 10.
+        distortion_strength_turbulence (float): Scales random distortions that make the turbulence
+            PSF irregular and harder than the motion blur baseline.
+        seed_turbulence (int | None): Optional RNG seed to make turbulence PSFs repeatable.
+        bandwidth_rml (float | None): Fractional Fourier cutoff for randomized optics PSFs.
+        seed_rml (int | None): Optional RNG seed for randomized optics PSFs.
+        psf_types (list[str] | None): Which PSF scenarios to run. Supported: ["none", "gaussian",
+            "motion", "turbulence", "rml"]. If None, runs the blurred trio (gaussian/motion/turbulence).
+        run_name (str | None): Optional W&B run name for deterministic labeling.
+        logging_backend (str): "wandb" (default) or "local". The local backend writes metrics to
+            JSONL and artifacts to npz/PNG under `log_dir`; both backends log on a background thread.
+        log_dir (str): Root directory for the local logging backend.
+        images (Iterable[tuple[str, Tensor]] | None): (name, x_true) pairs with x_true of shape
+            (1,1,H,W) in [0,1], e.g. `image_creator.synthetic_stream.synthetic_images(...)`.
+            Defaults to the images on disk (`dataset_images()`); images without a case in
+            this shard are not read.
+        noise_seed (int): Base seed of the measurement noise (see `measurement_seed`).
+        prefetch_problems (int): Number of (x_true, k_true, y_meas) cases prepared ahead on a
+            background thread while the current solve runs; 0 prepares them inline.
+        image_batch_size (int): Max number of same-sized images blurred by all PSFs in one
+            batched convolution.
+        measurement_cache (str | None): Optional directory caching measurements across runs and
+            configs (keyed by image, PSF spec and noise seed).
+        shard_index (int): Shard of the (image, PSF) work list run by this call (see
+            `testing.sharding.case_in_shard`); the other cases are skipped.
+        num_shards (int): Total number of shards; 1 runs every case.
+        shard_offset (int): Rotates the case-to-shard assignment (main.py passes the config index).
+        results_dir (str | None): If set, per-case metrics are written to
+            `shard_results_path(results_dir, run_name, shard_index, num_shards)` for
+            `merge_shard_results`.
+    """
+    config = BlindDeconvConfig(
+        num_iters=num_iters,
+        lr_x=lr_x,
+        lr_k=lr_k,
+        lambda_x=lambda_x,
+        lambda_k_l2=lambda_k_l2,
+        lambda_k_center=lambda_k_center,
+        lambda_k_auto=lambda_k_auto,
+        lambda_pink=lambda_pink,
+        lambda_diffusion=lambda_diffusion,
+        kernel_size=kernel_size,
+        device=choose_device(),
+    )
+
+    psf_specs, psf_params = resolve_psf_specs(
+        kernel_size=config.kernel_size,
+        psf_types=psf_types,
+        sigma_gaussian=sigma_gaussian,
+        motion_length=motion_length,
+        angle_motion=angle_motion,
+        fried_parameter_turbulence=fried_parameter_turbulence,
+        distortion_strength_turbulence=distortion_strength_turbulence,
+        seed_turbulence=seed_turbulence,
+        bandwidth_rml=bandwidth_rml,
+        seed_rml=seed_rml,
+    )
+
+    run_config = asdict(config)
+    run_config.pop("image_prior_fn", None)  # not serializable
+    run_config["psf_types"] = [name for name, _ in psf_specs]
+    run_config["psf_params"] = psf_params
+    run_config["shard"] = {"index": shard_index, "count": num_shards}
+
+    logger_kwargs = {}
+    if logging_backend == "wandb":
+        logger_kwargs = {
+            "job_type": "blind_deconvolution",
+            "notes": "Blind deconvolution baseline with iterative optimization and PSNR/SSIM logging.",
+        }
+    logger = create_logger(
+        logging_backend,
+        run_name=(
+            f"{run_name}-shard{shard_index}of{num_shards}"
+            if run_name is not None and num_shards > 1
+            else run_name
+        ),
+        config=run_config,
+        log_dir=log_dir,
+        **logger_kwargs,
     )
 
     psnr_scores = defaultdict(list)
@@ -169,110 +511,184 @@ def testebench(
     kernel_errors = defaultdict(list)
     device = choose_device()
 
+    def in_shard(img_idx: int, psf_idx: int) -> bool:
+        return case_in_shard(
+            img_idx * len(psf_specs) + psf_idx, shard_index, num_shards, shard_offset
+        )
+
+    def image_in_shard(img_idx: int) -> bool:
+        return any(in_shard(img_idx, psf_idx) for psf_idx in range(len(psf_specs)))
+
+    # Measurements for the next cases are synthesized while the current one is solved.
+    problems = Prefetcher(
+        measurement_problems(
+            images if images is not None else dataset_images(keep=image_in_shard),
+            psf_specs,
+            config.kernel_size,
+            device=device,
+            noise_seed=noise_seed,
+            image_batch_size=image_batch_size,
+            cache_dir=measurement_cache,
+            select=in_shard,
+        ),
+        max_prefetch=prefetch_problems,
+    )
+
+    results_file = None
+    if results_dir is not None:
+        results_path = shard_results_path(
+            results_dir, run_name or "default", shard_index, num_shards
+        )
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        results_file = results_path.open("w")
+
     try:
-        for img_idx, img_path in enumerate(list_image_paths()):
-            print(f"\n=== Processing {img_path} ===")
-
-            # Load clean image x_true
-            x_true = load_image(
-                img_path, mode="torch", grayscale=True, normalize=True
-            ).to(device)
-
-            for psf_idx, (psf_name, psf_kwargs) in enumerate(psf_specs):
-                # Generate ground-truth PSF (or identity if psf_name == "none")
-                if psf_name == "none":
-                    k_np = np.zeros(
-                        (config.kernel_size, config.kernel_size), dtype=np.float64
-                    )
-                    k_np[config.kernel_size // 2, config.kernel_size // 2] = 1.0
-                else:
-                    k_np = get_psf(psf_name, size=config.kernel_size, **psf_kwargs)
+        prev_img_idx = None
+        for img_idx, img_name, psf_idx, psf_name, x_true, k_true, y_meas in problems:
+            # A shard may start an image at any PSF
+            if img_idx != prev_img_idx:
+                print(f"\n=== Processing {img_name} ===")
+                prev_img_idx = img_idx
 
-                k_true = numpy_kernel_to_tensor(k_np).to(device)
+            solver = BlindDeconvolver(config).to(device)
 
-                # Create blurred measurement
-                with torch.no_grad():
-                    y_meas = forward_model(x_true, k_true, noise_sigma=0.01)
+            x_hat, k_hat, losses = solver.run(y_meas, verbose=True, log_fn=None)
 
-                solver = BlindDeconvolver(config).to(device)
+            # Log only the essentials for this image/PSF pairing
+            logger.log(
+                {
+                    "image_name": img_name,
+                    "psf_type": psf_name,
+                    "measurement": image(y_meas, f"measurement_{img_name}"),
+                }
+            )
 
-                x_hat, k_hat, losses = solver.run(y_meas, verbose=True, log_fn=None)
+            # Compute evaluation metrics
+            k_hat, k_true = match_kernel_sizes(k_hat, k_true)
+            p = psnr(x_hat, x_true)
+            s = ssim(x_hat, x_true)
+            k_err = kernel_error(k_hat, k_true)
+            # Same metrics after undoing the x/k translation ambiguity
+            aligned = aligned_metrics(x_hat, x_true, k_hat, k_true)
+            psnr_scores[psf_name].append(p)
+            ssim_scores[psf_name].append(s)
+            kernel_errors[psf_name].append(k_err)
 
-                # Log only the essentials for this image/PSF pairing
-                wandb.log(
-                    {
-                        "image_name": img_path.name,
-                        "psf_type": psf_name,
-                        "measurement": tensor_to_wandb_image(
-                            y_meas, f"measurement_{img_path.name}"
-                        ),
-                    }
-                )
+            logger.log(
+                {
+                    "image_name": img_name,
+                    "psf_type": psf_name,
+                    "psnr": p,
+                    "ssim": s,
+                    "kernel_error": k_err,
+                    "psnr_aligned": float(aligned["psnr"][0]),
+                    "ssim_aligned": float(aligned["ssim"][0]),
+                    "kernel_error_aligned": float(aligned["kernel_error"][0]),
+                    "reconstruction": image(x_hat, f"recon_{img_name}"),
+                    "estimated_kernel": image(k_hat, f"k_hat_{img_name}"),
+                    "loss_curve": curve(
+                        [losses],
+                        keys=["loss"],
+                        title=f"Loss - {img_name} [{psf_name}]",
+                        xname="iter",
+                    ),
+                },
+            )
 
-                # Compute evaluation metrics
-                p = psnr(x_hat, x_true)
-                s = ssim(x_hat, x_true)
-                k_err = kernel_error(k_hat, k_true)
-                psnr_scores[psf_name].append(p)
-                ssim_scores[psf_name].append(s)
-                kernel_errors[psf_name].append(k_err)
-
-                wandb.log(
-                    {
-                        "image_name": img_path.name,
-                        "psf_type": psf_name,
-                        "psnr": p,
-                        "ssim": s,
-                        "kernel_error": k_err,
-                        "reconstruction": tensor_to_wandb_image(
-                            x_hat, f"recon_{img_path.name}"
-                        ),
-                        "estimated_kernel": tensor_to_wandb_image(
-                            k_hat, f"k_hat_{img_path.name}"
-                        ),
-                        "loss_curve": wandb.plot.line_series(
-                            xs=list(range(len(losses))),
-                            ys=[losses],
-                            keys=["loss"],
-                            title=f"Loss - {img_path.name} [{psf_name}]",
-                            xname="iter",
-                        ),
-                    },
-                )
+            if results_file is not None:
+                record = {
+                    "image_name": img_name,
+                    "image_index": img_idx,
+                    "psf_type": psf_name,
+                    "psf_index": psf_idx,
+                    "psnr": p,
+                    "ssim": s,
+                    "kernel_error": k_err,
+                    "psnr_aligned": float(aligned["psnr"][0]),
+                    "ssim_aligned": float(aligned["ssim"][0]),
+                    "kernel_error_aligned": float(aligned["kernel_error"][0]),
+                    "final_loss": float(losses[-1]),
+                }
+                results_file.write(json.dumps(record) + "\n")
+                results_file.flush()
 
-                print(
-                    f"{psf_name} PSF -> PSNR: {p:.2f} dB, SSIM: {s:.4f}, Kernel Error: {k_err:.4f}"
-                )
-                print(f"Finished. Final loss: {losses[-1]:.6f}")
-                print(
-                    f"x_hat shape: {tuple(x_hat.shape)}, k_hat shape: {tuple(k_hat.shape)}"
-                )
+            print(
+                f"{psf_name} PSF -> PSNR: {p:.2f} dB, SSIM: {s:.4f}, Kernel Error: {k_err:.4f}"
+            )
+            print(f"Finished. Final loss: {losses[-1]:.6f}")
+            print(
+                f"x_hat shape: {tuple(x_hat.shape)}, k_hat shape: {tuple(k_hat.shape)}"
+            )
     finally:
-        if wandb.run is not None:
-            all_psnr = [score for scores in psnr_scores.values() for score in scores]
-            all_ssim = [score for scores in ssim_scores.values() for score in scores]
-            all_kernel_errors = [
-                score for scores in kernel_errors.values() for score in scores
-            ]
-            if all_psnr:
-                wandb.run.summary["mean_psnr"] = sum(all_psnr) / len(all_psnr)
-                wandb.run.summary["mean_ssim"] = sum(all_ssim) / len(all_ssim)
-                wandb.run.summary["mean_kernel_error"] = sum(all_kernel_errors) / len(
-                    all_kernel_errors
-                )
-                for name, scores in psnr_scores.items():
-                    if scores:
-                        wandb.run.summary[f"mean_psnr_{name}"] = sum(scores) / len(
-                            scores
-                        )
-                for name, scores in ssim_scores.items():
-                    if scores:
-                        wandb.run.summary[f"mean_ssim_{name}"] = sum(scores) / len(
-                            scores
-                        )
-                for name, scores in kernel_errors.items():
-                    if scores:
-                        wandb.run.summary[f"mean_kernel_error_{name}"] = sum(
-                            scores
-                        ) / len(scores)
-            wandb.finish()
+        problems.close()
+        if results_file is not None:
+            results_file.close()
+        for key, value in summarize_scores(
+            psnr_scores, ssim_scores, kernel_errors
+        ).items():
+            logger.set_summary(key, value)
+        logger.finish()
+
+
+def summarize_scores(
+    psnr_scores: dict[str, list[float]],
+    ssim_scores: dict[str, list[float]],
+    kernel_errors: dict[str, list[float]],
+) -> dict[str, float]:
+    """Aggregate per-PSF metric lists into the run summary (overall and per-PSF means)."""
+    summary: dict[str, float] = {}
+    all_psnr = [score for scores in psnr_scores.values() for score in scores]
+    all_ssim = [score for scores in ssim_scores.values() for score in scores]
+    all_kernel_errors = [score for scores in kernel_errors.values() for score in scores]
+    if not all_psnr:
+        return summary
+
+    summary["mean_psnr"] = sum(all_psnr) / len(all_psnr)
+    summary["mean_ssim"] = sum(all_ssim) / len(all_ssim)
+    summary["mean_kernel_error"] = sum(all_kernel_errors) / len(all_kernel_errors)
+    for name, scores in psnr_scores.items():
+        if scores:
+            summary[f"mean_psnr_{name}"] = sum(scores) / len(scores)
+    for name, scores in ssim_scores.items():
+        if scores:
+            summary[f"mean_ssim_{name}"] = sum(scores) / len(scores)
+    for name, scores in kernel_errors.items():
+        if scores:
+            summary[f"mean_kernel_error_{name}"] = sum(scores) / len(scores)
+    return summary
+
+
+def merge_shard_results(results_dir: str | Path) -> dict[str, dict[str, float]]:
+    """Merge the per-shard result files under `results_dir` into per-run summaries.
+
+    Records of every `<run_name>/shard-*.jsonl` file are ordered by (image, PSF)
+    index, as an unsharded run would produce them, and aggregated with
+    `summarize_scores`. A warning is printed when shard files are missing.
+
+    Returns:
+        Mapping from run name to its summary dict.
+    """
+    summaries: dict[str, dict[str, float]] = {}
+    for run_dir in sorted(p for p in Path(results_dir).iterdir() if p.is_dir()):
+        shard_files = sorted(run_dir.glob("shard-*-of-*.jsonl"))
+        if not shard_files:
+            continue
+        expected = {int(f.stem.rsplit("-of-", 1)[1]) for f in shard_files}
+        if len(expected) > 1 or len(shard_files) != expected.pop():
+            print(f"Warning: incomplete or mixed shard files in {run_dir}")
+
+        records = []
+        for shard_file in shard_files:
+            with shard_file.open() as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+        records.sort(key=lambda r: (r["image_index"], r["psf_index"]))
+
+        psnr_scores = defaultdict(list)
+        ssim_scores = defaultdict(list)
+        kernel_errors = defaultdict(list)
+        for record in records:
+            psnr_scores[record["psf_type"]].append(record["psnr"])
+            ssim_scores[record["psf_type"]].append(record["ssim"])
+            kernel_errors[record["psf_type"]].append(record["kernel_error"])
+        summaries[run_dir.name] = summarize_scores(psnr_scores, ssim_scores, kernel_errors)
+    return summaries
@@ -0,0 +1,31 @@
+import torch
+
+from blind_deconvolution.blind_deconvolution import BlindDeconvConfig, BlindDeconvolver
+
+
+def _losses(**overrides) -> list[float]:
+    # Values outside [0, 1] keep the clipped initial x from fitting y exactly.
+    y_meas = 2 * torch.rand(1, 1, 48, 48, generator=torch.Generator().manual_seed(0)) - 0.5
+    config = BlindDeconvConfig(
+        num_iters=6, freeze_k_iters=4, kernel_size=5, device="cpu", seed=0, **overrides
+    )
+    _, _, losses = BlindDeconvolver(config).run(y_meas, verbose=False)
+    return losses
+
+
+def test_compile_step_keeps_the_patch_data_term():
+    eager = _losses(patch_size=8, patch_count=4)
+    compiled = _losses(patch_size=8, patch_count=4, compile_step=True)
+
+    torch.testing.assert_close(torch.tensor(compiled), torch.tensor(eager))
+    # The kernel-only iterations must not fall back to the full-image data term.
+    full = _losses()
+    assert compiled[0] != full[0]
+
+
+def test_compile_step_keeps_the_region_data_term():
+    regions = dict(kernel_regions=2, region_size=16, region_x_iters=2)
+    eager = _losses(**regions)
+    compiled = _losses(**regions, compile_step=True)
+
+    torch.testing.assert_close(torch.tensor(compiled), torch.tensor(eager))
@@ -0,0 +1,19 @@
+import torch
+
+from blind_deconvolution.priors.pink_noise import pink_noise_loss
+
+
+def test_per_sample_losses_match_single_sample_calls():
+    generator = torch.Generator().manual_seed(0)
+    x = torch.stack(
+        [
+            torch.zeros(1, 32, 32),
+            torch.rand(1, 32, 32, generator=generator),
+            torch.rand(1, 32, 32, generator=generator) * 0.5,
+        ]
+    )
+
+    batched = pink_noise_loss(x, reduction="none")
+    single = torch.stack([pink_noise_loss(x[i : i + 1]) for i in range(x.shape[0])])
+
+    torch.testing.assert_close(batched, single)
@@ -0,0 +1,28 @@
+import torch
+
+from blind_deconvolution.forward_model import separable_factors, separable_ranks
+
+
+def test_per_kernel_ranks_match_single_kernel_factors():
+    generator = torch.Generator().manual_seed(0)
+    k = torch.rand(3, 1, 7, 7, generator=generator)
+    ranks = torch.tensor([1, 3, 2])
+
+    cols, rows = separable_factors(k, ranks)
+
+    assert cols.shape == (3, 3, 7) and rows.shape == (3, 3, 7)
+    for i, rank in enumerate(ranks.tolist()):
+        single_cols, single_rows = separable_factors(k[i : i + 1], rank)
+        torch.testing.assert_close(cols[i, :rank], single_cols[0])
+        torch.testing.assert_close(rows[i, :rank], single_rows[0])
+        assert not cols[i, rank:].any() and not rows[i, rank:].any()
+
+
+def test_ranks_are_per_kernel():
+    delta = torch.zeros(1, 1, 5, 5)
+    delta[..., 2, 2] = 1.0
+    k = torch.cat([delta, torch.rand(1, 1, 5, 5, generator=torch.Generator().manual_seed(0))])
+
+    ranks = separable_ranks(k, energy=1.0)
+
+    assert ranks.tolist() == [1, 5]
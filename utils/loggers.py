@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+##############################
+# Payload types
+##############################
+
+
+@dataclass
+class LoggedImage:
+    """Host-side copy of an image/kernel queued for logging."""
+
+    array: np.ndarray
+    caption: str = ""
+
+
+@dataclass
+class LoggedCurve:
+    """Line-series payload (e.g. a loss curve) queued for logging."""
+
+    ys: List[List[float]]
+    keys: List[str]
+    title: str = ""
+    xname: str = "iter"
+    xs: Optional[List[float]] = None
+
+
+def image(tensor: torch.Tensor, caption: str = "") -> LoggedImage:
+    """Snapshot a (1,1,H,W) / (H,W) tensor for asynchronous logging.
+
+    Only the device -> host copy happens on the caller's thread; normalization
+    and encoding are done by the logging worker.
+    """
+    array = tensor.detach().to("cpu", torch.float32).squeeze().numpy().copy()
+    return LoggedImage(array=array, caption=caption)
+
+
+def curve(
+    ys: Sequence[Sequence[float]] | Sequence[float],
+    keys: Sequence[str],
+    title: str = "",
+    xname: str = "iter",
+) -> LoggedCurve:
+    """Build a line-series payload from one or more value sequences."""
+    if len(ys) > 0 and not isinstance(ys[0], (list, tuple, np.ndarray)):
+        ys = [ys]
+    return LoggedCurve(
+        ys=[list(map(float, series)) for series in ys],
+        keys=list(keys),
+        title=title,
+        xname=xname,
+    )
+
+
+def normalize_for_display(array: np.ndarray) -> np.ndarray:
+    """Min-max normalize an array to [0,1] (constant arrays map to 0)."""
+    array = np.asarray(array, dtype=np.float32)
+    arr_min = array.min()
+    arr_max = array.max()
+    if arr_max > arr_min:
+        return (array - arr_min) / (arr_max - arr_min)
+    return array * 0.0  # fallback for constant arrays
+
+
+##############################
+# Logger interface
+##############################
+
+
+class ExperimentLogger:
+    """Minimal logging interface used by the testbench.
+
+    Values passed to `log` may be scalars, strings, `LoggedImage` or
+    `LoggedCurve` instances (see `image` / `curve`).
+    """
+
+    def log(self, payload: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def set_summary(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self) -> "ExperimentLogger":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.finish()
+
+
+_STOP = object()
+
+
+class AsyncLogger(ExperimentLogger):
+    """Runs backend writes on a background thread fed by a bounded queue.
+
+    `log` only enqueues; the worker thread performs conversion and I/O. When
+    the queue is full, `log` blocks (backpressure) unless `drop_when_full` is
+    set, in which case the payload is dropped and counted in `dropped`.
+    """
+
+    def __init__(self, max_queue_size: int = 64, drop_when_full: bool = False):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._drop_when_full = drop_when_full
+        self._error: Optional[BaseException] = None
+        self._finished = False
+        self.dropped = 0
+        self._thread = threading.Thread(
+            target=self._worker, name=type(self).__name__, daemon=True
+        )
+        self._thread.start()
+
+    def log(self, payload: Dict[str, Any]) -> None:
+        self._put(("log", dict(payload)))
+
+    def set_summary(self, key: str, value: Any) -> None:
+        self._put(("summary", key, value))
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._close()
+        if self._error is not None:
+            raise RuntimeError(f"{type(self).__name__} failed") from self._error
+
+    def _put(self, item: tuple) -> None:
+        if self._finished:
+            raise RuntimeError("Logger already finished.")
+        if self._drop_when_full:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self._queue.put(item)
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None:
+                continue  # keep draining so producers never block forever
+            try:
+                if item[0] == "log":
+                    self._write_log(item[1])
+                else:
+                    self._write_summary(item[1], item[2])
+            except BaseException as exc:  # surfaced on finish()
+                self._error = exc
+
+    # Backend hooks (run on the worker thread, except `_close`).
+    def _write_log(self, payload: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _write_summary(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def _close(self) -> None:
+        pass
+
+
+##############################
+# Backends
+##############################
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (np.generic,)):
+        return value.item()
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().tolist()
+    if isinstance(value, Path):
+        return str(value)
+    return value
+
+
+class LocalLogger(AsyncLogger):
+    """Writes metrics to `<run_dir>/metrics.jsonl` and artifacts to `<run_dir>/artifacts/`.
+
+    Images are stored as a PNG preview plus the raw float array in a
+    compressed `.npz`; curves are stored as compressed `.npz`. Each JSONL
+    record references its artifacts by relative path.
+    """
+
+    def __init__(
+        self,
+        run_dir: str | Path,
+        config: Optional[Dict[str, Any]] = None,
+        max_queue_size: int = 64,
+        drop_when_full: bool = False,
+    ):
+        self.run_dir = Path(run_dir)
+        self.artifact_dir = self.run_dir / "artifacts"
+        self.artifact_dir.mkdir(parents=True, exist_ok=True)
+        if config is not None:
+            with open(self.run_dir / "config.json", "w") as f:
+                json.dump(config, f, indent=2, default=str)
+        self._metrics_file = open(self.run_dir / "metrics.jsonl", "a")
+        self._summary: Dict[str, Any] = {}
+        self._step = 0
+        super().__init__(max_queue_size=max_queue_size, drop_when_full=drop_when_full)
+
+    def _write_log(self, payload: Dict[str, Any]) -> None:
+        record: Dict[str, Any] = {"_step": self._step, "_time": time.time()}
+        for key, value in payload.items():
+            if isinstance(value, LoggedImage):
+                record[key] = self._save_image(key, value)
+            elif isinstance(value, LoggedCurve):
+                record[key] = self._save_curve(key, value)
+            else:
+                record[key] = _jsonable(value)
+        self._metrics_file.write(json.dumps(record) + "\n")
+        self._metrics_file.flush()
+        self._step += 1
+
+    def _save_image(self, key: str, img: LoggedImage) -> str:
+        from skimage import img_as_ubyte, io
+
+        stem = f"{self._step:06d}_{key}"
+        np.savez_compressed(self.artifact_dir / f"{stem}.npz", array=img.array)
+        preview = normalize_for_display(img.array)
+        if preview.ndim == 2:
+            io.imsave(
+                self.artifact_dir / f"{stem}.png",
+                img_as_ubyte(preview),
+                check_contrast=False,
+            )
+        return f"artifacts/{stem}.npz"
+
+    def _save_curve(self, key: str, crv: LoggedCurve) -> str:
+        stem = f"{self._step:06d}_{key}"
+        ys = np.asarray(crv.ys, dtype=np.float32)
+        xs = np.asarray(
+            crv.xs if crv.xs is not None else np.arange(ys.shape[-1]), dtype=np.float32
+        )
+        np.savez_compressed(
+            self.artifact_dir / f"{stem}.npz",
+            xs=xs,
+            ys=ys,
+            keys=np.asarray(crv.keys),
+            title=np.asarray(crv.title),
+        )
+        return f"artifacts/{stem}.npz"
+
+    def _write_summary(self, key: str, value: Any) -> None:
+        self._summary[key] = _jsonable(value)
+
+    def _close(self) -> None:
+        self._metrics_file.close()
+        with open(self.run_dir / "summary.json", "w") as f:
+            json.dump(self._summary, f, indent=2)
+
+
+class WandbLogger(AsyncLogger):
+    """Weights & Biases backend; `wandb.log` runs on the worker thread."""
+
+    def __init__(
+        self,
+        run_name: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        project: str = "deconvolution",
+        max_queue_size: int = 64,
+        drop_when_full: bool = False,
+        **init_kwargs,
+    ):
+        import wandb
+
+        self._wandb = wandb
+        self.run = wandb.init(
+            project=project, name=run_name, config=config, **init_kwargs
+        )
+        super().__init__(max_queue_size=max_queue_size, drop_when_full=drop_when_full)
+
+    def _write_log(self, payload: Dict[str, Any]) -> None:
+        wandb = self._wandb
+        converted: Dict[str, Any] = {}
+        for key, value in payload.items():
+            if isinstance(value, LoggedImage):
+                converted[key] = wandb.Image(
+                    normalize_for_display(value.array), caption=value.caption
+                )
+            elif isinstance(value, LoggedCurve):
+                xs = (
+                    value.xs
+                    if value.xs is not None
+                    else list(range(len(value.ys[0]) if value.ys else 0))
+                )
+                converted[key] = wandb.plot.line_series(
+                    xs=xs,
+                    ys=value.ys,
+                    keys=value.keys,
+                    title=value.title,
+                    xname=value.xname,
+                )
+            else:
+                converted[key] = value
+        wandb.log(converted)
+
+    def _write_summary(self, key: str, value: Any) -> None:
+        self.run.summary[key] = value
+
+    def _close(self) -> None:
+        self._wandb.finish()
+
+
+LOGGER_BACKENDS = ("wandb", "local")
+
+
+def _unique_run_dir(log_dir: str | Path, name: str) -> Path:
+    """Create and return `<log_dir>/<name>`, adding "-1", "-2", ... if it exists.
+
+    `mkdir` is atomic, so runs started in the same second (or concurrent
+    shard processes) never share a directory.
+    """
+    root = Path(log_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    suffix = 0
+    while True:
+        run_dir = root / (name if suffix == 0 else f"{name}-{suffix}")
+        try:
+            run_dir.mkdir()
+            return run_dir
+        except FileExistsError:
+            suffix += 1
+
+
+def create_logger(
+    backend: str,
+    run_name: Optional[str] = None,
+    config: Optional[Dict[str, Any]] = None,
+    log_dir: str | Path = "runs",
+    **kwargs,
+) -> ExperimentLogger:
+    """Construct a logging backend by name.
+
+    Args:
+        backend: One of `LOGGER_BACKENDS` ("wandb" or "local").
+        run_name: Optional run name; for the local backend this becomes the
+            run directory prefix (a timestamp, plus a counter if that
+            directory already exists, is appended).
+        config: Run configuration recorded alongside the metrics.
+        log_dir: Root directory for the local backend.
+        **kwargs: Forwarded to the backend constructor.
+    """
+    backend = backend.lower()
+    if backend == "wandb":
+        return WandbLogger(run_name=run_name, config=config, **kwargs)
+    if backend == "local":
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        run_dir = _unique_run_dir(log_dir, f"{run_name or 'run'}-{stamp}")
+        return LocalLogger(run_dir, config=config, **kwargs)
+    raise ValueError(f"Unknown logging backend: {backend}. Supported: {LOGGER_BACKENDS}")
@@ -2,8 +2,73 @@
 
 import torch
 import torch.nn.functional as F
-from math import log10
-from skimage.metrics import structural_similarity as ssim_fn
+
+
+def batch_psnr(
+    x_hat: torch.Tensor, x_true: torch.Tensor, data_range: float = 1.0
+) -> torch.Tensor:
+    """
+    Per-image PSNR for a batch, computed on the tensors' device.
+
+    Args:
+        x_hat: reconstructed images, shape (B,C,H,W)
+        x_true: ground-truth images, shape (B,C,H,W) (or broadcastable)
+        data_range: max value in image (1.0 for normalized)
+
+    Returns:
+        Tensor of shape (B,) with PSNR in dB (inf where the images match)
+    """
+    mse = ((x_hat - x_true) ** 2).mean(dim=(1, 2, 3))
+    return 10.0 * torch.log10(data_range**2 / mse)
+
+
+def batch_ssim(
+    x_hat: torch.Tensor,
+    x_true: torch.Tensor,
+    data_range: float = 1.0,
+    win_size: int = 11,
+) -> torch.Tensor:
+    """
+    Per-image SSIM for a batch, matching `skimage.metrics.structural_similarity`.
+
+    Uses skimage's defaults: a uniform `win_size` window, sample covariance
+    and K1=0.01, K2=0.03. skimage averages the SSIM map after cropping
+    (win_size-1)//2 pixels per side, which is exactly the 'valid' output of
+    an average pool. Channels are averaged (as with `channel_axis`).
+
+    Args:
+        x_hat: reconstructed images, shape (B,C,H,W)
+        x_true: ground-truth images, shape (B,C,H,W)
+        data_range: max pixel value
+        win_size: odd window size (11 = classical SSIM window)
+
+    Returns:
+        Tensor of shape (B,) with SSIM scores
+    """
+    if min(x_hat.shape[-2:]) < win_size:
+        raise ValueError(f"Images must be at least {win_size}x{win_size} for SSIM.")
+    B, C, H, W = x_hat.shape
+    x = x_hat.reshape(B * C, 1, H, W)
+    y = x_true.expand_as(x_hat).reshape(B * C, 1, H, W)
+
+    # All five local means in one separable box filter (rows, then columns).
+    moments = torch.cat([x, y, x * x, y * y, x * y], dim=1)
+    means = F.avg_pool2d(moments, (win_size, 1), stride=1)
+    means = F.avg_pool2d(means, (1, win_size), stride=1)
+    ux, uy, uxx, uyy, uxy = means.unbind(dim=1)
+
+    num_pixels = win_size * win_size
+    cov_norm = num_pixels / (num_pixels - 1)
+    vx = cov_norm * (uxx - ux * ux)
+    vy = cov_norm * (uyy - uy * uy)
+    vxy = cov_norm * (uxy - ux * uy)
+
+    c1 = (0.01 * data_range) ** 2
+    c2 = (0.03 * data_range) ** 2
+    ssim_map = ((2 * ux * uy + c1) * (2 * vxy + c2)) / (
+        (ux * ux + uy * uy + c1) * (vx + vy + c2)
+    )
+    return ssim_map.mean(dim=(1, 2)).reshape(B, C).mean(dim=1)
 
 
 def psnr(x_hat: torch.Tensor, x_true: torch.Tensor, data_range: float = 1.0) -> float:
@@ -18,14 +83,7 @@ def psnr(x_hat: torch.Tensor, x_true: torch.Tensor, data_range: float = 1.0) ->
     Returns:
         PSNR in dB (float)
     """
-    x_hat_np = x_hat.detach().cpu().numpy()
-    x_true_np = x_true.detach().cpu().numpy()
-
-    mse = ((x_hat_np - x_true_np) ** 2).mean()
-    if mse == 0:
-        return float("inf")
-
-    return 20 * log10(data_range) - 10 * log10(mse)
+    return float(batch_psnr(x_hat.detach().double(), x_true.detach().double(), data_range)[0])
 
 
 def ssim(x_hat: torch.Tensor, x_true: torch.Tensor, data_range: float = 1.0) -> float:
@@ -40,16 +98,13 @@ def ssim(x_hat: torch.Tensor, x_true: torch.Tensor, data_range: float = 1.0) ->
     Returns:
         SSIM score (float)
     """
-    x_hat_np = x_hat.detach().cpu().numpy()[0, 0]
-    x_true_np = x_true.detach().cpu().numpy()[0, 0]
-
-    score = ssim_fn(
-        x_true_np,
-        x_hat_np,
+    score = batch_ssim(
+        x_hat.detach().double(),
+        x_true.detach().double(),
         data_range=data_range,
-        win_size=11  # classical SSIM window
+        win_size=11,  # classical SSIM window
     )
-    return float(score)
+    return float(score[0])
 
 def kernel_error(k_hat: torch.Tensor, k_true: torch.Tensor) -> float:
     """Compute relative error between estimated and true kernels.
@@ -61,4 +116,17 @@ def kernel_error(k_hat: torch.Tensor, k_true: torch.Tensor) -> float:
         float: Relative error between k_hat and k_true.
     """
     diff = k_hat - k_true
-    return float(torch.norm(diff) / (torch.norm(k_true) + 1e-8))
\ No newline at end of file
+    return float(torch.norm(diff) / (torch.norm(k_true) + 1e-8))
+
+def batch_kernel_error(k_hat: torch.Tensor, k_true: torch.Tensor) -> torch.Tensor:
+    """Per-kernel relative error ||k_hat - k_true|| / ||k_true|| for (B,...) batches.
+
+    Args:
+        k_hat (torch.Tensor): Estimated kernels, shape (B,1,Kh,Kw).
+        k_true (torch.Tensor): Ground-truth kernels, shape (B,1,Kh,Kw).
+    Returns:
+        torch.Tensor: Relative errors of shape (B,).
+    """
+    dims = tuple(range(1, k_hat.dim()))
+    diff = torch.linalg.vector_norm(k_hat - k_true, dim=dims)
+    return diff / (torch.linalg.vector_norm(k_true, dim=dims) + 1e-8)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Generic, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class Prefetcher(Generic[T]):
+    """Iterate `source` on a background thread, keeping up to `max_prefetch` items ready.
+
+    Items come out in the source's order. An exception raised by the source
+    is re-raised in the consuming thread at the position it occurred. With
+    `max_prefetch=0` the source is iterated inline (no thread). Use as an
+    iterator, ideally inside a `with` block so an early exit stops the worker:
+
+        with Prefetcher(make_items(), max_prefetch=2) as items:
+            for item in items:
+                ...
+    """
+
+    def __init__(self, source: Iterable[T], max_prefetch: int = 2):
+        if max_prefetch < 0:
+            raise ValueError("max_prefetch must be >= 0")
+        self._source = source
+        self._queue: queue.Queue = queue.Queue(maxsize=max_prefetch)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        if max_prefetch > 0:
+            self._thread = threading.Thread(target=self._worker, name="Prefetcher", daemon=True)
+            self._thread.start()
+
+    def _put(self, item) -> bool:
+        """Blocking put that gives up once `close` was called."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self) -> None:
+        try:
+            for item in self._source:
+                if not self._put((item, None)):
+                    return
+        except BaseException as exc:  # surfaced to the consumer
+            self._put((_DONE, exc))
+            return
+        self._put((_DONE, None))
+
+    def __iter__(self) -> Iterator[T]:
+        if self._thread is None:
+            yield from self._source
+            return
+        while True:
+            item, error = self._queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+
+    def close(self) -> None:
+        """Stop the worker (after its current item) and drop prefetched items."""
+        self._stop.set()
+        if self._thread is None:
+            return
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+
+    def __enter__(self) -> "Prefetcher[T]":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
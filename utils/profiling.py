@@ -0,0 +1,108 @@
+import weakref
+
+import torch
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_leaves
+
+
+class TensorAllocationMode(TorchDispatchMode):
+    """Dispatch mode that counts tensor allocations made by torch ops.
+
+    Every op output whose storage is new (not an input's storage, not a view
+    of an already tracked storage) counts as one allocation. Live bytes are
+    released when the storage is garbage collected, which gives a peak of live
+    tensor memory that works on any device (including CPU, where the caching
+    allocator statistics are unavailable).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.num_allocations = 0
+        self.allocated_bytes = 0
+        self.live_bytes = 0
+        self.peak_bytes = 0
+        self._live_ptrs: set[int] = set()
+
+    def _release(self, ptr: int, nbytes: int) -> None:
+        if ptr in self._live_ptrs:
+            self._live_ptrs.discard(ptr)
+            self.live_bytes -= nbytes
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        input_ptrs = {
+            t.untyped_storage().data_ptr()
+            for t in tree_leaves((args, kwargs))
+            if isinstance(t, torch.Tensor)
+        }
+        for t in tree_leaves(out):
+            if not isinstance(t, torch.Tensor):
+                continue
+            storage = t.untyped_storage()
+            ptr = storage.data_ptr()
+            if ptr == 0 or ptr in input_ptrs or ptr in self._live_ptrs:
+                continue
+            nbytes = storage.nbytes()
+            self._live_ptrs.add(ptr)
+            self.num_allocations += 1
+            self.allocated_bytes += nbytes
+            self.live_bytes += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+            weakref.finalize(storage, self._release, ptr, nbytes)
+        return out
+
+
+class MemoryTracker:
+    """Context manager reporting peak memory and allocation counts for a block.
+
+    On CUDA the caching allocator statistics are used; elsewhere a
+    `TensorAllocationMode` tracks tensors allocated inside the block.
+
+    Usage:
+
+        with MemoryTracker(device) as mem:
+            ...
+        mem.peak_bytes, mem.num_allocations
+    """
+
+    def __init__(self, device: str | torch.device = "cpu"):
+        self.device = torch.device(device)
+        self.peak_bytes = 0
+        self.num_allocations = 0
+        self.allocated_bytes = 0
+        self._mode: TensorAllocationMode | None = None
+
+    def __enter__(self) -> "MemoryTracker":
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+            torch.cuda.reset_peak_memory_stats(self.device)
+            stats = torch.cuda.memory_stats(self.device)
+            self._base_bytes = torch.cuda.memory_allocated(self.device)
+            self._base_count = stats.get("allocation.all.allocated", 0)
+            self._base_alloc_bytes = stats.get("allocated_bytes.all.allocated", 0)
+        else:
+            self._mode = TensorAllocationMode()
+            self._mode.__enter__()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+            stats = torch.cuda.memory_stats(self.device)
+            self.peak_bytes = torch.cuda.max_memory_allocated(self.device) - self._base_bytes
+            self.num_allocations = stats.get("allocation.all.allocated", 0) - self._base_count
+            self.allocated_bytes = (
+                stats.get("allocated_bytes.all.allocated", 0) - self._base_alloc_bytes
+            )
+        else:
+            self._mode.__exit__(*exc)
+            self.peak_bytes = self._mode.peak_bytes
+            self.num_allocations = self._mode.num_allocations
+            self.allocated_bytes = self._mode.allocated_bytes
+
+
+def synchronize(device: str | torch.device) -> None:
+    """Wait for queued kernels on `device` (no-op on CPU)."""
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
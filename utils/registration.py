@@ -0,0 +1,173 @@
+# utils/registration.py
+
+import math
+from typing import Dict, Optional
+
+import torch
+import torch.fft as fft
+
+from utils.metrics import batch_kernel_error, batch_psnr, batch_ssim
+
+# Default window of `batch_ssim`; aligned crops never go below it.
+SSIM_WINDOW = 11
+
+
+def estimate_shift(
+    moving: torch.Tensor,
+    reference: torch.Tensor,
+    subpixel: bool = True,
+    pad: bool = False,
+    max_shift: Optional[int] = None,
+) -> torch.Tensor:
+    """
+    Shift that best aligns `moving` to `reference` via FFT cross-correlation.
+
+    The correlation over every shift is computed at once, so the cost does
+    not depend on the search radius. The integer peak is refined with a
+    parabolic fit per axis when `subpixel` is set.
+
+    Args:
+        moving: tensors to align, shape (B,C,H,W)
+        reference: targets, shape (B,C,H,W) (or broadcastable)
+        subpixel: refine the integer peak to sub-pixel precision
+        pad: zero-pad to 2x before correlating (linear instead of circular
+            correlation; use for kernels / small supports)
+        max_shift: only consider integer shifts with |dy|, |dx| <= max_shift
+            (None searches every shift)
+
+    Returns:
+        Tensor of shape (B,2) with (dy, dx) such that
+        `apply_shift(moving, shift)` is aligned with `reference`
+    """
+    moving = moving - moving.mean(dim=(-2, -1), keepdim=True)
+    reference = reference - reference.mean(dim=(-2, -1), keepdim=True)
+    H, W = moving.shape[-2:]
+    size = (2 * H, 2 * W) if pad else (H, W)
+
+    spectrum = fft.rfft2(reference, s=size) * torch.conj(fft.rfft2(moving, s=size))
+    corr = fft.irfft2(spectrum, s=size).sum(dim=1)  # (B, h, w), summed over channels
+    B, h, w = corr.shape
+
+    if max_shift is not None:
+        lag_y = torch.arange(h, device=corr.device)
+        lag_x = torch.arange(w, device=corr.device)
+        lag_y = torch.minimum(lag_y, h - lag_y)
+        lag_x = torch.minimum(lag_x, w - lag_x)
+        outside = (lag_y[:, None] > max_shift) | (lag_x[None, :] > max_shift)
+        corr = corr.masked_fill(outside, float("-inf"))
+
+    peak = corr.reshape(B, -1).argmax(dim=1)
+    py, px = peak // w, peak % w
+    shift = torch.stack([py, px], dim=1).to(corr.dtype)
+
+    if subpixel:
+        rows = torch.arange(B, device=corr.device)
+
+        def refine(c_prev, c_peak, c_next):
+            denom = c_prev - 2 * c_peak + c_next
+            offset = 0.5 * (c_prev - c_next) / torch.where(denom == 0, 1.0, denom)
+            return torch.where(denom < 0, offset, 0.0).clamp(-0.5, 0.5)
+
+        dy = refine(corr[rows, (py - 1) % h, px], corr[rows, py, px], corr[rows, (py + 1) % h, px])
+        dx = refine(corr[rows, py, (px - 1) % w], corr[rows, py, px], corr[rows, py, (px + 1) % w])
+        shift = shift + torch.stack([dy, dx], dim=1)
+
+    # Wrap to signed shifts in [-size/2, size/2)
+    extent = torch.tensor([h, w], device=shift.device, dtype=shift.dtype)
+    return torch.remainder(shift + extent / 2, extent) - extent / 2
+
+
+def apply_shift(x: torch.Tensor, shift: torch.Tensor, pad: bool = False) -> torch.Tensor:
+    """
+    Translate each image by a (possibly sub-pixel) shift with the Fourier shift theorem.
+
+    Args:
+        x: tensors of shape (B,C,H,W)
+        shift: (B,2) shifts (dy, dx) in pixels, e.g. from `estimate_shift`
+        pad: zero-pad to 2x first so content leaving the frame is dropped
+            instead of wrapping around
+
+    Returns:
+        Shifted tensor of shape (B,C,H,W)
+    """
+    H, W = x.shape[-2:]
+    h, w = (2 * H, 2 * W) if pad else (H, W)
+    spectrum = fft.rfft2(x, s=(h, w))
+    fy = fft.fftfreq(h, device=x.device, dtype=x.dtype).view(1, h, 1)
+    fx = fft.rfftfreq(w, device=x.device, dtype=x.dtype).view(1, 1, -1)
+    dy = shift[:, 0].view(-1, 1, 1).to(x.dtype)
+    dx = shift[:, 1].view(-1, 1, 1).to(x.dtype)
+    phase = torch.exp(-2j * math.pi * (fy * dy + fx * dx))
+    shifted = fft.irfft2(spectrum * phase.unsqueeze(1), s=(h, w))
+    return shifted[..., :H, :W]
+
+
+def aligned_metrics(
+    x_hat: torch.Tensor,
+    x_true: torch.Tensor,
+    k_hat: Optional[torch.Tensor] = None,
+    k_true: Optional[torch.Tensor] = None,
+    data_range: float = 1.0,
+    match_scale: bool = False,
+    subpixel: bool = True,
+    max_shift: Optional[int] = None,
+) -> Dict[str, torch.Tensor]:
+    """
+    PSNR/SSIM (and kernel error) after undoing the translation ambiguity.
+
+    Blind deconvolution recovers x and k only up to opposite shifts, so
+    x_hat is registered to x_true (and k_hat to k_true) before comparing.
+    Images are shifted circularly and a border of the largest shift in the
+    batch is excluded from the metrics (capped so at least the SSIM window
+    remains). With `match_scale`, x_hat is also rescaled by the
+    least-squares gain onto x_true.
+
+    Args:
+        x_hat: reconstructions, shape (B,C,H,W)
+        x_true: ground truth, shape (B,C,H,W)
+        k_hat: optional estimated kernels, shape (B,1,Kh,Kw)
+        k_true: optional true kernels, shape (B,1,Kh,Kw)
+        data_range: max pixel value
+        match_scale: also align intensity by a per-image gain
+        subpixel: use sub-pixel shifts
+        max_shift: largest image shift searched; defaults to the kernel size
+            when kernels are given (a true misalignment cannot be larger),
+            otherwise unbounded
+
+    Returns:
+        Dict of (B,) tensors: "psnr", "ssim" and, with kernels,
+        "kernel_error"; plus (B,2) "shift" (and "kernel_shift") applied.
+    """
+    x_true = x_true.expand_as(x_hat)
+    if max_shift is None and k_hat is not None:
+        max_shift = max(k_hat.shape[-2:])
+    shift = estimate_shift(x_hat, x_true, subpixel=subpixel, max_shift=max_shift)
+    x_aligned = apply_shift(x_hat, shift)
+
+    margin = int(math.ceil(shift.abs().max().item())) if shift.numel() else 0
+    margin = max(0, min(margin, (min(x_hat.shape[-2:]) - SSIM_WINDOW) // 2))
+    if margin > 0:
+        x_aligned = x_aligned[..., margin:-margin, margin:-margin]
+        x_ref = x_true[..., margin:-margin, margin:-margin]
+    else:
+        x_ref = x_true
+
+    if match_scale:
+        gain = (x_aligned * x_ref).sum(dim=(1, 2, 3)) / (
+            (x_aligned * x_aligned).sum(dim=(1, 2, 3)) + 1e-12
+        )
+        x_aligned = x_aligned * gain.view(-1, 1, 1, 1)
+
+    results = {
+        "psnr": batch_psnr(x_aligned, x_ref, data_range),
+        "ssim": batch_ssim(x_aligned, x_ref, data_range),
+        "shift": shift,
+    }
+
+    if k_hat is not None and k_true is not None:
+        k_true = k_true.expand_as(k_hat)
+        kernel_shift = estimate_shift(k_hat, k_true, subpixel=subpixel, pad=True)
+        k_aligned = apply_shift(k_hat, kernel_shift, pad=True)
+        results["kernel_error"] = batch_kernel_error(k_aligned, k_true)
+        results["kernel_shift"] = kernel_shift
+    return results